@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = (INTERACTIVE, BULK)
+
+# Per-client token buckets (requests per second, burst) and per-lane queueing.
+# Bulk clients get a higher rate but a short queue and wait, so a re-score job
+# is throttled by slots instead of piling up behind interactive users.
+LANE_SETTINGS = {
+    INTERACTIVE: {'rate': 10.0, 'burst': 20, 'max_queue': 32, 'max_wait': 2.0},
+    BULK: {'rate': 100.0, 'burst': 200, 'max_queue': 8, 'max_wait': 0.5}
+}
+
+# Buckets for this many distinct clients are kept; the least recently seen are dropped
+MAX_TRACKED_CLIENTS = 10000
+
+WAIT_SAMPLES = 2048
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Consume one token; returns 0 on success or seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class LaneStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rate_limited = 0
+        self.queue_full = 0
+        self.timed_out = 0
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.wait_ms = deque(maxlen=WAIT_SAMPLES)
+
+    def to_dict(self):
+        wait = None
+        if self.wait_ms:
+            p50, p99 = np.percentile(np.fromiter(self.wait_ms, dtype=np.float64), [50, 99])
+            wait = {'p50': round(float(p50), 3), 'p99': round(float(p99), 3)}
+        return {
+            'admitted': self.admitted,
+            'rejected_429_rate_limited': self.rate_limited,
+            'rejected_503_queue_full': self.queue_full,
+            'rejected_503_wait_timeout': self.timed_out,
+            'active': self.active,
+            'queue_depth': self.waiting,
+            'peak_queue_depth': self.peak_waiting,
+            'queue_wait_ms': wait
+        }
+
+class Rejection:
+    """Why a request was not admitted, with the HTTP status to return"""
+    __slots__ = ('status', 'reason', 'retry_after')
+
+    def __init__(self, status, reason, retry_after):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Per-client rate limits plus a shared pool of scoring slots with priority lanes
+
+    At most `slots` requests score concurrently and bulk requests may hold at
+    most `bulk_slots` of them, so interactive traffic always has capacity in
+    reserve. Whenever a slot frees up, waiting interactive requests go first.
+    A full queue, or a wait longer than the lane's max_wait, rejects with 503
+    instead of letting the request sit in the server's backlog.
+    """
+
+    def __init__(self, slots=None, bulk_slots=None, settings=None):
+        self.slots = slots or max(2, os.cpu_count() or 2)
+        self.bulk_slots = bulk_slots or max(1, self.slots // 4)
+        self.settings = settings or LANE_SETTINGS
+        self.stats = {lane: LaneStats() for lane in LANES}
+        self._buckets = OrderedDict()
+        self._cond = threading.Condition()
+
+    def _bucket(self, client, lane, now):
+        key = (client, lane)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            settings = self.settings[lane]
+            bucket = self._buckets[key] = TokenBucket(settings['rate'], settings['burst'])
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _can_start(self, lane):
+        running = self.stats[INTERACTIVE].active + self.stats[BULK].active
+        if running >= self.slots:
+            return False
+        if lane == BULK:
+            return self.stats[BULK].active < self.bulk_slots and self.stats[INTERACTIVE].waiting == 0
+        return True
+
+    def admit(self, client, lane):
+        """Block until a slot is free; returns None when admitted, else a Rejection"""
+        stats = self.stats[lane]
+        settings = self.settings[lane]
+
+        with self._cond:
+            now = time.monotonic()
+            retry_after = self._bucket(client, lane, now).take(now)
+            if retry_after:
+                stats.rate_limited += 1
+                return Rejection(429, 'Rate limit exceeded', retry_after)
+
+            if not self._can_start(lane):
+                if stats.waiting >= settings['max_queue']:
+                    stats.queue_full += 1
+                    return Rejection(503, 'Server busy, queue is full', 1.0)
+
+                stats.waiting += 1
+                stats.peak_waiting = max(stats.peak_waiting, stats.waiting)
+                deadline = now + settings['max_wait']
+                try:
+                    while not self._can_start(lane):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            stats.timed_out += 1
+                            return Rejection(503, 'Server busy, timed out waiting for capacity', 1.0)
+                        self._cond.wait(remaining)
+                finally:
+                    stats.waiting -= 1
+
+            stats.active += 1
+            stats.admitted += 1
+            stats.wait_ms.append((time.monotonic() - now) * 1000)
+            return None
+
+    def release(self, lane):
+        with self._cond:
+            self.stats[lane].active -= 1
+            self._cond.notify_all()
+
+    def report(self):
+        with self._cond:
+            return {
+                'slots': self.slots,
+                'bulk_slots': self.bulk_slots,
+                'tracked_clients': len(self._buckets),
+                'lanes': {lane: dict(self.stats[lane].to_dict(), **self.settings[lane]) for lane in LANES}
+            }
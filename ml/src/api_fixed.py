@@ -1,23 +1,173 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_file
 import joblib
 import numpy as np
 from flask_cors import CORS
+import functools
+import hashlib
+import hmac
 import os
+import shutil
+import time
 import traceback
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from admission import BULK, INTERACTIVE, AdmissionController
+from bulk_jobs import DEFAULT_CHUNK_ROWS, FORMATS, JOB_DIR, JobManager
+from compact_model import COMPACT_MODEL_FILE, load_compact_forest
+from counterfactuals import expand_counterfactuals
+from drift_monitor import DriftMonitor, load_reference_profile
+from early_exit import early_exit_forest
+from feature_store import DEFAULT_MAX_USERS, FeatureStore, store_loader
+from health_stream import HealthStreamDetector
+from local_store import LocalStore
+from lookup_table import LOOKUP_TABLE_FILE, load_lookup_table
+from model_registry import DEFAULT_MEMORY_CAP_MB, ModelRegistry
+from onnx_export import ONNX_MODEL_FILE, OnnxPipeline
+from prediction_log import LOG_DIR, PredictionLog
+from profiling import ServiceProfiler, collapsed_output
+from request_coalescing import (DEFAULT_IDEMPOTENCY_ENTRIES, DEFAULT_IDEMPOTENCY_TTL, IdempotencyStore,
+                                ResponseSnapshot, SingleFlight, request_fingerprint)
+from request_schema import SchemaError, compile_schema
+from response_cache import ResponseCache, dumps
+from shadow_scoring import ShadowScorer
+from tree_explainer import get_explainer, top_contributors
+from user_auth import UserAuthenticator
 
 app = Flask(__name__)
 CORS(app)
 
+# 'sklearn' loads pcos_model.joblib; 'compact' and 'onnx' load the bundles
+# written by compact_model.py and onnx_export.py
+MODEL_BACKEND = os.environ.get('PCOS_MODEL_BACKEND', 'sklearn').lower()
+MODEL_FILES = {
+    'sklearn': 'pcos_model.joblib',
+    'compact': COMPACT_MODEL_FILE,
+    'onnx': ONNX_MODEL_FILE
+}
+ONNX_THREADS = int(os.environ.get('PCOS_ONNX_THREADS', '1'))
+
+# Backends that keep the tree structure needed for path explanations
+EXPLAINABLE_BACKENDS = ('sklearn', 'compact')
+
+# Anytime inference for tree backends: trees stop being evaluated once the
+# prediction and risk level are settled. Requests can ask for the exact score.
+EARLY_EXIT_ENABLED = os.environ.get('PCOS_EARLY_EXIT', '0') == '1'
+
+# App-form requests are answered from the table written by lookup_table.py
+# when it was distilled from the model being served
+LOOKUP_TABLE_ENABLED = os.environ.get('PCOS_LOOKUP_TABLE', '0') == '1'
+
+# Risk scores at which the risk level or the recommendations change
+DECISION_POINTS = (15, 30, 35, 50, 60, 70, 80)
+
+# Candidate bundle (same files as ml/models) scored on mirrored live traffic
+SHADOW_MODEL_DIR = os.environ.get('PCOS_SHADOW_MODEL_DIR')
+
+# Requests pick a registry variant with this header or body field
+VARIANT_HEADER = 'X-Model-Variant'
+VARIANT_FIELD = 'model_variant'
+REGISTRY_MEMORY_MB = float(os.environ.get('PCOS_REGISTRY_MEMORY_MB', DEFAULT_MEMORY_CAP_MB))
+
+# Admission control for the scoring endpoints. Clients are rate-limited by
+# verified uid, else by address; only admin-token callers may name their own
+# client or pick the bulk lane with these headers
+ADMISSION_ENABLED = os.environ.get('PCOS_ADMISSION', '1') != '0'
+CLIENT_HEADER = 'X-Client-Id'
+LANE_HEADER = 'X-Request-Lane'
+
+# Number of reverse proxies in front of the API whose X-Forwarded-For is
+# trusted; with 0 the address is the direct peer and the header is ignored
+TRUSTED_PROXIES = int(os.environ.get('PCOS_TRUSTED_PROXIES', '0'))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
+# Retries carrying the same Idempotency-Key get the stored response back
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_TTL = float(os.environ.get('PCOS_IDEMPOTENCY_TTL', DEFAULT_IDEMPOTENCY_TTL))
+IDEMPOTENCY_ENTRIES = int(os.environ.get('PCOS_IDEMPOTENCY_ENTRIES', DEFAULT_IDEMPOTENCY_ENTRIES))
+
+# Served predictions are appended to compressed log files by a background writer
+PREDICTION_LOG_ENABLED = os.environ.get('PCOS_PREDICTION_LOG', '1') != '0'
+PREDICTION_LOG_DIR = os.environ.get('PCOS_PREDICTION_LOG_DIR', LOG_DIR)
+
+# Requests carrying a user id get the fields they did not send filled from
+# that user's cycle and daily-health history (POST /history/<collection>)
+FEATURE_STORE_ENABLED = os.environ.get('PCOS_FEATURE_STORE', '1') != '0'
+FEATURE_STORE_USERS = int(os.environ.get('PCOS_FEATURE_STORE_USERS', DEFAULT_MAX_USERS))
+USER_FIELDS = ('user_id', 'userId')
+HISTORY_COLLECTIONS = {'cycles': 'cycles', 'daily-health': 'dailyHealth'}
+
+# A user id is only trusted from that user: history writes and history-filled
+# predictions need a Firebase ID token for it (or the admin token)
+FIREBASE_PROJECT = os.environ.get('PCOS_FIREBASE_PROJECT')
+
+# Daily-health logs run through the ovulation, weight and symptom detectors
+HEALTH_STREAM_ENABLED = os.environ.get('PCOS_HEALTH_STREAM', '1') != '0'
+
+# Optional local_store.py database; history logs are written through to it
+# and users not held in memory are rebuilt from it
+LOCAL_STORE_DB = os.environ.get('PCOS_LOCAL_STORE_DB')
+
+# Bulk scoring jobs: uploads are spooled to disk and scored in chunks by their
+# own worker threads, each chunk holding a bulk admission slot
+JOBS_ENABLED = os.environ.get('PCOS_JOBS', '1') != '0'
+JOB_DIRECTORY = os.environ.get('PCOS_JOB_DIR', JOB_DIR)
+JOB_WORKERS = int(os.environ.get('PCOS_JOB_WORKERS', '1'))
+JOB_CHUNK_ROWS = int(os.environ.get('PCOS_JOB_CHUNK_ROWS', DEFAULT_CHUNK_ROWS))
+JOB_MAX_BYTES = int(float(os.environ.get('PCOS_JOB_MAX_MB', '256')) * 1024 * 1024)
+JOB_CLIENT = 'bulk-jobs'
+JOB_EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+JOB_MIMETYPES = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson'}
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get('PCOS_ADMIN_TOKEN')
+
+# Off by default; stage tracking is a flag check until enabled via /admin
+profiler = ServiceProfiler()
+
+# Pre-encoded bodies for responses that only change on model reload
+response_cache = ResponseCache()
+
+# Token buckets per client and bounded priority lanes in front of the model
+admission = AdmissionController(
+    slots=int(os.environ.get('PCOS_ADMISSION_SLOTS', '0')) or None,
+    bulk_slots=int(os.environ.get('PCOS_ADMISSION_BULK_SLOTS', '0')) or None
+)
+
+# Concurrent identical scoring requests share one computation
+single_flight = SingleFlight()
+idempotency_store = IdempotencyStore(IDEMPOTENCY_TTL, IDEMPOTENCY_ENTRIES)
+
+# Write-behind audit and retraining log; the request path only appends to memory
+prediction_log = PredictionLog(PREDICTION_LOG_DIR).start() if PREDICTION_LOG_ENABLED else None
+
+# Per-user aggregates, bounded to the most recently used users
+local_store = LocalStore(LOCAL_STORE_DB) if LOCAL_STORE_DB else None
+feature_store = (FeatureStore(FEATURE_STORE_USERS, store_loader(local_store) if local_store else None)
+                 if FEATURE_STORE_ENABLED else None)
+health_stream = HealthStreamDetector() if HEALTH_STREAM_ENABLED else None
+
+# Versioned per-variant bundles written by the trainers, loaded on first use
+model_registry = ModelRegistry(memory_cap_mb=REGISTRY_MEMORY_MB)
+
 # Global variables for model components  
 model = None
 scaler = None
 feature_names = None
 model_info = None
 optimal_threshold = 0.5
+model_version = None
+request_schema = compile_schema()
+drift_monitor = None
+shadow_scorer = None
+early_exit = None
+lookup_table = None
 
 def load_model_components():
     """Load all model components with ABSOLUTE PATHS"""
-    global model, scaler, feature_names, model_info, optimal_threshold
+    global model, scaler, feature_names, model_info, optimal_threshold, request_schema, model_version
+    global drift_monitor
     
     # ABSOLUTE PATHS - FIXED!
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -40,9 +190,13 @@ def load_model_components():
         print(f"❌ Cannot list models directory: {e}")
         return False
     
+    if MODEL_BACKEND not in MODEL_FILES:
+        print(f"❌ Unknown PCOS_MODEL_BACKEND: {MODEL_BACKEND}")
+        return False
+    
     # Define all required files with ABSOLUTE PATHS
     required_files = {
-        'model': os.path.join(model_dir, 'pcos_model.joblib'),
+        'model': os.path.join(model_dir, MODEL_FILES[MODEL_BACKEND]),
         'scaler': os.path.join(model_dir, 'pcos_scaler.joblib'),
         'features': os.path.join(model_dir, 'feature_names.joblib'),
         'info': os.path.join(model_dir, 'model_info.joblib')
@@ -63,10 +217,20 @@ def load_model_components():
     
     # Load each component with error handling
     try:
-        print("📥 Loading model...")
-        model = joblib.load(required_files['model'])
+        print(f"📥 Loading model ({MODEL_BACKEND} backend)...")
+        if MODEL_BACKEND == 'compact':
+            model = load_compact_forest(required_files['model'])
+        elif MODEL_BACKEND == 'onnx':
+            model = OnnxPipeline(required_files['model'], intra_op_threads=ONNX_THREADS)
+        else:
+            model = joblib.load(required_files['model'])
         print(f"✅ Model loaded: {type(model)}")
         
+        # Content hash identifies the model for per-version caches
+        with open(required_files['model'], 'rb') as f:
+            model_version = hashlib.sha256(f.read()).hexdigest()[:12]
+        print(f"🔖 Model version: {model_version}")
+        
         print("📥 Loading scaler...")
         scaler = joblib.load(required_files['scaler'])
         print(f"✅ Scaler loaded: {type(scaler)}")
@@ -75,6 +239,9 @@ def load_model_components():
         feature_names = joblib.load(required_files['features'])
         print(f"✅ Features loaded: {len(feature_names)} features")
         
+        # Compile request validation against this model's columns
+        request_schema = compile_schema(feature_names)
+        
         print("📥 Loading model info...")
         model_info = joblib.load(required_files['info'])
         print(f"✅ Model info loaded: {model_info.get('accuracy', 'Unknown')} accuracy")
@@ -83,6 +250,11 @@ def load_model_components():
         optimal_threshold = model_info.get('optimal_threshold', 0.5)
         print(f"🎯 Using optimal threshold: {optimal_threshold:.3f}")
         
+        # Training distribution for drift monitoring, written by the trainers
+        profile = load_reference_profile(model_dir)
+        drift_monitor = DriftMonitor(profile, feature_names, request_schema) if profile else None
+        print(f"📈 Drift monitoring: {'enabled' if drift_monitor else 'no reference profile'}")
+        
         return True
         
     except Exception as e:
@@ -91,89 +263,47 @@ def load_model_components():
         print(f"   Traceback: {traceback.format_exc()}")
         return False
 
-def create_feature_vector(data, feature_names):
+def create_feature_vector(record, feature_names):
     """Create feature vector with enhanced features matching training"""
     features = []
     
-    # Basic features mapping
-    feature_mapping = {
-        'Age (yrs)': ['age', 'Age'],
-        'Weight (Kg)': ['weight', 'Weight'],
-        'Height(Cm)': ['height', 'Height'],
-        'BMI': ['bmi'],
-        'Cycle(R/I)': ['cycle_regular', 'regular_cycle'],
-        'Cycle length(days)': ['cycle_length'],
-        'Weight gain(Y/N)': ['weight_gain'],
-        'hair growth(Y/N)': ['hair_growth'],
-        'Pimples(Y/N)': ['pimples', 'acne'],
-        'Fast food (Y/N)': ['fast_food'],
-        'Reg.Exercise(Y/N)': ['regular_exercise', 'exercise'],
-        'FSH(mIU/mL)': ['fsh'],
-        'LH(mIU/mL)': ['lh'],
-        'AMH(ng/mL)': ['amh'],
-        'PRL(ng/mL)': ['prl']
-    }
-    
-    # Extract basic features
     for feature_name in feature_names:
-        value = 0  # Default value
-        
-        # Direct match
-        if feature_name in data:
-            value = data[feature_name]
-        else:
-            # Try alternative names
-            for alt_names in feature_mapping.get(feature_name, []):
-                if alt_names in data:
-                    value = data[alt_names]
-                    break
+        # Training columns and their aliases were resolved by the request schema
+        value = record.get(feature_name, 0)
         
         # Handle enhanced features
         if feature_name == 'BMI_overweight':
-            bmi = float(data.get('bmi', data.get('BMI', 23)))
-            value = 1 if bmi > 25 else 0
+            value = 1 if record.get('BMI', 23) > 25 else 0
         elif feature_name == 'BMI_obese':
-            bmi = float(data.get('bmi', data.get('BMI', 23)))
-            value = 1 if bmi > 30 else 0
+            value = 1 if record.get('BMI', 23) > 30 else 0
         elif feature_name == 'BMI_underweight':
-            bmi = float(data.get('bmi', data.get('BMI', 23)))
-            value = 1 if bmi < 18.5 else 0
+            value = 1 if record.get('BMI', 23) < 18.5 else 0
         elif feature_name == 'Age_high_risk':
-            age = float(data.get('age', data.get('Age (yrs)', 25)))
-            value = 1 if age > 30 else 0
+            value = 1 if record.get('Age (yrs)', 25) > 30 else 0
         elif feature_name == 'Age_young':
-            age = float(data.get('age', data.get('Age (yrs)', 25)))
-            value = 1 if age < 20 else 0
+            value = 1 if record.get('Age (yrs)', 25) < 20 else 0
         elif feature_name == 'Age_peak_reproductive':
-            age = float(data.get('age', data.get('Age (yrs)', 25)))
+            age = record.get('Age (yrs)', 25)
             value = 1 if 20 <= age <= 30 else 0
-        elif feature_name == 'Total_symptoms':
+        elif feature_name in ('Total_symptoms', 'Multiple_symptoms'):
             # Count symptoms
-            symptoms = [
-                data.get('weight_gain', 0),
-                data.get('hair_growth', 0),
-                data.get('pimples', 0),
-                data.get('acne', 0)
-            ]
-            value = sum(symptoms)
-        elif feature_name == 'Multiple_symptoms':
-            symptoms = [
-                data.get('weight_gain', 0),
-                data.get('hair_growth', 0),
-                data.get('pimples', 0),
-                data.get('acne', 0)
-            ]
-            value = 1 if sum(symptoms) >= 3 else 0
+            symptoms = (
+                record.get('Weight gain(Y/N)', 0) +
+                record.get('hair growth(Y/N)', 0) +
+                record.get('Pimples(Y/N)', 0)
+            )
+            if feature_name == 'Total_symptoms':
+                value = symptoms
+            else:
+                value = 1 if symptoms >= 3 else 0
         elif feature_name == 'Poor_lifestyle':
-            exercise = data.get('regular_exercise', data.get('exercise', 1))
-            fast_food = data.get('fast_food', 0)
-            lifestyle_score = exercise - fast_food
+            lifestyle_score = record.get('Reg.Exercise(Y/N)', 1) - record.get('Fast food (Y/N)', 0)
             value = 1 if lifestyle_score < 0 else 0
         elif 'ratio' in feature_name.lower():
             # Handle ratio features
             if 'LH_FSH' in feature_name:
-                lh = float(data.get('lh', data.get('LH(mIU/mL)', 8)))
-                fsh = float(data.get('fsh', data.get('FSH(mIU/mL)', 6)))
+                lh = record.get('LH(mIU/mL)', 8)
+                fsh = record.get('FSH(mIU/mL)', 6)
                 value = lh / fsh if fsh > 0 else 0
                 if feature_name == 'High_LH_FSH_ratio':
                     value = 1 if value > 2 else 0
@@ -182,12 +312,51 @@ def create_feature_vector(data, feature_names):
     
     return np.array(features).reshape(1, -1)
 
-def generate_dynamic_recommendations(input_data, risk_score, risk_level):
+def classify_risk(risk_score):
+    """Risk level label for a 0-100 risk score; cut points are listed in DECISION_POINTS"""
+    if risk_score >= 80:
+        return 'Very High'
+    if risk_score >= 60:
+        return 'High'
+    if risk_score >= 35:
+        return 'Moderate'
+    if risk_score >= 15:
+        return 'Low'
+    return 'Very Low'
+
+def log_prediction(record, probability, prediction, risk_level, threshold, bundle, source, latency_ms,
+                   history_fields=None):
+    """Queue one served prediction for the prediction log"""
+    entry = {
+        'logged_at': time.time(),
+        'model_version': bundle.version if bundle else model_version,
+        'variant': bundle.variant if bundle else 'default',
+        'client': hashed_client(),
+        'source': source,
+        'probability': probability,
+        'prediction': prediction,
+        'risk_level': risk_level,
+        'threshold': threshold,
+        'latency_ms': round(latency_ms, 3)
+    }
+    # Only the fields the request sent, under their training column names;
+    # values filled from the user's history are kept apart
+    history_fields = history_fields or {}
+    for name, value in zip(record.schema.names, record.values):
+        if value == value and name not in history_fields:
+            entry[name] = value
+    if history_fields:
+        entry['history_fields'] = history_fields
+    prediction_log.append(entry)
+    # Coalesced followers of this request log their own copy
+    g.logged_prediction = entry
+
+def generate_dynamic_recommendations(record, risk_score, risk_level):
     """Generate personalized recommendations based on input data and risk"""
     recommendations = []
     
     # BMI-based recommendations
-    bmi = float(input_data.get('bmi', input_data.get('BMI', 23)))
+    bmi = record.get('BMI', 23)
     if bmi > 30:
         recommendations.append("🏥 Consult a healthcare provider for weight management strategies")
         recommendations.append("🥗 Consider a medically supervised nutrition plan")
@@ -198,30 +367,30 @@ def generate_dynamic_recommendations(input_data, risk_score, risk_level):
         recommendations.append("🍎 Consult a nutritionist for healthy weight gain strategies")
     
     # Age-based recommendations
-    age = float(input_data.get('age', input_data.get('Age (yrs)', 25)))
+    age = record.get('Age (yrs)', 25)
     if age < 20:
         recommendations.append("📚 Focus on establishing healthy lifestyle habits early")
     elif age > 35:
         recommendations.append("🔬 Consider comprehensive hormone panels annually")
     
     # Symptom-specific recommendations
-    if input_data.get('weight_gain', 0) == 1:
+    if record.get('Weight gain(Y/N)', 0) == 1:
         recommendations.append("📊 Track weight changes and eating patterns")
     
-    if input_data.get('hair_growth', 0) == 1:
+    if record.get('hair growth(Y/N)', 0) == 1:
         recommendations.append("🔬 Discuss androgen levels with your healthcare provider")
     
-    if input_data.get('pimples', 0) == 1 or input_data.get('acne', 0) == 1:
+    if record.get('Pimples(Y/N)', 0) == 1:
         recommendations.append("🧴 Consider dermatological evaluation for hormonal acne")
     
     # Lifestyle recommendations
-    if input_data.get('regular_exercise', input_data.get('exercise', 1)) == 0:
+    if record.get('Reg.Exercise(Y/N)', 1) == 0:
         recommendations.append("💪 Start with 30 minutes of moderate exercise daily")
     
-    if input_data.get('fast_food', 0) == 1:
+    if record.get('Fast food (Y/N)', 0) == 1:
         recommendations.append("🥗 Reduce processed food intake and increase whole foods")
     
-    if input_data.get('cycle_regular', input_data.get('regular_cycle', 1)) == 0:
+    if record.get('Cycle(R/I)', 1) == 0:
         recommendations.append("📅 Keep a detailed menstrual cycle diary for 3 months")
     
     # Risk-level specific recommendations
@@ -246,16 +415,461 @@ def generate_dynamic_recommendations(input_data, risk_score, risk_level):
     # Return top 5 most relevant recommendations
     return recommendations[:5]
 
+def predict_probabilities(features_array):
+    """Class probabilities for unscaled feature rows on the active backend"""
+    # The ONNX graph applies the scaler itself
+    if getattr(model, 'includes_scaler', False):
+        return profiler.track('predict_proba', model.predict_proba, features_array)
+    features_scaled = profiler.track('scaling', scaler.transform, features_array)
+    return profiler.track('predict_proba', model.predict_proba, features_scaled)
+
+def explain_predictions(features_array, features_scaled, top_n=5):
+    """Per-row feature contributions and probabilities from the forest's decision paths"""
+    start = time.perf_counter()
+    explainer = get_explainer(model, model_version)
+    bias, contributions, probabilities = explainer.explain(features_scaled)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    explanations = [{
+        'method': 'tree_path_contributions',
+        'model_version': model_version,
+        'base_risk': round(bias * 100, 1),
+        'top_contributors': top_contributors(contributions[i], features_array[i], feature_names, top_n),
+        'compute_ms': round(elapsed_ms, 3)
+    } for i in range(len(features_array))]
+    return explanations, probabilities
+
+def score_payloads(payloads):
+    """Score a list of request payloads with one model call; invalid rows get their errors instead"""
+    results = [None] * len(payloads)
+    records = []
+    positions = []
+    for i, payload in enumerate(payloads):
+        if payload is None:
+            results[i] = {'success': False, 'error': 'Line is not valid JSON'}
+            continue
+        try:
+            records.append(request_schema.parse(payload))
+            positions.append(i)
+        except SchemaError as e:
+            results[i] = {'success': False, 'error': 'Invalid request data', 'details': e.errors}
+    
+    if records:
+        features_array = np.vstack([create_feature_vector(record, feature_names) for record in records])
+        for i, probability in zip(positions, predict_probabilities(features_array)[:, 1]):
+            risk_score = float(probability) * 100
+            results[i] = {
+                'success': True,
+                'prediction': int(probability > optimal_threshold),
+                'risk_score': round(risk_score, 1),
+                'risk_level': classify_risk(risk_score)
+            }
+    
+    # Rows may carry an id to join results back to the source
+    for payload, result in zip(payloads, results):
+        if isinstance(payload, dict) and 'id' in payload:
+            result['id'] = payload['id']
+    return results
+
+def score_job_chunk(payloads):
+    """Score one bulk job chunk, waiting for a bulk admission slot so interactive requests go first"""
+    if model is None:
+        raise RuntimeError('Model not loaded')
+    if not ADMISSION_ENABLED:
+        return score_payloads(payloads)
+    
+    while True:
+        rejection = admission.admit(JOB_CLIENT, BULK)
+        if rejection is None:
+            break
+        time.sleep(rejection.retry_after)
+    try:
+        return score_payloads(payloads)
+    finally:
+        admission.release(BULK)
+
+def wants_exact_score(data):
+    """Whether the request opted out of early exit and the lookup table with ?exact=1 or "exact": true"""
+    if request.args.get('exact', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return isinstance(data, dict) and data.get('exact') is True
+
+def parse_explain_options():
+    """Read the explain/top query parameters"""
+    explain = request.args.get('explain', '').lower() in ('1', 'true', 'yes')
+    top_n = request.args.get('top', default=5, type=int)
+    return explain, max(1, min(top_n or 5, len(feature_names)))
+
+def explanations_unavailable():
+    """Error response when the active backend cannot explain predictions"""
+    return jsonify({
+        'success': False,
+        'error': f"Explanations are not available with the '{MODEL_BACKEND}' model backend"
+    }), 400
+
+def require_admin():
+    """Return an error response unless the request carries the admin token"""
+    if not ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Admin endpoints are disabled'}), 404
+    
+    if not is_admin_request():
+        return jsonify({'success': False, 'error': 'Admin token required'}), 403
+    return None
+
+def is_admin_request():
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+def request_uid():
+    """Firebase uid proven by the request's bearer token, or None; verified once per request"""
+    if 'uid' not in g:
+        g.uid = user_auth.verify(request.headers.get('Authorization')) if user_auth is not None else None
+    return g.uid
+
+def request_client():
+    """Client identity for rate limits and idempotency keys
+
+    A caller-chosen X-Client-Id is only honoured with the admin token;
+    otherwise it is the verified uid, else the remote address. The kinds are
+    prefixed so one can never collide with another.
+    """
+    client = request.headers.get(CLIENT_HEADER)
+    if client and is_admin_request():
+        return f"client:{client}"
+    uid = request_uid()
+    if uid is not None:
+        return f"uid:{uid}"
+    return f"addr:{request.remote_addr or 'unknown'}"
+
+def hashed_client():
+    """Client identity as stored in logs"""
+    return hashlib.sha256(request_client().encode('utf-8')).hexdigest()[:16]
+
+def request_lane():
+    """The bulk lane is for admin-token tools; everyone else is interactive"""
+    if request.headers.get(LANE_HEADER, '').lower() == BULK and is_admin_request():
+        return BULK
+    return INTERACTIVE
+
+def request_user_id(data):
+    """User id sent with a scoring request, for history features
+
+    Only trusted when it is the caller's own verified uid or the caller has
+    the admin token; anyone else gets no history filled in.
+    """
+    for field in USER_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str) and value:
+            return value if value == request_uid() or is_admin_request() else None
+    return None
+
+def history_owner_error(docs):
+    """Error response unless the caller may write every document: admin token or its own userId
+
+    Documents without a userId are assigned the caller's uid.
+    """
+    if is_admin_request():
+        return None
+    uid = request_uid()
+    for doc in docs:
+        if isinstance(doc, dict) and doc.setdefault('userId', uid) != uid:
+            return jsonify({
+                'success': False,
+                'error': 'History can only be recorded for the signed-in user'
+            }), 403
+    return None
+
+def enrich_from_history(record, data):
+    """Fill the fields a request did not send from the user's history; returns (record, filled)"""
+    user_id = request_user_id(data)
+    if feature_store is None or user_id is None:
+        return record, {}
+    return profiler.track('feature_store', feature_store.enrich, record, user_id)
+
+def replay_response(snapshot, **headers):
+    response = Response(snapshot.body, status=snapshot.status, mimetype=snapshot.mimetype)
+    for name, value in snapshot.headers + tuple(headers.items()):
+        response.headers[name] = value
+    return response
+
+def coalesced(view):
+    """Share one computation between concurrent identical requests and replay Idempotency-Key retries
+    
+    Identical means same path, query, variant header, lane, verified user
+    and JSON body. Admission control runs before this, per caller, so every
+    follower has been admitted itself. Only 2xx results are shared; a
+    follower whose leader got an error computes its own response. Followers
+    of a logged prediction add their own prediction-log entry;
+    Idempotency-Key replays are retries and are not logged again.
+    
+    A key is scoped to the client and verified user and bound to the first
+    request body sent with it; reusing it for a different body is rejected
+    with 422.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        fingerprint = request_fingerprint(request.method, request.path, request.args.items(multi=True),
+                                          request.headers.get(VARIANT_HEADER), request.get_json(silent=True))
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        # History-filled responses depend on whose token was sent
+        scope = (request_client(), request_uid(), key) if key else None
+        
+        if scope is not None:
+            stored = idempotency_store.get(scope)
+            if stored is not None:
+                stored_fingerprint, snapshot = stored
+                if stored_fingerprint != fingerprint:
+                    idempotency_store.record_conflict()
+                    return jsonify({
+                        'success': False,
+                        'error': f"{IDEMPOTENCY_HEADER} was already used for a different request"
+                    }), 422
+                idempotency_store.record_replay()
+                return replay_response(snapshot, **{'Idempotent-Replayed': 'true'})
+        
+        def compute():
+            response = app.make_response(view(*args, **kwargs))
+            snapshot = ResponseSnapshot(response.status_code, response.get_data(), response.mimetype,
+                                        [(name, value) for name, value in response.headers.items()
+                                         if name == 'Retry-After'])
+            return snapshot, g.pop('logged_prediction', None)
+        
+        start = time.perf_counter()
+        (snapshot, logged), shared = single_flight.do((fingerprint, scope, request_lane(), request_uid()), compute)
+        if shared and not 200 <= snapshot.status < 300:
+            (snapshot, logged), shared = compute(), False
+        elif shared and logged is not None and prediction_log is not None:
+            prediction_log.append(dict(logged, logged_at=time.time(), client=hashed_client(), coalesced=True,
+                                       latency_ms=round((time.perf_counter() - start) * 1000, 3)))
+        if scope is not None and snapshot.storable:
+            idempotency_store.put(scope, fingerprint, snapshot)
+        return replay_response(snapshot, **({'X-Coalesced': 'true'} if shared else {}))
+    return wrapper
+
+def admission_controlled(view=None, lane=None):
+    """Rate-limit and queue a scoring endpoint; rejects with 429/503 instead of queueing unboundedly
+
+    The lane comes from request_lane() unless one is given.
+    """
+    if view is None:
+        return functools.partial(admission_controlled, lane=lane)
+    fixed_lane = lane
+    
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMISSION_ENABLED:
+            return view(*args, **kwargs)
+        
+        lane = fixed_lane or request_lane()
+        rejection = admission.admit(request_client(), lane)
+        if rejection is not None:
+            response = jsonify({
+                'success': False,
+                'error': rejection.reason,
+                'lane': lane,
+                'retry_after': round(rejection.retry_after, 3)
+            })
+            response.headers['Retry-After'] = str(max(1, int(rejection.retry_after + 0.999)))
+            return response, rejection.status
+        
+        try:
+            return view(*args, **kwargs)
+        finally:
+            admission.release(lane)
+    return wrapper
+
+def json_response(body, status=200):
+    """Wrap pre-encoded JSON bytes in a Flask response"""
+    return Response(body, status=status, mimetype='application/json')
+
+def refresh_response_cache():
+    """Rebuild cached payloads for '/', '/health' and '/model-info'"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    model_dir = os.path.join(current_dir, '..', 'models')
+    
+    response_cache.clear()
+    
+    response_cache.store('home', {
+        'message': '🌸 Luna Care Enhanced AI API',
+        'version': '2.0',
+        'model_status': 'loaded' if model is not None else 'not loaded',
+        'model_accuracy': f"{model_info.get('accuracy', 0):.1%}" if model_info else 'Unknown',
+        'optimal_threshold': optimal_threshold,
+        'features_count': len(feature_names) if feature_names else 0,
+        'endpoints': ['/predict-pcos', '/explain-pcos', '/what-if-pcos', '/model-info', '/models', '/health'],
+        'enhancements': [
+            'Class imbalance handling',
+            'Enhanced feature engineering',
+            'Optimal threshold detection',
+            'Dynamic risk assessment',
+            'Personalized recommendations'
+        ],
+        'ready': model is not None
+    })
+    
+    response_cache.store('health', {
+        'status': 'healthy',
+        'model_loaded': model is not None,
+        'scaler_loaded': scaler is not None,
+        'features_loaded': feature_names is not None,
+        'info_loaded': model_info is not None,
+        'all_components_ready': all([model, scaler, feature_names, model_info]),
+        'model_directory': model_dir,
+        'models_folder_exists': os.path.exists(model_dir),
+        'optimal_threshold': optimal_threshold,
+        'model_backend': MODEL_BACKEND,
+        'enhanced_features': True
+    })
+    
+    if model_info is None:
+        response_cache.store('model-info', {
+            'success': False,
+            'error': 'Model info not available',
+            'model_loaded': model is not None
+        }, status=500)
+        response_cache.set_prediction_constants(None)
+        return
+    
+    response_cache.store('model-info', {
+        'success': True,
+        'accuracy': round(model_info.get('accuracy', 0) * 100, 1),
+        'accuracy_default': round(model_info.get('accuracy_default', 0) * 100, 1),
+        'optimal_threshold': model_info.get('optimal_threshold', 0.5),
+        'features_count': len(feature_names),
+        'training_samples': model_info.get('training_samples', 'Unknown'),
+        'test_samples': model_info.get('test_samples', 'Unknown'),
+        'model_type': 'Enhanced Random Forest Classifier',
+        'model_backend': MODEL_BACKEND,
+        'trees': getattr(model, 'n_estimators', None),
+        'oob_score': model_info.get('oob_score'),
+        'class_weights': model_info.get('class_weights', {}),
+        'top_features': model_info.get('feature_importance', [])[:10]
+    })
+    
+    # Fields that are identical in every prediction response
+    response_cache.set_prediction_constants({
+        'model_accuracy': round(model_info.get('accuracy', 0.61) * 100, 1),
+        'features_used': len(feature_names),
+        'threshold_used': round(optimal_threshold, 3)
+    })
+
+def reload_model_components():
+    """Load model components and regenerate the cached responses"""
+    loaded = load_model_components()
+    refresh_response_cache()
+    
+    # Build the explainer tables up front so the first explained request is not slower
+    if model is not None and MODEL_BACKEND in EXPLAINABLE_BACKENDS:
+        get_explainer(model, model_version)
+    load_early_exit()
+    load_lookup()
+    return loaded
+
+def load_early_exit():
+    """Wrap the served forest for early-exit inference when PCOS_EARLY_EXIT=1"""
+    global early_exit
+    early_exit = None
+    if not EARLY_EXIT_ENABLED or model is None:
+        return
+    if MODEL_BACKEND not in EXPLAINABLE_BACKENDS:
+        print(f"⚠️ Early exit is not available with the '{MODEL_BACKEND}' model backend")
+        return
+    
+    model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models')
+    boundaries = [optimal_threshold] + [point / 100 for point in DECISION_POINTS]
+    early_exit = early_exit_forest(model, model_dir, boundaries)
+    print(f"⏩ Early exit enabled over {early_exit.n_estimators} trees "
+          f"({'saved' if early_exit.ordered else 'natural'} tree order)")
+
+def load_lookup():
+    """Load the distilled app-form table when PCOS_LOOKUP_TABLE=1 and it matches the model"""
+    global lookup_table
+    lookup_table = None
+    if not LOOKUP_TABLE_ENABLED or model is None:
+        return
+    
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models', LOOKUP_TABLE_FILE)
+    if not os.path.exists(path):
+        print(f"⚠️ Lookup table not found: {path} (run lookup_table.py)")
+        return
+    boundaries = [optimal_threshold] + [point / 100 for point in DECISION_POINTS]
+    table = load_lookup_table(path, request_schema, boundaries)
+    if table.model_version != model_version:
+        print(f"⚠️ Lookup table was distilled from model {table.model_version}, not {model_version}; ignoring it")
+        return
+    lookup_table = table
+    print(f"🗂️ Lookup table loaded ({table.nbytes / 1e6:.1f} MB, fallback margin {table.margin:.4f})")
+
+def start_user_auth():
+    """Verifier for app users' Firebase ID tokens, if PCOS_FIREBASE_PROJECT is set"""
+    if not FIREBASE_PROJECT:
+        print("🔒 PCOS_FIREBASE_PROJECT not set; user history needs the admin token")
+        return None
+    try:
+        authenticator = UserAuthenticator(FIREBASE_PROJECT)
+        print(f"🔒 Verifying user ID tokens for Firebase project {FIREBASE_PROJECT}")
+        return authenticator
+    except Exception as e:
+        print(f"❌ User token verification not available, user history needs the admin token: {e}")
+        return None
+
+def start_shadow_scorer():
+    """Load the candidate bundle from PCOS_SHADOW_MODEL_DIR, if configured"""
+    if not SHADOW_MODEL_DIR:
+        return None
+    try:
+        scorer = ShadowScorer(SHADOW_MODEL_DIR, create_feature_vector).start()
+        print(f"🌓 Shadow model {scorer.bundle['version']} loaded from {SHADOW_MODEL_DIR}")
+        return scorer
+    except Exception as e:
+        print(f"❌ Shadow model not loaded: {e}")
+        return None
+
 # Load model at startup
 print("🚀 Starting Luna Care AI API...")
-model_loaded_successfully = load_model_components()
+model_loaded_successfully = reload_model_components()
+shadow_scorer = start_shadow_scorer()
+user_auth = start_user_auth()
+
+# Unfinished jobs from a previous run resume from their last completed chunk.
+# Workers start with the first request, not on import, so tools that import
+# this module and the debug reloader's watcher process never run jobs.
+bulk_jobs = JobManager(score_job_chunk, JOB_DIRECTORY, JOB_WORKERS, JOB_CHUNK_ROWS) if JOBS_ENABLED else None
+
+@app.before_request
+def start_bulk_jobs():
+    if bulk_jobs is not None and not bulk_jobs.started:
+        bulk_jobs.start()
 
 @app.route('/predict-pcos', methods=['POST'])
+@admission_controlled
+@coalesced
 def predict_pcos():
     """Enhanced PCOS prediction endpoint with dynamic risk assessment"""
+    request_start = time.perf_counter()
+    bundle = None
     try:
+        # Get request data
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'No JSON data provided'
+            }), 400
+        
+        # A registry variant may be requested; otherwise the default model serves it
+        variant = request.headers.get(VARIANT_HEADER) or (data.get(VARIANT_FIELD) if isinstance(data, dict) else None)
+        if variant:
+            try:
+                bundle = model_registry.get(variant)
+            except KeyError:
+                return jsonify({
+                    'success': False,
+                    'error': f"Unknown model variant '{variant}'",
+                    'variants': sorted(model_registry.current)
+                }), 404
+        
         # Check if model is loaded
-        if model is None:
+        if bundle is None and model is None:
             return jsonify({
                 'success': False,
                 'error': 'Model not loaded. Run train_pcos_model.py first!',
@@ -266,63 +880,125 @@ def predict_pcos():
                 }
             }), 500
         
-        # Get request data
-        data = request.get_json()
-        if not data:
+        # Validate and normalize before any model work
+        try:
+            record = (bundle.schema if bundle else request_schema).parse(data)
+        except SchemaError as e:
             return jsonify({
                 'success': False,
-                'error': 'No JSON data provided'
+                'error': 'Invalid request data',
+                'details': e.errors
             }), 400
         
+        record, history_fields = enrich_from_history(record, data)
+        
         print(f"📥 Received prediction request with keys: {list(data.keys())}")
         
-        # Create enhanced feature vector
-        features_array = create_feature_vector(data, feature_names)
+        explain, top_n = parse_explain_options()
+        if explain and bundle is not None:
+            return jsonify({
+                'success': False,
+                'error': 'Explanations are only available for the default model'
+            }), 400
+        if explain and MODEL_BACKEND not in EXPLAINABLE_BACKENDS:
+            return explanations_unavailable()
         
-        # Scale features
-        features_scaled = scaler.transform(features_array)
+        # Create enhanced feature vector
+        features_array = profiler.track('create_feature_vector', create_feature_vector, record,
+                                        bundle.feature_names if bundle else feature_names)
         
-        # Make prediction with optimal threshold
-        probabilities = model.predict_proba(features_scaled)[0]
+        # Scale features and make prediction with optimal threshold
+        predict_start = time.perf_counter()
+        trees_evaluated = None
+        looked_up = None
+        if bundle is None and lookup_table is not None and not explain and not wants_exact_score(data):
+            looked_up = profiler.track('lookup_table', lookup_table.lookup, record)
+        if bundle is not None:
+            probabilities = bundle.predict_proba(features_array)[0]
+        elif looked_up is not None:
+            probabilities = np.array([1 - looked_up, looked_up])
+        elif early_exit is not None and not explain and not wants_exact_score(data):
+            features_scaled = profiler.track('scaling', scaler.transform, features_array)
+            probabilities, trees_evaluated = profiler.track('predict_proba', early_exit.predict_proba, features_scaled)
+            probabilities, trees_evaluated = probabilities[0], int(trees_evaluated[0])
+        else:
+            probabilities = predict_probabilities(features_array)[0]
+        predict_ms = (time.perf_counter() - predict_start) * 1000
         risk_score = probabilities[1] * 100
+        threshold = bundle.threshold if bundle else optimal_threshold
+        
+        if bundle is None and drift_monitor is not None:
+            profiler.track('drift_monitor', drift_monitor.observe, features_array, probabilities[1:], (record,))
         
         # Use optimal threshold for classification
-        prediction = 1 if probabilities[1] > optimal_threshold else 0
+        prediction = 1 if probabilities[1] > threshold else 0
+        
+        # Non-blocking hand-off; the candidate scores the same history-filled
+        # input on its own thread. Lookup and early-exit scores are estimates,
+        # so those requests are not compared.
+        if bundle is None and shadow_scorer is not None:
+            if looked_up is not None or (trees_evaluated is not None and trees_evaluated < early_exit.n_estimators):
+                shadow_scorer.skip_estimate()
+            else:
+                shadow_scorer.submit(dict(data, **history_fields), float(probabilities[1]), prediction, predict_ms)
         
         # Dynamic risk level calculation
-        if risk_score >= 80:
-            risk_level = 'Very High'
-        elif risk_score >= 60:
-            risk_level = 'High'
-        elif risk_score >= 35:
-            risk_level = 'Moderate'
-        elif risk_score >= 15:
-            risk_level = 'Low'
-        else:
-            risk_level = 'Very Low'
+        risk_level = classify_risk(risk_score)
         
         # Generate personalized recommendations
-        recommendations = generate_dynamic_recommendations(data, risk_score, risk_level)
+        recommendations = generate_dynamic_recommendations(record, risk_score, risk_level)
         
         # Calculate confidence
         confidence = max(probabilities) * 100
         
+        # model_accuracy, features_used and threshold_used come from the cache
         result = {
             'success': True,
             'prediction': int(prediction),
-            'risk_score': round(risk_score, 1),
+            'risk_score': round(float(risk_score), 1),
             'risk_level': risk_level,
-            'confidence': round(confidence, 1),
-            'recommendations': recommendations,
-            'model_accuracy': round(model_info.get('accuracy', 0.61) * 100, 1),
-            'features_used': len(feature_names),
-            'threshold_used': round(optimal_threshold, 3)
+            'confidence': round(float(confidence), 1),
+            'recommendations': recommendations
         }
         
-        print(f"📤 Prediction: {risk_level} risk ({risk_score:.1f}%) - Threshold: {optimal_threshold:.3f}")
-        return jsonify(result)
+        if explain:
+            explanations, _ = explain_predictions(features_array, scaler.transform(features_array), top_n)
+            result['explanation'] = explanations[0]
+        
+        if history_fields:
+            result['history_features'] = history_fields
+        
+        # The unrounded probability is only sent when it came from the full model
+        if looked_up is None and (trees_evaluated is None or trees_evaluated == early_exit.n_estimators):
+            result['probability'] = float(probabilities[1])
+        
+        # Early-exit and lookup scores are estimates; their class and risk level
+        # match the full model with high probability (early exit's delta) or up
+        # to the lookup table's empirically measured fallback margin
+        if looked_up is not None:
+            result['inference'] = {'lookup_table': True, 'exact_score': False}
+        elif early_exit is not None and bundle is None:
+            result['inference'] = {
+                'trees_evaluated': trees_evaluated or early_exit.n_estimators,
+                'trees_total': early_exit.n_estimators,
+                'exact_score': trees_evaluated is None or trees_evaluated == early_exit.n_estimators
+            }
+        
+        print(f"📤 Prediction: {risk_level} risk ({risk_score:.1f}%) - Threshold: {threshold:.3f}")
+        latency_ms = (time.perf_counter() - request_start) * 1000
+        model_registry.metrics(bundle.variant if bundle else 'default').record(
+            latency_ms, prediction, float(risk_score), risk_level)
+        
+        if prediction_log is not None:
+            source = 'lookup_table' if looked_up is not None else 'early_exit' if trees_evaluated else 'model'
+            log_prediction(record, float(probabilities[1]), int(prediction), risk_level, float(threshold),
+                           bundle, source, latency_ms, history_fields)
+        
+        # Variant responses carry that bundle's accuracy, threshold, variant and version
+        return json_response((bundle.responses if bundle else response_cache).encode_prediction(result))
         
     except Exception as e:
+        model_registry.metrics(bundle.variant if bundle else 'default').record_error()
         error_msg = f"Prediction error: {str(e)}"
         print(f"❌ {error_msg}")
         print(f"Traceback: {traceback.format_exc()}")
@@ -336,76 +1012,489 @@ def predict_pcos():
             }
         }), 500
 
-@app.route('/model-info', methods=['GET'])
-def model_info_endpoint():
-    """Get enhanced model information"""
+@app.route('/explain-pcos', methods=['POST'])
+@admission_controlled
+@coalesced
+def explain_pcos():
+    """Risk scores with per-feature contributions for one payload or a list of payloads"""
     try:
-        if model_info is None:
+        if model is None:
             return jsonify({
                 'success': False,
-                'error': 'Model info not available',
-                'model_loaded': model is not None
+                'error': 'Model not loaded. Run train_pcos_model.py first!'
             }), 500
         
+        if MODEL_BACKEND not in EXPLAINABLE_BACKENDS:
+            return explanations_unavailable()
+        
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'No JSON data provided'
+            }), 400
+        
+        payloads = data if isinstance(data, list) else [data]
+        
+        # Validate the whole batch before scoring any of it
+        try:
+            records = [request_schema.parse(payload) for payload in payloads]
+        except SchemaError as e:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid request data',
+                'details': e.errors
+            }), 400
+        
+        _, top_n = parse_explain_options()
+        features_array = np.vstack([create_feature_vector(record, feature_names) for record in records])
+        features_scaled = scaler.transform(features_array)
+        
+        explanations, probabilities = explain_predictions(features_array, features_scaled, top_n)
+        
+        if drift_monitor is not None:
+            drift_monitor.observe(features_array, probabilities, records)
+        
+        results = [{
+            'risk_score': round(float(probability) * 100, 1),
+            'prediction': int(probability > optimal_threshold),
+            'explanation': explanation
+        } for probability, explanation in zip(probabilities, explanations)]
+        
+        # Only /predict-pcos carries the cached prediction constants
+        return json_response(dumps({
+            'success': True,
+            'results': results
+        }))
+        
+    except Exception as e:
+        error_msg = f"Explanation error: {str(e)}"
+        print(f"❌ {error_msg}")
+        print(f"Traceback: {traceback.format_exc()}")
+        
         return jsonify({
+            'success': False,
+            'error': error_msg
+        }), 500
+
+@app.route('/what-if-pcos', methods=['POST'])
+@admission_controlled
+@coalesced
+def what_if_pcos():
+    """Modelled risk change for lifestyle changes (lower BMI, exercise, no fast food) to one profile"""
+    try:
+        if model is None:
+            return jsonify({
+                'success': False,
+                'error': 'Model not loaded. Run train_pcos_model.py first!'
+            }), 500
+        
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'No JSON data provided'
+            }), 400
+        
+        try:
+            record = request_schema.parse(data)
+        except SchemaError as e:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid request data',
+                'details': e.errors
+            }), 400
+        
+        record, history_fields = enrich_from_history(record, data)
+        
+        # The profile and all of its variants are scored in one model call
+        start = time.perf_counter()
+        variants = expand_counterfactuals(record)
+        features_array = np.vstack([create_feature_vector(r, feature_names)
+                                    for r in [record] + [variant for _, variant in variants]])
+        scores = predict_probabilities(features_array)[:, 1] * 100
+        compute_ms = (time.perf_counter() - start) * 1000
+        
+        if drift_monitor is not None:
+            drift_monitor.observe(features_array[:1], scores[:1] / 100, (record,))
+        
+        baseline = float(scores[0])
+        counterfactuals = [dict(description,
+                                risk_score=round(float(score), 1),
+                                risk_change=round(float(score) - baseline, 1),
+                                risk_level=classify_risk(score),
+                                prediction=int(score / 100 > optimal_threshold))
+                           for (description, _), score in zip(variants, scores[1:])]
+        counterfactuals.sort(key=lambda c: c['risk_score'])
+        
+        return json_response(dumps({
             'success': True,
-            'accuracy': round(model_info.get('accuracy', 0) * 100, 1),
-            'accuracy_default': round(model_info.get('accuracy_default', 0) * 100, 1),
-            'optimal_threshold': model_info.get('optimal_threshold', 0.5),
-            'features_count': len(feature_names),
-            'training_samples': model_info.get('training_samples', 'Unknown'),
-            'test_samples': model_info.get('test_samples', 'Unknown'),
-            'model_type': 'Enhanced Random Forest Classifier',
-            'oob_score': model_info.get('oob_score'),
-            'class_weights': model_info.get('class_weights', {}),
-            'top_features': model_info.get('feature_importance', [])[:10]
-        })
+            'baseline': {
+                'risk_score': round(baseline, 1),
+                'risk_level': classify_risk(baseline),
+                'prediction': int(baseline / 100 > optimal_threshold)
+            },
+            'counterfactuals': counterfactuals,
+            'largest_reduction': counterfactuals[0]['label'] if counterfactuals else None,
+            'history_features': history_fields,
+            'compute_ms': round(compute_ms, 3)
+        }))
+        
     except Exception as e:
+        error_msg = f"What-if error: {str(e)}"
+        print(f"❌ {error_msg}")
+        print(f"Traceback: {traceback.format_exc()}")
+        
         return jsonify({
             'success': False,
-            'error': f"Model info error: {str(e)}"
+            'error': error_msg
         }), 500
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Enhanced health check"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    model_dir = os.path.join(current_dir, '..', 'models')
+@app.route('/history/<collection>', methods=['POST'])
+def record_history(collection):
+    """Fold newly logged cycle or daily-health documents into history features and health insights"""
+    if collection not in HISTORY_COLLECTIONS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown history collection '{collection}'",
+            'collections': sorted(HISTORY_COLLECTIONS)
+        }), 404
+    
+    if feature_store is None and health_stream is None:
+        return jsonify({
+            'success': False,
+            'error': 'History features are disabled (PCOS_FEATURE_STORE=0, PCOS_HEALTH_STREAM=0)'
+        }), 404
+    
+    if not is_admin_request() and request_uid() is None:
+        return jsonify({
+            'success': False,
+            'error': 'Sign-in required: send Authorization: Bearer <Firebase ID token>'
+        }), 401
+    
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'No JSON data provided'
+        }), 400
+    
+    name = HISTORY_COLLECTIONS[collection]
+    docs = data if isinstance(data, list) else [data]
+    denied = history_owner_error(docs)
+    if denied:
+        return denied
+    if feature_store is not None:
+        accepted = [doc for doc in docs if feature_store.observe(name, doc)]
+    else:
+        accepted = [doc for doc in docs if isinstance(doc, dict) and doc.get('userId')]
+    
+    # Logs must be sent in date order per user for the detectors; earlier dates are skipped
+    insights = []
+    if health_stream is not None and name == 'dailyHealth':
+        for doc in accepted:
+            insights.extend(health_stream.process_document(doc))
+    
+    if local_store is not None and accepted:
+        try:
+            local_store.insert(name, accepted)
+        except Exception as e:
+            print(f"❌ History logs not written to the local store: {e}")
     
     return jsonify({
-        'status': 'healthy',
-        'model_loaded': model is not None,
-        'scaler_loaded': scaler is not None,
-        'features_loaded': feature_names is not None,
-        'info_loaded': model_info is not None,
-        'all_components_ready': all([model, scaler, feature_names, model_info]),
-        'model_directory': model_dir,
-        'models_folder_exists': os.path.exists(model_dir),
-        'optimal_threshold': optimal_threshold,
-        'enhanced_features': True
+        'success': True,
+        'accepted': len(accepted),
+        'rejected': len(docs) - len(accepted),
+        'insights': insights
     })
 
+def jobs_disabled():
+    return jsonify({
+        'success': False,
+        'error': 'Bulk jobs are disabled (PCOS_JOBS=0)'
+    }), 404
+
+def job_not_found(job_id):
+    return jsonify({
+        'success': False,
+        'error': f"Unknown job '{job_id}'"
+    }), 404
+
+def job_too_large():
+    return jsonify({
+        'success': False,
+        'error': f"Job input is larger than {JOB_MAX_BYTES} bytes (PCOS_JOB_MAX_MB)"
+    }), 413
+
+@app.route('/jobs', methods=['POST'])
+@admission_controlled(lane=BULK)
+def submit_job():
+    """Spool a CSV or NDJSON file (multipart field 'file' or the raw body) as a bulk scoring job
+
+    Admin only. Uploads are capped at PCOS_JOB_MAX_MB and hold a bulk
+    admission slot while they are spooled.
+    """
+    denied = require_admin()
+    if denied:
+        return denied
+    if bulk_jobs is None:
+        return jobs_disabled()
+    
+    # Applies to the multipart parser and to the raw stream, with or without Content-Length
+    request.max_content_length = JOB_MAX_BYTES
+    try:
+        upload = request.files.get('file')
+    except RequestEntityTooLarge:
+        return job_too_large()
+    filename = upload.filename if upload is not None else ''
+    fmt = (request.args.get('format') or JOB_EXTENSIONS.get(os.path.splitext(filename)[1].lower()) or
+           JOB_MIMETYPES.get(request.mimetype))
+    if fmt not in FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f"Pass ?format= as one of {', '.join(FORMATS)}, or upload a .csv/.ndjson file"
+        }), 400
+    
+    def write_input(path):
+        if upload is not None:
+            upload.save(path)
+        else:
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(request.stream, f, 1 << 20)
+    
+    try:
+        job = bulk_jobs.submit(fmt, write_input, request.args.get('name') or filename or None)
+    except RequestEntityTooLarge:
+        return job_too_large()
+    print(f"📦 Bulk job {job['id']} queued ({job['input_bytes']} bytes of {fmt})")
+    return jsonify({
+        'success': True,
+        'job': job,
+        'status_url': f"/jobs/{job['id']}",
+        'output_url': f"/jobs/{job['id']}/output"
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job_status(job_id):
+    """Progress and throughput of a job; DELETE cancels it, or removes a finished job's files"""
+    denied = require_admin()
+    if denied:
+        return denied
+    if bulk_jobs is None:
+        return jobs_disabled()
+    
+    job = bulk_jobs.cancel(job_id) if request.method == 'DELETE' else bulk_jobs.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/jobs/<job_id>/output', methods=['GET'])
+def job_output(job_id):
+    """Results of a completed job as NDJSON, one line per input row in input order"""
+    denied = require_admin()
+    if denied:
+        return denied
+    if bulk_jobs is None:
+        return jobs_disabled()
+    
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    path = bulk_jobs.output_path(job_id)
+    if path is None:
+        return jsonify({
+            'success': False,
+            'error': f"Job is {job['status']}; output is available once it has completed",
+            'job': job
+        }), 409
+    return send_file(path, mimetype='application/x-ndjson', as_attachment=True,
+                     download_name=f"{job['name'] or job_id}.results.ndjson")
+
+@app.route('/model-info', methods=['GET'])
+def model_info_endpoint():
+    """Get enhanced model information"""
+    body, status = response_cache.get('model-info')
+    return json_response(body, status)
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Enhanced health check"""
+    body, status = response_cache.get('health')
+    return json_response(body, status)
+
 @app.route('/', methods=['GET'])
 def home():
     """API information"""
+    body, status = response_cache.get('home')
+    return json_response(body, status)
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Default model and the registry variants a request can select"""
     return jsonify({
-        'message': '🌸 Luna Care Enhanced AI API',
-        'version': '2.0',
-        'model_status': 'loaded' if model is not None else 'not loaded',
-        'model_accuracy': f"{model_info.get('accuracy', 0):.1%}" if model_info else 'Unknown',
-        'optimal_threshold': optimal_threshold,
-        'features_count': len(feature_names) if feature_names else 0,
-        'endpoints': ['/predict-pcos', '/model-info', '/health'],
-        'enhancements': [
-            'Class imbalance handling',
-            'Enhanced feature engineering',
-            'Optimal threshold detection',
-            'Dynamic risk assessment',
-            'Personalized recommendations'
-        ],
-        'ready': model is not None
+        'success': True,
+        'default': {'version': model_version, 'backend': MODEL_BACKEND},
+        'variants': model_registry.current,
+        'routing': {'header': VARIANT_HEADER, 'field': VARIANT_FIELD}
     })
 
+@app.route('/admin/models', methods=['GET', 'POST'])
+def registry_report():
+    """Loaded variants, memory use and per-variant metrics; POST re-reads CURRENT pointers"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if request.method == 'POST':
+        model_registry.refresh()
+    
+    return jsonify({'success': True, **model_registry.report()})
+
+@app.route('/admin/admission', methods=['GET'])
+def admission_report():
+    """Queue depths, admissions and 429/503 rejections per lane"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    return jsonify({'success': True, 'enabled': ADMISSION_ENABLED, **admission.report()})
+
+@app.route('/admin/coalescing', methods=['GET'])
+def coalescing_report():
+    """Shared computations and stored Idempotency-Key responses"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    return jsonify({
+        'success': True,
+        'single_flight': {
+            'executed': single_flight.executed,
+            'shared': single_flight.shared,
+            'in_flight': single_flight.in_flight()
+        },
+        'idempotency': idempotency_store.report()
+    })
+
+@app.route('/admin/prediction-log', methods=['GET'])
+def prediction_log_report():
+    """Buffer depth, drops and bytes written by the prediction log"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if prediction_log is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, **prediction_log.report()})
+
+@app.route('/admin/features', methods=['GET'])
+def feature_store_report():
+    """History feature store occupancy and hit rate; ?user_id= adds that user's aggregates"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if feature_store is None:
+        return jsonify({'success': True, 'enabled': False})
+    
+    report = feature_store.report()
+    report['user_auth'] = user_auth.report() if user_auth is not None else None
+    user_id = request.args.get('user_id')
+    if user_id:
+        report['user'] = feature_store.summary(user_id)
+    return jsonify({'success': True, 'enabled': True, **report})
+
+@app.route('/admin/health-stream', methods=['GET'])
+def health_stream_report():
+    """Events seen and insights fired by the daily-health detectors"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if health_stream is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, **health_stream.report()})
+
+@app.route('/admin/jobs', methods=['GET'])
+def jobs_report():
+    """Bulk job workers, queue and recent jobs"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if bulk_jobs is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, **bulk_jobs.report()})
+
+@app.route('/admin/profile/cpu', methods=['POST'])
+def profile_cpu():
+    """Sample busy threads for N seconds and return collapsed stacks for flamegraphs (?idle=1 keeps parked ones)"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    seconds = request.args.get('seconds', default=10, type=float)
+    interval_ms = request.args.get('interval_ms', default=5, type=float)
+    include_idle = request.args.get('idle', '0') != '0'
+    
+    try:
+        stacks = profiler.profile_cpu(max(seconds, 0.1), max(interval_ms, 1) / 1000, include_idle)
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    
+    return Response(collapsed_output(stacks), mimetype='text/plain')
+
+@app.route('/admin/profile/memory', methods=['GET', 'POST'])
+def profile_memory():
+    """POST toggles tracemalloc + stage allocation tracking; GET returns the report"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if request.method == 'POST':
+        options = request.get_json(silent=True) or {}
+        profiler.set_memory_tracking(bool(options.get('enabled', True)), int(options.get('frames', 10)))
+    
+    group_by = request.args.get('group', 'lineno')
+    if group_by not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'success': False, 'error': f"Unknown group '{group_by}'"}), 400
+    
+    report = profiler.memory_report(request.args.get('limit', default=25, type=int), group_by)
+    return jsonify({'success': True, **report})
+
+@app.route('/admin/shadow', methods=['GET', 'DELETE'])
+def shadow_report():
+    """Agreement, score deltas and latency of the shadow model; DELETE resets the counters"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if shadow_scorer is None:
+        return jsonify({
+            'success': False,
+            'error': 'No shadow model configured. Set PCOS_SHADOW_MODEL_DIR to a model bundle'
+        }), 404
+    
+    if request.method == 'DELETE':
+        shadow_scorer.reset()
+    
+    return jsonify({'success': True, 'primary_version': model_version, **shadow_scorer.report()})
+
+@app.route('/admin/drift', methods=['GET'])
+def drift_report():
+    """PSI/KS drift of live inputs and risk scores against the training profile"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if drift_monitor is None:
+        return jsonify({
+            'success': False,
+            'error': 'No reference profile for this model. Retrain to create reference_profile.json'
+        }), 404
+    
+    return jsonify({'success': True, 'model_version': model_version, **drift_monitor.report()})
+
 if __name__ == '__main__':
     print(f"\n🌸 Luna Care Enhanced AI API Status:")
     print(f"   Model loaded: {'✅ Yes' if model else '❌ No'}")
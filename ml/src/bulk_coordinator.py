@@ -0,0 +1,325 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+from bulk_jobs import DEFAULT_CHUNK_ROWS, FORMATS, csv_header, line_ranges, read_chunk
+
+# Shards are byte ranges of about this size, and every worker starts with at
+# least SHARDS_PER_WORKER of them, so there is always something left to steal
+DEFAULT_SHARD_MB = 4
+SHARDS_PER_WORKER = 8
+
+MANIFEST_FILE = 'manifest.json'
+QUEUE_DIR = 'queues'
+CLAIMED_DIR = 'claimed'
+RESULT_DIR = 'results'
+WORKER_DIR = 'workers'
+
+# Rounds of re-running shards whose worker died before writing results
+MAX_ROUNDS = 3
+
+def available_cpus():
+    """CPUs this process may run on, which can be fewer than the host has"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    return 'csv' if extension == '.csv' else 'ndjson'
+
+def prepare(run_dir, inputs, workers, shard_mb=DEFAULT_SHARD_MB, fmt=None):
+    """Write the shard manifest and deal the shards out to per-worker queues
+
+    Each input file is split into line-aligned byte ranges. Worker k owns a
+    contiguous block of shards (queues/<k>/<shard>), so a skewed region of
+    the input lands on one owner and the others steal its tail.
+    """
+    fmt = fmt or _detect_format(inputs[0])
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}' (expected one of {', '.join(FORMATS)})")
+
+    sizes = [os.path.getsize(path) for path in inputs]
+    total = sum(sizes)
+    target = max(workers * SHARDS_PER_WORKER, math.ceil(total / (shard_mb * 1024 * 1024)))
+
+    sources = []
+    shards = []
+    for source, (path, size) in enumerate(zip(inputs, sizes)):
+        header, start = csv_header(path) if fmt == 'csv' else (None, 0)
+        sources.append({'path': os.path.abspath(path), 'header': header, 'bytes': size})
+        parts = max(1, round(target * size / total)) if total else 1
+        shards += [(source, s, e) for s, e in line_ranges(path, parts, start)]
+
+    if os.path.isdir(run_dir) and os.listdir(run_dir):
+        raise ValueError(f"Run directory {run_dir} is not empty")
+    for name in (CLAIMED_DIR, RESULT_DIR, WORKER_DIR):
+        os.makedirs(os.path.join(run_dir, name))
+    per_worker = math.ceil(len(shards) / workers) if shards else 0
+    for worker in range(workers):
+        queue_dir = os.path.join(run_dir, QUEUE_DIR, str(worker))
+        os.makedirs(queue_dir)
+        for shard in range(worker * per_worker, min((worker + 1) * per_worker, len(shards))):
+            open(os.path.join(queue_dir, f"{shard:06d}"), 'w').close()
+
+    manifest = {'format': fmt, 'sources': sources, 'shards': shards, 'workers': workers,
+                'created_at': time.time()}
+    with open(os.path.join(run_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+def _try_claim(run_dir, owner, shard, worker):
+    """Atomically move a shard from a queue to claimed/; only one worker can win the rename"""
+    try:
+        os.rename(os.path.join(run_dir, QUEUE_DIR, str(owner), shard),
+                  os.path.join(run_dir, CLAIMED_DIR, f"{shard}.{worker}"))
+        return True
+    except FileNotFoundError:
+        return False
+
+def claim(run_dir, worker):
+    """Next shard for a worker: the head of its own queue, else the tail of the fullest other queue
+
+    Returns (shard number, stolen) or (None, False) when every queue is empty.
+    """
+    own = os.path.join(run_dir, QUEUE_DIR, str(worker))
+    while True:
+        for shard in sorted(os.listdir(own)) if os.path.isdir(own) else ():
+            if _try_claim(run_dir, worker, shard, worker):
+                return int(shard), False
+
+        queues = []
+        for owner in os.listdir(os.path.join(run_dir, QUEUE_DIR)):
+            if owner != str(worker):
+                pending = os.listdir(os.path.join(run_dir, QUEUE_DIR, owner))
+                if pending:
+                    queues.append((len(pending), owner, pending))
+        if not queues:
+            return None, False
+        _, owner, pending = max(queues)
+        for shard in sorted(pending, reverse=True):
+            if _try_claim(run_dir, owner, shard, worker):
+                return int(shard), True
+        # Everything we saw was taken meanwhile; look again
+
+def run_worker(run_dir, worker, batch_rows=DEFAULT_CHUNK_ROWS):
+    """Score shards until no queue has any left; the model is loaded once per worker"""
+    # A worker only scores; the API's background services stay off in its process
+    for name in ('PCOS_JOBS', 'PCOS_PREDICTION_LOG', 'PCOS_HEALTH_STREAM', 'PCOS_FEATURE_STORE'):
+        os.environ.setdefault(name, '0')
+    start = time.perf_counter()
+    start_cpu = time.process_time()
+    import api_fixed as api
+    if api.model is None:
+        raise RuntimeError('Model not loaded. Run train_pcos_model.py first!')
+    load_seconds = time.perf_counter() - start
+    load_cpu_seconds = time.process_time() - start_cpu
+
+    with open(os.path.join(run_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    stats = {'worker': worker, 'host': socket.gethostname(), 'pid': os.getpid(),
+             'load_seconds': round(load_seconds, 3), 'load_cpu_seconds': round(load_cpu_seconds, 3), 'shards': 0, 'stolen': 0, 'rows': 0, 'busy_seconds': 0.0,
+             'cpu_seconds': 0.0}
+    while True:
+        shard, stolen = claim(run_dir, worker)
+        if shard is None:
+            break
+        busy = time.perf_counter()
+        cpu = time.process_time()
+        source, begin, end = manifest['shards'][shard]
+        source = manifest['sources'][source]
+        payloads = read_chunk(source['path'], manifest['format'], source['header'], begin, end)
+
+        path = os.path.join(run_dir, RESULT_DIR, f"{shard:06d}.ndjson")
+        with open(path + '.tmp', 'w') as f:
+            for i in range(0, len(payloads), batch_rows):
+                for result in api.score_payloads(payloads[i:i + batch_rows]):
+                    f.write(json.dumps(result, separators=(',', ':')) + '\n')
+        os.replace(path + '.tmp', path)
+        os.remove(os.path.join(run_dir, CLAIMED_DIR, f"{shard:06d}.{worker}"))
+
+        stats['shards'] += 1
+        stats['stolen'] += stolen
+        stats['rows'] += len(payloads)
+        stats['busy_seconds'] += time.perf_counter() - busy
+        stats['cpu_seconds'] += time.process_time() - cpu
+
+    stats['busy_seconds'] = round(stats['busy_seconds'], 3)
+    stats['cpu_seconds'] = round(stats['cpu_seconds'], 3)
+    with open(os.path.join(run_dir, WORKER_DIR, f"{worker}.json"), 'w') as f:
+        json.dump(stats, f)
+    return stats
+
+def requeue_abandoned(run_dir):
+    """Put shards claimed by workers that died without results back on queue 0"""
+    requeued = 0
+    for name in os.listdir(os.path.join(run_dir, CLAIMED_DIR)):
+        shard = name.split('.')[0]
+        if not os.path.exists(os.path.join(run_dir, RESULT_DIR, f"{shard}.ndjson")):
+            os.rename(os.path.join(run_dir, CLAIMED_DIR, name), os.path.join(run_dir, QUEUE_DIR, '0', shard))
+            requeued += 1
+    return requeued
+
+def merge(run_dir, output):
+    """Concatenate shard results in input order into one NDJSON file, numbering the rows"""
+    with open(os.path.join(run_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    missing = [shard for shard in range(len(manifest['shards']))
+               if not os.path.exists(os.path.join(run_dir, RESULT_DIR, f"{shard:06d}.ndjson"))]
+    if missing:
+        raise RuntimeError(f"{len(missing)} shards have no results yet (first: {missing[0]})")
+
+    row = 0
+    with open(output + '.tmp', 'w') as out:
+        for shard in range(len(manifest['shards'])):
+            with open(os.path.join(run_dir, RESULT_DIR, f"{shard:06d}.ndjson")) as f:
+                for line in f:
+                    # Results are JSON objects, so the row number is spliced in without re-encoding
+                    out.write(f'{{"row":{row},{line[1:]}')
+                    row += 1
+    os.replace(output + '.tmp', output)
+    return row
+
+def run(inputs, output, workers, shard_mb=DEFAULT_SHARD_MB, fmt=None, run_dir=None, keep=False):
+    """Score input files with N local worker processes; returns a report"""
+    run_dir = run_dir or tempfile.mkdtemp(prefix='bulk_run_', dir=os.path.dirname(os.path.abspath(output)))
+    start = time.perf_counter()
+    manifest = prepare(run_dir, inputs, workers, shard_mb, fmt)
+    try:
+        for _ in range(MAX_ROUNDS):
+            processes = [multiprocessing.Process(target=run_worker, args=(run_dir, worker))
+                         for worker in range(workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            if not requeue_abandoned(run_dir):
+                break
+            print("⚠️ A worker exited early; re-running its shards")
+
+        rows = merge(run_dir, output)
+        elapsed = time.perf_counter() - start
+        worker_stats = []
+        for name in sorted(os.listdir(os.path.join(run_dir, WORKER_DIR))):
+            with open(os.path.join(run_dir, WORKER_DIR, name)) as f:
+                worker_stats.append(json.load(f))
+    finally:
+        if not keep:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    return {
+        'rows': rows,
+        'workers': workers,
+        'shards': len(manifest['shards']),
+        'stolen': sum(w['stolen'] for w in worker_stats),
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else None,
+        'worker_stats': worker_stats
+    }
+
+def scaling(inputs, workers, shard_mb=DEFAULT_SHARD_MB, fmt=None):
+    """Run the same inputs with 1..N workers and report speedup and efficiency
+
+    Wall-clock speedup is only a scaling measurement up to the number of
+    available CPUs; runs with more workers than that are marked
+    oversubscribed. Each run also reports the scoring CPU time summed over
+    its workers (work_efficiency is the 1-worker total over this one, so
+    sharding and stealing overhead shows up as a drop below 1) and a
+    projected speedup from per-worker CPU time for model load and scoring,
+    which assumes a free core per worker.
+    """
+    cpus = available_cpus()
+    directory = tempfile.mkdtemp(prefix='bulk_scaling_')
+    reports = []
+    try:
+        for n in range(1, workers + 1):
+            report = run(inputs, os.path.join(directory, f"out{n}.ndjson"), n, shard_mb, fmt)
+            stats = report['worker_stats']
+            report['cpus'] = cpus
+            report['oversubscribed'] = n > cpus
+            report['cpu_seconds'] = round(sum(w['cpu_seconds'] for w in stats), 3)
+            report['critical_seconds'] = round(max(w['cpu_seconds'] for w in stats) +
+                                               max(w['load_cpu_seconds'] for w in stats), 3)
+            base = reports[0] if reports else report
+            report['speedup'] = round(base['seconds'] / report['seconds'], 2)
+            report['efficiency'] = round(report['speedup'] / n, 2)
+            report['work_efficiency'] = round(base['cpu_seconds'] / report['cpu_seconds'], 2)
+            report['projected_speedup'] = round(base['critical_seconds'] / report['critical_seconds'], 2)
+            reports.append(report)
+            print(f"   {n} worker(s): {report['rows_per_second']:>10.0f} rows/s  speedup {report['speedup']:.2f}  "
+                  f"efficiency {report['efficiency']:.0%}  work {report['work_efficiency']:.0%}  "
+                  f"projected {report['projected_speedup']:.2f}  ({report['shards']} shards, "
+                  f"{report['stolen']} stolen){'  oversubscribed' if report['oversubscribed'] else ''}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    if workers > cpus:
+        print(f"⚠️ Only {cpus} CPU(s) available: wall-clock speedup past {cpus} worker(s) is not a scaling "
+              f"measurement; 'projected' assumes a free core per worker")
+    return reports
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Distributed bulk scoring over byte-range shards with work stealing')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    local = subparsers.add_parser('run', help='score files with N local worker processes')
+    local.add_argument('inputs', nargs='+')
+    local.add_argument('--output', required=True)
+    local.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    local.add_argument('--shard-mb', type=float, default=DEFAULT_SHARD_MB)
+    local.add_argument('--format', choices=FORMATS)
+
+    prep = subparsers.add_parser('prepare', help='shard files into a shared run directory for remote workers')
+    prep.add_argument('run_dir')
+    prep.add_argument('inputs', nargs='+')
+    prep.add_argument('--workers', type=int, required=True)
+    prep.add_argument('--shard-mb', type=float, default=DEFAULT_SHARD_MB)
+    prep.add_argument('--format', choices=FORMATS)
+
+    worker = subparsers.add_parser('worker', help='score shards from a shared run directory')
+    worker.add_argument('run_dir')
+    worker.add_argument('--worker-id', type=int, required=True)
+
+    combine = subparsers.add_parser('merge', help='merge shard results once every worker is done')
+    combine.add_argument('run_dir')
+    combine.add_argument('--output', required=True)
+    combine.add_argument('--requeue', action='store_true', help='requeue shards of dead workers instead')
+
+    scale = subparsers.add_parser('scaling', help='report throughput and efficiency from 1 to N workers')
+    scale.add_argument('inputs', nargs='+')
+    scale.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    scale.add_argument('--shard-mb', type=float, default=DEFAULT_SHARD_MB)
+    scale.add_argument('--format', choices=FORMATS)
+    scale.add_argument('--report', help='also write the per-run reports to this JSON file')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        report = run(args.inputs, args.output, args.workers, args.shard_mb, args.format)
+        print(f"📦 Scored {report['rows']} rows with {report['workers']} workers in {report['seconds']}s "
+              f"({report['rows_per_second']} rows/s, {report['shards']} shards, {report['stolen']} stolen)")
+    elif args.command == 'prepare':
+        manifest = prepare(args.run_dir, args.inputs, args.workers, args.shard_mb, args.format)
+        print(f"📦 {len(manifest['shards'])} shards for {args.workers} workers in {args.run_dir}")
+    elif args.command == 'worker':
+        stats = run_worker(args.run_dir, args.worker_id)
+        print(f"📦 Worker {args.worker_id}: {stats['rows']} rows in {stats['shards']} shards "
+              f"({stats['stolen']} stolen, model loaded in {stats['load_seconds']}s)")
+    elif args.command == 'merge':
+        if args.requeue:
+            print(f"📦 Requeued {requeue_abandoned(args.run_dir)} abandoned shards")
+        else:
+            print(f"📦 Merged {merge(args.run_dir, args.output)} rows into {args.output}")
+    else:
+        print(f"⏱️ Scaling from 1 to {args.workers} workers on {available_cpus()} of {os.cpu_count()} CPU(s) "
+              f"({socket.gethostname()})")
+        reports = scaling(args.inputs, args.workers, args.shard_mb, args.format)
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(reports, f, indent=2)
+            print(f"💾 Scaling report saved to {args.report}")
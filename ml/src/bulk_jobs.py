@@ -0,0 +1,354 @@
+import csv
+import io
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+JOB_DIR = os.path.join(CURRENT_DIR, '..', 'data', 'jobs')
+
+FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_ROWS = 5000
+DEFAULT_WORKERS = 1
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+INPUT_FILE = 'input'
+INDEX_FILE = 'index.json'
+STATE_FILE = 'job.json'
+OUTPUT_FILE = 'output.ndjson'
+CHUNK_DIR = 'chunks'
+
+def _write_json(path, data):
+    """Replace a JSON file atomically, so a crash leaves the old or the new version"""
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+def line_ranges(path, parts, start=0):
+    """Split a file from `start` on into up to `parts` byte ranges that begin and end on line boundaries"""
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(start + (size - start) * i // parts, bounds[-1]))
+            f.readline()
+            position = min(f.tell(), size)
+            if position > bounds[-1]:
+                bounds.append(position)
+    if bounds[-1] != size:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def csv_header(path):
+    """Column names of a CSV file and the byte offset where its rows begin"""
+    with open(path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8-sig')]), None)
+        return header, f.tell()
+
+def index_input(path, fmt, chunk_rows):
+    """Byte ranges of chunk_rows-record chunks (one record per line), plus the CSV header"""
+    chunks = []
+    header, start = csv_header(path) if fmt == 'csv' else (None, 0)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        rows = 0
+        position = start
+        for line in f:
+            position += len(line)
+            if not line.strip():
+                continue
+            rows += 1
+            if rows == chunk_rows:
+                chunks.append((start, position, rows))
+                start, rows = position, 0
+        if rows:
+            chunks.append((start, position, rows))
+    return {'header': header, 'chunks': chunks, 'total_rows': sum(rows for _, _, rows in chunks)}
+
+def read_chunk(path, fmt, header, start, end):
+    """Payload dicts of one chunk; a line that cannot be parsed becomes None"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = [line for line in f.read(end - start).decode('utf-8').splitlines() if line.strip()]
+    if fmt == 'csv':
+        # Empty cells are fields that were not sent
+        return [{key: (value if value != '' else None) for key, value in zip(header, values)}
+                for values in csv.reader(io.StringIO('\n'.join(lines)))]
+    payloads = []
+    for line in lines:
+        try:
+            payloads.append(json.loads(line))
+        except ValueError:
+            payloads.append(None)
+    return payloads
+
+class JobManager:
+    """Bulk scoring jobs spooled to disk and processed in chunks by a worker pool
+
+    Each job has its own directory holding the uploaded input, a chunk
+    index, one result file per finished chunk and job.json with its state.
+    Result files are renamed into place only when complete, so a restart
+    resumes every unfinished job from its first missing chunk. Workers are
+    their own threads, separate from the request threads; `score_chunk`
+    takes a list of payloads (None for unparseable lines) and returns one
+    result dict per payload.
+    """
+
+    def __init__(self, score_chunk, directory=JOB_DIR, workers=DEFAULT_WORKERS, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.score_chunk = score_chunk
+        self.directory = directory
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        """Load existing jobs, requeue the unfinished ones and start the workers; later calls do nothing"""
+        with self._start_lock:
+            if not self.started:
+                self._start()
+                self.started = True
+        return self
+
+    def _start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        pending = []
+        for job_id in os.listdir(self.directory):
+            path = os.path.join(self.directory, job_id, STATE_FILE)
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                job = json.load(f)
+            self._jobs[job_id] = job
+            if job['status'] not in FINISHED:
+                pending.append(job)
+        for job in sorted(pending, key=lambda job: job['created_at']):
+            self._queue.put(job['id'])
+        if pending:
+            print(f"📦 Resuming {len(pending)} unfinished bulk job(s)")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'bulk-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _path(self, job_id, *names):
+        return os.path.join(self.directory, job_id, *names)
+
+    def _save(self, job):
+        # Caller holds the lock
+        _write_json(self._path(job['id'], STATE_FILE), job)
+
+    def submit(self, fmt, write_input, name=None):
+        """Create a job; write_input(path) spools the upload to disk. Returns the job state"""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}' (expected one of {', '.join(FORMATS)})")
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._path(job_id, CHUNK_DIR))
+        try:
+            write_input(self._path(job_id, INPUT_FILE))
+        except Exception:
+            shutil.rmtree(self._path(job_id), ignore_errors=True)
+            raise
+
+        job = {
+            'id': job_id,
+            'name': name,
+            'format': fmt,
+            'status': QUEUED,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'input_bytes': os.path.getsize(self._path(job_id, INPUT_FILE)),
+            'chunk_rows': self.chunk_rows,
+            'total_rows': None,
+            'total_chunks': None,
+            'chunks_done': 0,
+            'rows_done': 0,
+            'rows_failed': 0,
+            'rows_per_second': None,
+            'cancel_requested': False,
+            'error': None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._save(job)
+        self._queue.put(job_id)
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = dict(job)
+        if status['total_rows']:
+            status['progress'] = round(status['rows_done'] / status['total_rows'], 4)
+            if status['rows_per_second'] and status['status'] == RUNNING:
+                status['eta_seconds'] = round((status['total_rows'] - status['rows_done']) /
+                                              status['rows_per_second'], 1)
+        return status
+
+    def output_path(self, job_id):
+        """Path of a completed job's results, or None"""
+        job = self.get(job_id)
+        if job is None or job['status'] != COMPLETED:
+            return None
+        return self._path(job_id, OUTPUT_FILE)
+
+    def cancel(self, job_id):
+        """Stop a queued or running job after its current chunk; finished jobs have their files removed"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in FINISHED:
+                del self._jobs[job_id]
+                shutil.rmtree(self._path(job_id), ignore_errors=True)
+                return dict(job, deleted=True)
+            job['cancel_requested'] = True
+            if job['status'] == QUEUED:
+                self._finish(job, CANCELLED)
+            else:
+                self._save(job)
+            return dict(job)
+
+    def _finish(self, job, status, error=None):
+        # Caller holds the lock; only job.json and a completed job's output are kept
+        job['status'] = status
+        job['error'] = error
+        job['finished_at'] = time.time()
+        for name in (INPUT_FILE, INDEX_FILE, CHUNK_DIR):
+            path = self._path(job['id'], name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        self._save(job)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            try:
+                self._process(job_id)
+            except Exception as e:
+                print(f"❌ Bulk job {job_id} failed: {e}")
+                with self._lock:
+                    job = self._jobs.get(job_id)
+                    if job is not None and job['status'] not in FINISHED:
+                        self._finish(job, FAILED, str(e))
+
+    def _load_index(self, job):
+        path = self._path(job['id'], INDEX_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        index = index_input(self._path(job['id'], INPUT_FILE), job['format'], job['chunk_rows'])
+        _write_json(path, index)
+        return index
+
+    def _chunk_path(self, job_id, number):
+        return self._path(job_id, CHUNK_DIR, f"{number:06d}.ndjson")
+
+    def _count_done(self, job, index):
+        """Rows and failures in the chunk files already written, for a resumed job"""
+        chunks = rows = failed = 0
+        for number, (_, _, chunk_rows) in enumerate(index['chunks']):
+            path = self._chunk_path(job['id'], number)
+            if not os.path.exists(path):
+                continue
+            chunks += 1
+            rows += chunk_rows
+            with open(path) as f:
+                failed += sum(1 for line in f if not json.loads(line).get('success'))
+        return chunks, rows, failed
+
+    def _process(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINISHED:
+                return
+            fmt = job['format']
+
+        index = self._load_index(job)
+        chunks_done, rows_done, rows_failed = self._count_done(job, index)
+        with self._lock:
+            job.update(status=RUNNING, total_rows=index['total_rows'], total_chunks=len(index['chunks']),
+                       chunks_done=chunks_done, rows_done=rows_done, rows_failed=rows_failed)
+            job['started_at'] = job['started_at'] or time.time()
+            self._save(job)
+
+        input_path = self._path(job_id, INPUT_FILE)
+        session_start = time.perf_counter()
+        session_rows = 0
+        for number, (start, end, _) in enumerate(index['chunks']):
+            with self._lock:
+                if job['cancel_requested']:
+                    self._finish(job, CANCELLED)
+                    return
+            path = self._chunk_path(job_id, number)
+            if os.path.exists(path):
+                continue
+
+            payloads = read_chunk(input_path, fmt, index['header'], start, end)
+            results = self.score_chunk(payloads)
+            first_row = number * job['chunk_rows']
+            failed = 0
+            with open(path + '.tmp', 'w') as f:
+                for offset, result in enumerate(results):
+                    failed += not result.get('success')
+                    f.write(json.dumps(dict(result, row=first_row + offset), separators=(',', ':')) + '\n')
+            os.replace(path + '.tmp', path)
+
+            session_rows += len(payloads)
+            with self._lock:
+                job['chunks_done'] += 1
+                job['rows_done'] += len(payloads)
+                job['rows_failed'] += failed
+                job['rows_per_second'] = round(session_rows / (time.perf_counter() - session_start), 1)
+                self._save(job)
+
+        # Chunk files are concatenated in order into the single output file
+        output = self._path(job_id, OUTPUT_FILE)
+        with open(output + '.tmp', 'wb') as out:
+            for number in range(len(index['chunks'])):
+                with open(self._chunk_path(job_id, number), 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(output + '.tmp', output)
+        with self._lock:
+            self._finish(job, COMPLETED)
+        print(f"📦 Bulk job {job_id} completed: {job['rows_done']} rows ({job['rows_failed']} invalid)")
+
+    def report(self):
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values()]
+        by_status = {}
+        for job in jobs:
+            by_status[job['status']] = by_status.get(job['status'], 0) + 1
+        recent = sorted(jobs, key=lambda job: job['created_at'], reverse=True)[:20]
+        return {
+            'directory': os.path.abspath(self.directory),
+            'workers': self.workers,
+            'chunk_rows': self.chunk_rows,
+            'queued': self._queue.qsize(),
+            'jobs': by_status,
+            'recent': [{key: job[key] for key in ('id', 'name', 'status', 'rows_done', 'total_rows',
+                                                  'rows_per_second', 'created_at')} for job in recent]
+        }
@@ -0,0 +1,423 @@
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+import joblib
+import numpy as np
+
+COMPACT_MODEL_FILE = 'pcos_model_compact.npz'
+
+class CompactForest:
+    """Random forest packed into flat typed arrays (float32 thresholds, int16/int32 nodes)
+
+    Node indices are local to each tree; `offsets` maps tree t's node 0 to its
+    position in the flat arrays. Leaves point at themselves, so every tree can
+    be advanced `max_depth` times in lockstep without branching.
+    """
+
+    def __init__(self, feature, threshold, left, right, value_index, values,
+                 offsets, max_depth, n_features, classes, meta=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value_index = value_index
+        self.values = values
+        self.offsets = offsets
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.classes_ = np.asarray(classes)
+        self.meta = meta or {}
+
+    @property
+    def n_estimators(self):
+        return len(self.offsets)
+
+    @property
+    def nbytes(self):
+        arrays = (self.feature, self.threshold, self.left, self.right,
+                  self.value_index, self.values, self.offsets)
+        return sum(a.nbytes for a in arrays)
+
+    def tree_probabilities(self, X, trees=None, depth=None):
+        """Positive-class probability from every tree (or the given tree indices), shape (n_samples, n_trees)
+
+        depth may be passed when the selected trees are known to be shallower than max_depth.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        offsets = (self.offsets if trees is None else self.offsets[trees])[None, :]
+        node = np.zeros((X.shape[0], offsets.shape[1]), dtype=np.int64)
+
+        for _ in range(self.max_depth if depth is None else depth):
+            flat = offsets + node
+            go_left = X[rows, self.feature[flat]] <= self.threshold[flat]
+            node = np.where(go_left, self.left[flat], self.right[flat])
+
+        return self.values[self.value_index[offsets + node]].astype(np.float64)
+
+    def predict_proba(self, X):
+        positive = self.tree_probabilities(X).mean(axis=1)
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+    def select_trees(self, keep):
+        """Return a new forest containing only the trees at the given indices"""
+        parts = {'feature': [], 'threshold': [], 'left': [], 'right': [], 'value_index': []}
+        offsets = []
+        total = 0
+        ends = np.append(self.offsets[1:], len(self.feature))
+
+        for t in keep:
+            start, end = self.offsets[t], ends[t]
+            for name in parts:
+                parts[name].append(getattr(self, name)[start:end])
+            offsets.append(total)
+            total += end - start
+
+        return CompactForest(
+            *(np.concatenate(parts[name]) for name in
+              ('feature', 'threshold', 'left', 'right', 'value_index')),
+            self.values, np.array(offsets, dtype=np.int64), self.max_depth,
+            self.n_features_in_, self.classes_, dict(self.meta)
+        )
+
+    def tree_depths(self):
+        """Depth of every tree, shape (n_trees,)"""
+        # Nodes are numbered in preorder, so a parent always precedes its children
+        ends = np.append(self.offsets[1:], len(self.feature))
+        node_tree = np.repeat(np.arange(self.n_estimators), ends - self.offsets)
+        local = np.arange(len(self.feature)) - self.offsets[node_tree]
+        internal = self.left != local
+        parents = np.flatnonzero(internal)
+        children = np.concatenate([self.offsets[node_tree[parents]] + self.left[parents],
+                                   self.offsets[node_tree[parents]] + self.right[parents]])
+        depth = np.zeros(len(self.feature), dtype=np.int64)
+        for _ in range(self.max_depth):
+            depth[children] = np.tile(depth[parents], 2) + 1
+        return np.maximum.reduceat(depth, self.offsets)
+
+    def node_table(self):
+        """Global node arrays in the layout used by TreePathExplainer"""
+        node_tree = np.repeat(self.offsets, np.diff(np.append(self.offsets, len(self.feature))))
+        return {
+            'left': self.left.astype(np.intp) + node_tree,
+            'right': self.right.astype(np.intp) + node_tree,
+            'feature': self.feature.astype(np.intp),
+            'threshold': self.threshold.astype(np.float64),
+            'value': self.values[self.value_index].astype(np.float64),
+            'roots': self.offsets.astype(np.intp),
+            'max_depth': self.max_depth
+        }
+
+    def save(self, path):
+        np.savez_compressed(
+            path, feature=self.feature, threshold=self.threshold, left=self.left,
+            right=self.right, value_index=self.value_index, values=self.values,
+            offsets=self.offsets, classes=self.classes_,
+            header=np.array([self.max_depth, self.n_features_in_], dtype=np.int64),
+            meta=np.array(json.dumps(self.meta))
+        )
+
+def load_compact_forest(path):
+    """Load a bundle written by CompactForest.save"""
+    with np.load(path, allow_pickle=False) as bundle:
+        max_depth, n_features = bundle['header']
+        return CompactForest(
+            bundle['feature'], bundle['threshold'], bundle['left'], bundle['right'],
+            bundle['value_index'], bundle['values'], bundle['offsets'],
+            max_depth, n_features, bundle['classes'], json.loads(str(bundle['meta']))
+        )
+
+def _float32_floor(thresholds):
+    """Largest float32 <= each threshold, so float32 inputs split exactly as before"""
+    rounded = thresholds.astype(np.float32)
+    too_high = rounded.astype(np.float64) > thresholds
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+def _collapse_tree(tree, class_index, leaf_tolerance):
+    """Merge sibling leaves whose probabilities agree, returning renumbered node arrays"""
+    left = tree.children_left
+    right = tree.children_right
+    class_values = tree.value[:, 0, :]
+    totals = class_values.sum(axis=1)
+    proba = np.divide(class_values[:, class_index], totals,
+                      out=np.zeros(tree.node_count), where=totals > 0)
+
+    # Children always have larger ids than their parent, so a reverse sweep is bottom-up
+    is_leaf = left < 0
+    for node in range(tree.node_count - 1, -1, -1):
+        if not is_leaf[node]:
+            l, r = left[node], right[node]
+            if is_leaf[l] and is_leaf[r] and abs(proba[l] - proba[r]) <= leaf_tolerance:
+                is_leaf[node] = True
+
+    # Renumber the surviving nodes in preorder
+    order = []
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if not is_leaf[node]:
+            stack.append(right[node])
+            stack.append(left[node])
+
+    order = np.array(order)
+    new_id = np.full(tree.node_count, -1, dtype=np.int64)
+    new_id[order] = np.arange(len(order))
+
+    leaf = is_leaf[order]
+    local_ids = np.arange(len(order))
+    new_left = np.where(leaf, local_ids, new_id[left[order]])
+    new_right = np.where(leaf, local_ids, new_id[right[order]])
+    feature = np.where(leaf, 0, tree.feature[order])
+    threshold = np.where(leaf, 0.0, tree.threshold[order])
+
+    # Depth of the collapsed tree bounds the number of traversal steps
+    depth = np.zeros(len(order), dtype=np.int64)
+    for i in range(len(order)):
+        if not leaf[i]:
+            depth[new_left[i]] = depth[i] + 1
+            depth[new_right[i]] = depth[i] + 1
+
+    return feature, threshold, new_left, new_right, proba[order], int(depth.max())
+
+def compact_forest(model, leaf_tolerance=0.0, positive_class=1):
+    """Pack a fitted RandomForestClassifier into a CompactForest
+
+    With leaf_tolerance=0 the packed forest predicts exactly like the original.
+    """
+    class_index = list(model.classes_).index(positive_class)
+    parts = [_collapse_tree(est.tree_, class_index, leaf_tolerance) for est in model.estimators_]
+
+    largest_tree = max(len(p[0]) for p in parts)
+    index_dtype = np.int16 if largest_tree <= np.iinfo(np.int16).max else np.int32
+
+    offsets = np.cumsum([0] + [len(p[0]) for p in parts[:-1]]).astype(np.int64)
+    proba = np.concatenate([p[4] for p in parts]).astype(np.float32)
+
+    # Many nodes share a value (e.g. pure leaves), so store each distinct value once
+    values, value_index = np.unique(proba, return_inverse=True)
+    value_dtype = np.uint16 if len(values) <= np.iinfo(np.uint16).max else np.uint32
+
+    return CompactForest(
+        feature=np.concatenate([p[0] for p in parts]).astype(np.int16),
+        threshold=_float32_floor(np.concatenate([p[1] for p in parts])),
+        left=np.concatenate([p[2] for p in parts]).astype(index_dtype),
+        right=np.concatenate([p[3] for p in parts]).astype(index_dtype),
+        value_index=value_index.astype(value_dtype),
+        values=values.astype(np.float32),
+        offsets=offsets,
+        max_depth=max(p[5] for p in parts),
+        n_features=model.n_features_in_,
+        classes=[0, 1]
+    )
+
+def prune_trees(forest, X_val, y_val, auc_tolerance=0.002, max_shift=0.05, min_trees=20,
+                X_check=None, y_check=None):
+    """Drop trees, weakest first, while held-out AUC and probabilities stay within tolerance
+
+    With X_check/y_check, rows the selection never saw, dropped trees are
+    put back, last dropped first, until those rows are within the same
+    tolerances too.
+    """
+    from sklearn.metrics import roc_auc_score
+
+    P = forest.tree_probabilities(X_val)
+    full = P.mean(axis=1)
+    base_auc = roc_auc_score(y_val, full)
+
+    tree_auc = np.array([roc_auc_score(y_val, P[:, t]) for t in range(P.shape[1])])
+    keep = np.ones(P.shape[1], dtype=bool)
+    running_sum = P.sum(axis=1)
+    count = P.shape[1]
+
+    dropped = []
+    for t in np.argsort(tree_auc):
+        if count <= min_trees:
+            break
+        candidate = (running_sum - P[:, t]) / (count - 1)
+        if (base_auc - roc_auc_score(y_val, candidate) <= auc_tolerance and
+                np.abs(candidate - full).max() <= max_shift):
+            keep[t] = False
+            dropped.append(t)
+            running_sum -= P[:, t]
+            count -= 1
+
+    if X_check is not None and dropped:
+        P = forest.tree_probabilities(X_check)
+        full = P.mean(axis=1)
+        base_auc = roc_auc_score(y_check, full)
+        running_sum = P[:, keep].sum(axis=1)
+        restored = 0
+        while dropped:
+            pruned = running_sum / count
+            if (base_auc - roc_auc_score(y_check, pruned) <= auc_tolerance and
+                    np.abs(pruned - full).max() <= max_shift):
+                break
+            t = dropped.pop()
+            keep[t] = True
+            running_sum += P[:, t]
+            count += 1
+            restored += 1
+        if restored:
+            print(f"   Put back {restored} trees to stay within tolerance on unseen rows")
+
+    return forest.select_trees(np.flatnonzero(keep))
+
+def load_splits(feature_names):
+    """Rebuild the train/test split used by whichever trainer produced the model"""
+    from sklearn.model_selection import train_test_split
+    import train_enhanced_model
+    import train_pcos_model_v2
+    from ingestion import load_pcos_data
+
+    df = load_pcos_data()
+
+    X, y, names, _ = train_pcos_model_v2.preprocess_pcos_data(df)
+    if list(names) != list(feature_names):
+        X, y, names, _ = train_enhanced_model.preprocess_enhanced(df)
+        X = X.values
+    if list(names) != list(feature_names):
+        raise ValueError("Saved feature names do not match either training pipeline")
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    return X_train, X_test, np.asarray(y_train), np.asarray(y_test)
+
+def load_holdout(feature_names):
+    """Rebuild the held-out split used by whichever trainer produced the model"""
+    _, X_test, _, y_test = load_splits(feature_names)
+    return X_test, y_test
+
+def _time_ms(fn, X, repeats=50):
+    fn(X)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(X)
+    return (time.perf_counter() - start) / repeats * 1000
+
+def _load_rss(kind, path):
+    """Model RSS measured in a fresh interpreter so allocations don't overlap"""
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--rss-probe', kind, path],
+                            capture_output=True, text=True, check=True).stdout
+    return int(output.strip().splitlines()[-1])
+
+def _rss_probe(kind, path):
+    import psutil
+    import sklearn.ensemble  # noqa: F401 - counted as runtime, not model, memory
+
+    process = psutil.Process()
+    gc.collect()
+    before = process.memory_info().rss
+    model = joblib.load(path) if kind == 'sklearn' else load_compact_forest(path)
+    gc.collect()
+    print(process.memory_info().rss - before)
+    return model
+
+def compact_saved_model(leaf_tolerance=0.0, auc_tolerance=0.002, max_shift=0.05, min_trees=20):
+    """Compact models/pcos_model.joblib and write models/pcos_model_compact.npz
+
+    Leaf merging is opt-in: a forest grown to pure leaves (min_samples_leaf=1)
+    has sibling leaves 1.0 apart, so no tolerance below that merges anything.
+    The holdout is split in two; trees are pruned on one half and checked on
+    the other, which the selection never saw. Pruning backs off until that
+    half is within max_shift and auc_tolerance, and nothing is written if the
+    compact model still shifts a probability by more than max_shift.
+    """
+    from sklearn.metrics import roc_auc_score
+    from sklearn.model_selection import train_test_split
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    model_dir = os.path.join(current_dir, '..', 'models')
+    model_path = os.path.join(model_dir, 'pcos_model.joblib')
+    compact_path = os.path.join(model_dir, COMPACT_MODEL_FILE)
+
+    model = joblib.load(model_path)
+    scaler = joblib.load(os.path.join(model_dir, 'pcos_scaler.joblib'))
+    feature_names = joblib.load(os.path.join(model_dir, 'feature_names.joblib'))
+
+    X_test, y_test = load_holdout(feature_names)
+    X_select, X_val, y_select, y_val = train_test_split(scaler.transform(X_test), y_test, test_size=0.5,
+                                                        random_state=42, stratify=y_test)
+
+    print(f"🔧 Compacting {len(model.estimators_)} trees...")
+    forest = compact_forest(model, leaf_tolerance)
+    merged_nodes = sum(e.tree_.node_count for e in model.estimators_) - len(forest.feature)
+    if leaf_tolerance > 0:
+        print(f"   Merged {merged_nodes} redundant nodes")
+
+    forest = prune_trees(forest, X_select, y_select, auc_tolerance, max_shift, min_trees, X_val, y_val)
+    print(f"   Kept {forest.n_estimators} of {len(model.estimators_)} trees")
+
+    proba_before = model.predict_proba(X_val)[:, 1]
+    proba_after = forest.predict_proba(X_val)[:, 1]
+
+    report = {
+        'trees_before': len(model.estimators_),
+        'trees_after': forest.n_estimators,
+        'nodes_before': int(sum(e.tree_.node_count for e in model.estimators_)),
+        'nodes_after': int(len(forest.feature)),
+        'merged_nodes': int(merged_nodes),
+        'auc_before': float(roc_auc_score(y_val, proba_before)),
+        'auc_after': float(roc_auc_score(y_val, proba_after)),
+        'selection_rows': len(y_select),
+        'report_rows': len(y_val),
+        'max_proba_shift': float(np.abs(proba_after - proba_before).max()),
+        'leaf_tolerance': leaf_tolerance,
+        'auc_tolerance': auc_tolerance,
+        'max_shift': max_shift
+    }
+    if report['max_proba_shift'] > max_shift:
+        raise ValueError(f"Compact model shifts a probability by {report['max_proba_shift']:.4f} on unseen rows "
+                         f"(max {max_shift}); lower --leaf-tolerance. Nothing was written.")
+    forest.meta = {'source_model': os.path.basename(model_path), 'report': report}
+    forest.save(compact_path)
+
+    single = X_val[:1]
+    rows = [
+        ('Artifact size', os.path.getsize(model_path) / 1024, os.path.getsize(compact_path) / 1024, 'KB'),
+        ('Model RSS', _load_rss('sklearn', model_path) / 1024,
+         _load_rss('compact', compact_path) / 1024, 'KB'),
+        ('Latency, 1 row', _time_ms(model.predict_proba, single),
+         _time_ms(forest.predict_proba, single), 'ms'),
+        (f'Latency, {len(X_val)} rows', _time_ms(model.predict_proba, X_val),
+         _time_ms(forest.predict_proba, X_val), 'ms'),
+        (f'AUC, {len(y_val)} unseen', report['auc_before'], report['auc_after'], ''),
+    ]
+
+    print(f"\n📊 Compaction report:")
+    print(f"   {'':<20}{'before':>12}{'after':>12}")
+    for label, before, after, unit in rows:
+        print(f"   {label:<20}{before:>12.3f}{after:>12.3f} {unit}")
+    print(f"   Max probability shift: {report['max_proba_shift']:.4f}")
+    print(f"\n💾 Compact bundle saved: {compact_path}")
+    return report
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--rss-probe':
+        _rss_probe(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description='Prune and pack the PCOS forest for serving')
+    parser.add_argument('--leaf-tolerance', type=float, default=0.0,
+                        help='merge sibling leaves whose probabilities differ by at most this '
+                             '(only useful for forests grown with min_samples_leaf > 1)')
+    parser.add_argument('--auc-tolerance', type=float, default=0.002,
+                        help='maximum held-out AUC loss allowed when dropping trees')
+    parser.add_argument('--max-shift', type=float, default=0.05,
+                        help='maximum per-sample probability change allowed when dropping trees')
+    parser.add_argument('--min-trees', type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        compact_saved_model(args.leaf_tolerance, args.auc_tolerance, args.max_shift, args.min_trees)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
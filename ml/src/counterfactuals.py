@@ -0,0 +1,68 @@
+import itertools
+
+from request_schema import PCOSRecord
+
+# BMI reductions (points) modelled by the what-if endpoint
+BMI_STEPS = (1, 2, 3, 4, 5)
+
+# Variants never take BMI below the healthy range
+MIN_TARGET_BMI = 18.5
+
+EXERCISE = 'Reg.Exercise(Y/N)'
+FAST_FOOD = 'Fast food (Y/N)'
+
+def _with_values(record, changes):
+    values = list(record.values)
+    for name, value in changes.items():
+        values[record.schema.slots[name]] = value
+    return PCOSRecord(values, record.schema)
+
+def _describe(bmi_drop, exercise, no_fast_food):
+    parts = []
+    if bmi_drop:
+        parts.append(f"BMI -{bmi_drop:g}")
+    if exercise:
+        parts.append('regular exercise')
+    if no_fast_food:
+        parts.append('no fast food')
+    return ' + '.join(parts)
+
+def expand_counterfactuals(record, bmi_steps=BMI_STEPS):
+    """Every combination of the lifestyle changes that applies to this profile
+
+    Returns (changes, record) pairs. A lower BMI scales the weight with it,
+    so weight, height and BMI stay consistent for the derived features.
+    Changes that would not alter the profile (already exercising, BMI
+    unknown or already near the floor) are left out.
+    """
+    bmi_options = [0]
+    if record.has('BMI'):
+        bmi = record.get('BMI')
+        bmi_options += [step for step in bmi_steps if bmi - step >= MIN_TARGET_BMI]
+    exercise_options = [False] + ([True] if record.get(EXERCISE, 0) != 1 else [])
+    fast_food_options = [False] + ([True] if record.get(FAST_FOOD, 0) == 1 else [])
+
+    variants = []
+    for bmi_drop, exercise, no_fast_food in itertools.product(bmi_options, exercise_options, fast_food_options):
+        if not (bmi_drop or exercise or no_fast_food):
+            continue
+
+        changes = {}
+        if bmi_drop:
+            bmi = record.get('BMI')
+            changes['BMI'] = bmi - bmi_drop
+            if record.has('Weight (Kg)'):
+                changes['Weight (Kg)'] = record.get('Weight (Kg)') * (bmi - bmi_drop) / bmi
+        if exercise:
+            changes[EXERCISE] = 1.0
+        if no_fast_food:
+            changes[FAST_FOOD] = 0.0
+
+        variants.append(({
+            'label': _describe(bmi_drop, exercise, no_fast_food),
+            'bmi_reduction': bmi_drop,
+            'regular_exercise': exercise,
+            'no_fast_food': no_fast_food,
+            'changes': {name: round(value, 2) for name, value in changes.items()}
+        }, _with_values(record, changes)))
+    return variants
@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 import joblib
 import os
@@ -6,6 +5,8 @@ from collections import Counter
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from ingestion import load_pcos_data
+
 def diagnose_model_issues():
     """Comprehensive model diagnosis"""
     
@@ -14,8 +15,7 @@ def diagnose_model_issues():
     data_dir = os.path.join(current_dir, '..', 'data', 'processed')
     model_dir = os.path.join(current_dir, '..', 'models')
     
-    data_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-    df = pd.read_csv(os.path.join(data_dir, data_files[0]))
+    df = load_pcos_data(data_dir)
     
     print("🔍 COMPREHENSIVE MODEL DIAGNOSIS")
     print("=" * 50)
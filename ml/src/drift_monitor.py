@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+REFERENCE_PROFILE_FILE = 'reference_profile.json'
+
+FEATURE_BINS = 10
+SCORE_BINS = 10
+
+# Floor for empty bins so PSI stays finite
+PSI_EPSILON = 1e-4
+
+# Usual PSI reading: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 major shift
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+
+def _interior_edges(values, n_bins):
+    """Quantile cut points; repeated values collapse so discrete features get few bins"""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return []
+    quantiles = np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])
+    edges = np.unique(quantiles)
+
+    # Cut between observed values rather than on them, so a 0/1 flag splits at 0.5
+    observed = np.unique(values)
+    for i, edge in enumerate(edges):
+        above = observed[observed > edge]
+        if len(above):
+            edges[i] = (edge + above[0]) / 2
+    return np.unique(edges).tolist()
+
+def _proportions(values, edges):
+    counts = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+    return (counts / max(counts.sum(), 1)).tolist()
+
+def build_reference_profile(X, feature_names, scores, missing_rates=None, n_bins=FEATURE_BINS):
+    """Per-feature and risk-score histograms of the training data, saved with the model
+
+    X holds the unscaled feature rows the model was trained on, scores the
+    held-out positive-class probabilities, and missing_rates the fraction of
+    source rows in which each feature was empty before imputation.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    missing_rates = missing_rates or {}
+
+    features = []
+    for j, name in enumerate(feature_names):
+        column = X[:, j]
+        edges = _interior_edges(column, n_bins)
+        rate = missing_rates.get(name)
+        features.append({
+            'name': name,
+            'edges': edges,
+            'proportions': _proportions(column, edges),
+            'mean': float(np.nanmean(column)),
+            'missing_rate': None if rate is None or rate != rate else float(rate)
+        })
+
+    score_edges = np.linspace(0, 1, SCORE_BINS + 1)[1:-1].tolist()
+    scores = np.asarray(scores, dtype=np.float64)
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'n_samples': int(len(X)),
+        'features': features,
+        'scores': {
+            'edges': score_edges,
+            'proportions': _proportions(scores, score_edges),
+            'mean': float(scores.mean()) if len(scores) else None
+        }
+    }
+
+def save_reference_profile(profile, model_dir):
+    path = os.path.join(model_dir, REFERENCE_PROFILE_FILE)
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    return path
+
+def load_reference_profile(model_dir):
+    path = os.path.join(model_dir, REFERENCE_PROFILE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def psi(reference, live):
+    """Population stability index between two binned distributions"""
+    reference = np.clip(np.asarray(reference, dtype=np.float64), PSI_EPSILON, None)
+    live = np.clip(np.asarray(live, dtype=np.float64), PSI_EPSILON, None)
+    return float(np.sum((live - reference) * np.log(live / reference)))
+
+def binned_ks(reference, live):
+    """Kolmogorov-Smirnov distance evaluated at the shared bin edges"""
+    return float(np.max(np.abs(np.cumsum(reference) - np.cumsum(live))))
+
+def _status(value):
+    if value >= PSI_ALERT:
+        return 'alert'
+    if value >= PSI_WARN:
+        return 'warn'
+    return 'stable'
+
+class _Counts:
+    """Fixed-size accumulators for one observation window"""
+
+    def __init__(self, n_features, n_bins, n_score_bins):
+        self.n = 0
+        self.bins = np.zeros((n_features, n_bins), dtype=np.int64)
+        self.sums = np.zeros(n_features)
+        self.missing = np.zeros(n_features, dtype=np.int64)
+        self.score_bins = np.zeros(n_score_bins, dtype=np.int64)
+        self.score_sum = 0.0
+
+class DriftMonitor:
+    """Streaming input/output histograms over live requests, compared to the training profile
+
+    Every feature is binned on the reference profile's edges, so memory is a
+    few small count arrays regardless of traffic. Counts are kept for the
+    service lifetime and for tumbling windows of window_size requests.
+    """
+
+    def __init__(self, profile, feature_names, schema, window_size=1000):
+        self.profile = profile
+        self.window_size = window_size
+        self._lock = threading.Lock()
+
+        by_name = {feature['name']: feature for feature in profile['features']}
+        self.features = [by_name.get(name) for name in feature_names]
+        self.feature_names = list(feature_names)
+
+        # Edges padded with +inf so one comparison bins every feature at once
+        widest = max([len(f['edges']) for f in self.features if f] or [0])
+        self._edges = np.full((len(feature_names), max(widest, 1)), np.inf)
+        for j, feature in enumerate(self.features):
+            if feature and feature['edges']:
+                self._edges[j, :len(feature['edges'])] = feature['edges']
+        self._score_edges = np.asarray(profile['scores']['edges'])
+
+        # Missingness is tracked for request fields that come from a source column
+        self._tracked = np.array([name in schema.slots and f is not None and f['missing_rate'] is not None
+                                  for name, f in zip(feature_names, self.features)])
+        self._slots = np.array([schema.slots.get(name, 0) for name in feature_names])
+
+        self.started = time.time()
+        shape = (len(feature_names), self._edges.shape[1] + 1, len(self._score_edges) + 1)
+        self._lifetime = _Counts(*shape)
+        self._offsets = np.arange(len(feature_names)) * shape[1]
+        self._window = _Counts(*shape)
+        self._previous = None
+
+    def observe(self, features, scores, records=()):
+        """Add feature rows, their positive-class scores and the parsed records"""
+        features = np.asarray(features, dtype=np.float64)
+        scores = np.asarray(scores, dtype=np.float64)
+
+        # Count this batch first so the lock only covers a few array additions
+        bins = (features[:, :, None] >= self._edges[None, :, :]).sum(axis=2)
+        bin_counts = np.bincount((self._offsets + bins).ravel(),
+                                 minlength=self._lifetime.bins.size).reshape(self._lifetime.bins.shape)
+        score_counts = np.bincount(np.searchsorted(self._score_edges, scores, side='right'),
+                                   minlength=len(self._score_edges) + 1)
+        sums = features.sum(axis=0)
+        missing = np.zeros(len(self.feature_names), dtype=np.int64)
+        for record in records:
+            missing += np.isnan(np.asarray(record.values)[self._slots]) & self._tracked
+
+        with self._lock:
+            for counts in (self._lifetime, self._window):
+                counts.n += len(features)
+                counts.bins += bin_counts
+                counts.sums += sums
+                counts.missing += missing
+                counts.score_bins += score_counts
+                counts.score_sum += float(scores.sum())
+
+            if self._window.n >= self.window_size:
+                self._previous = self._window
+                self._window = _Counts(*self._window.bins.shape, len(self._window.score_bins))
+
+    def _compare(self, counts):
+        n = max(counts.n, 1)
+        features = []
+        for j, (name, reference) in enumerate(zip(self.feature_names, self.features)):
+            if reference is None:
+                continue
+            live = counts.bins[j, :len(reference['proportions'])] / n
+            value = psi(reference['proportions'], live)
+            features.append({
+                'name': name,
+                'psi': round(value, 4),
+                'ks': round(binned_ks(reference['proportions'], live), 4),
+                'status': _status(value),
+                'mean': round(float(counts.sums[j]) / n, 4),
+                'reference_mean': round(reference['mean'], 4),
+                'missing_rate': round(int(counts.missing[j]) / n, 4) if self._tracked[j] else None,
+                'reference_missing_rate': round(reference['missing_rate'], 4) if self._tracked[j] else None
+            })
+        features.sort(key=lambda f: f['psi'], reverse=True)
+
+        reference = self.profile['scores']
+        live = counts.score_bins / n
+        score_psi = psi(reference['proportions'], live)
+        return {
+            'observations': counts.n,
+            'risk_score': {
+                'psi': round(score_psi, 4),
+                'ks': round(binned_ks(reference['proportions'], live), 4),
+                'status': _status(score_psi),
+                'mean': round(counts.score_sum / n, 4),
+                'reference_mean': reference['mean'],
+                'histogram': live.round(4).tolist(),
+                'reference_histogram': [round(p, 4) for p in reference['proportions']]
+            },
+            'alerts': [f['name'] for f in features if f['status'] != 'stable'],
+            'features': features
+        }
+
+    def report(self):
+        """Drift of the whole service lifetime and of the most recent full window"""
+        with self._lock:
+            lifetime = self._compare(self._lifetime)
+            recent = self._compare(self._previous or self._window)
+        return {
+            'reference_samples': self.profile['n_samples'],
+            'reference_created': self.profile.get('created'),
+            'monitoring_since': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'window_size': self.window_size,
+            'thresholds': {'warn': PSI_WARN, 'alert': PSI_ALERT},
+            'lifetime': lifetime,
+            'recent_window': recent
+        }
@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+from scipy.special import ndtri
+
+from compact_model import COMPACT_MODEL_FILE, CompactForest, compact_forest, load_compact_forest, load_splits
+
+EARLY_EXIT_FILE = 'early_exit_order.json'
+
+# Trees are evaluated in blocks that double in size from this one (16, 16, 32, 64, ...);
+# the stopping rule is checked between blocks. Each block is one vectorized
+# traversal, so a few large blocks cost less per row than many small ones.
+DEFAULT_BLOCK_SIZE = 16
+
+# Chance, per row, that the bound wrongly rules out a boundary crossing
+DEFAULT_DELTA = 1e-3
+
+def forest_fingerprint(forest):
+    """Identifies a forest's trees independently of the file it was loaded from"""
+    digest = hashlib.sha256()
+    for array in (forest.offsets, forest.feature, forest.threshold, forest.values, forest.value_index):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+def fidelity_order(forest, X):
+    """Tree indices, those whose votes track the whole forest most closely first"""
+    P = forest.tree_probabilities(X)
+    deviation = np.abs(P - P.mean(axis=1, keepdims=True)).mean(axis=0)
+    return np.argsort(deviation, kind='stable')
+
+def save_tree_order(forest, order, model_dir):
+    """Add a forest's evaluation order to the order file, keyed by its fingerprint"""
+    path = os.path.join(model_dir, EARLY_EXIT_FILE)
+    orders = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            orders = json.load(f)
+    orders[forest_fingerprint(forest)] = [int(t) for t in order]
+    with open(path, 'w') as f:
+        json.dump(orders, f)
+    return path
+
+def load_tree_order(forest, model_dir):
+    """Saved order for this forest, or None when there is none or it belongs to another model"""
+    path = os.path.join(model_dir, EARLY_EXIT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        order = json.load(f).get(forest_fingerprint(forest))
+    if order is None or sorted(order) != list(range(forest.n_estimators)):
+        return None
+    return np.asarray(order)
+
+class EarlyExitForest:
+    """Anytime forest inference: each row stops once its outcome can no longer change
+
+    Trees are evaluated in a fixed order, a block at a time. After k of N
+    trees with vote sum s, the full-forest probability lies in [s/N, (s+N-k)/N]
+    for certain, and within z * sd * sqrt((N-k)/(k(N-1))) of s/k with
+    probability about 1-delta (normal approximation for sampling k of the N
+    votes without replacement). A row stops as soon as no boundary (the
+    decision threshold and the risk score cut points) falls inside that
+    interval, so its class and risk level match the full forest.
+    """
+
+    def __init__(self, forest, boundaries, order=None, block_size=DEFAULT_BLOCK_SIZE, delta=DEFAULT_DELTA):
+        self.forest = forest
+        self.boundaries = np.unique(np.asarray(boundaries, dtype=np.float64))
+        self.order = np.arange(forest.n_estimators) if order is None else np.asarray(order)
+        self.ordered = order is not None
+        self.block_size = block_size
+        self.delta = delta
+
+        ends = [min(block_size, len(self.order))]
+        while ends[-1] < len(self.order):
+            ends.append(min(2 * ends[-1], len(self.order)))
+        starts = [0] + ends[:-1]
+        depths = forest.tree_depths()
+        self.blocks = [(self.order[a:b], int(depths[self.order[a:b]].max())) for a, b in zip(starts, ends)]
+
+        # delta is shared between every check a row can go through
+        self._z = float(ndtri(1 - delta / (2 * max(len(self.blocks) - 1, 1))))
+
+    @property
+    def n_estimators(self):
+        return self.forest.n_estimators
+
+    def bounds(self, sums, squares, k):
+        """Interval that holds the full-forest probability, given k votes and their sums"""
+        total = self.n_estimators
+        mean = sums / k
+        variance = np.maximum(squares - k * mean ** 2, 0) / np.maximum(k - 1, 1)
+
+        # Votes in [0, 1] with mean p vary by at most p(1-p); smoothing p keeps a
+        # run of identical early votes (sample variance 0) from closing the interval
+        smoothed = (sums + 1) / (k + 2)
+        variance = np.maximum(variance, smoothed * (1 - smoothed))
+        eps = self._z * np.sqrt(variance / k * (total - k) / (total - 1))
+        low = np.maximum(mean - eps, sums / total)
+        high = np.minimum(mean + eps, (sums + total - k) / total)
+        return low, high
+
+    def decided(self, sums, squares, k):
+        low, high = self.bounds(sums, squares, k)
+        return (np.searchsorted(self.boundaries, low, side='left') ==
+                np.searchsorted(self.boundaries, high, side='right'))
+
+    def predict_proba(self, X):
+        """Class probabilities and the number of trees evaluated for each (scaled) row"""
+        X = np.asarray(X, dtype=np.float32)
+        total = self.n_estimators
+        sums = np.zeros(len(X))
+        squares = np.zeros(len(X))
+        used = np.zeros(len(X), dtype=np.int64)
+        active = np.arange(len(X))
+
+        for trees, depth in self.blocks:
+            votes = self.forest.tree_probabilities(X[active], trees, depth)
+            sums[active] += votes.sum(axis=1)
+            squares[active] += (votes ** 2).sum(axis=1)
+            used[active] += len(trees)
+            if used[active[0]] == total:
+                break
+            active = active[~self.decided(sums[active], squares[active], used[active])]
+            if not len(active):
+                break
+
+        positive = sums / used
+        return np.column_stack([1 - positive, positive]), used
+
+def early_exit_forest(model, model_dir, boundaries, block_size=DEFAULT_BLOCK_SIZE, delta=DEFAULT_DELTA):
+    """EarlyExitForest for a served sklearn or compact model, using its saved tree order if any"""
+    forest = model if isinstance(model, CompactForest) else compact_forest(model)
+    return EarlyExitForest(forest, boundaries, load_tree_order(forest, model_dir), block_size, delta)
+
+def _per_row_ms(fn, X, rounds=3):
+    """Mean latency of scoring the rows one at a time, best of several rounds"""
+    fn(X[:1])
+    best = np.inf
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for i in range(len(X)):
+            fn(X[i:i + 1])
+        best = min(best, (time.perf_counter() - start) / len(X) * 1000)
+    return best
+
+def _synthetic_requests(n, seed=42):
+    """Scaled feature rows for synthetic app requests, built by the API's own feature path"""
+    import api_fixed as api
+    from ingestion import load_pcos_data
+    from synthetic_data import SyntheticPCOSGenerator
+
+    generator = SyntheticPCOSGenerator(random_state=seed).fit(load_pcos_data())
+    rows = [api.create_feature_vector(api.request_schema.parse(payload), api.feature_names)
+            for payload in generator.generate_payloads(n)]
+    return api.scaler.transform(np.vstack(rows))
+
+def _risk_band(proba, boundaries):
+    return np.searchsorted(boundaries, proba, side='left')
+
+def _rows_per_second(fn, X, rounds=3):
+    best = np.inf
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - start)
+    return round(len(X) / best, 1)
+
+def benchmark(sklearn_model, anytime, X, threshold):
+    """Trees used, agreement with the full forest, and latency and throughput on one distribution"""
+    exact = anytime.forest.predict_proba(X)[:, 1]
+    estimate, used = anytime.predict_proba(X)
+    estimate = estimate[:, 1]
+
+    risk_points = np.array([b for b in anytime.boundaries if b != threshold])
+    return {
+        'rows': int(len(X)),
+        'trees_total': anytime.n_estimators,
+        'mean_trees_evaluated': round(float(used.mean()), 2),
+        'median_trees_evaluated': int(np.median(used)),
+        'stopped_early': round(float((used < anytime.n_estimators).mean()), 4),
+        'prediction_disagreements': int(((estimate > threshold) != (exact > threshold)).sum()),
+        'risk_band_disagreements': int((_risk_band(estimate, risk_points) != _risk_band(exact, risk_points)).sum()),
+        'max_abs_probability_error': round(float(np.abs(estimate - exact).max()), 4),
+        'latency_ms_per_row': {
+            'sklearn': round(_per_row_ms(sklearn_model.predict_proba, X), 4),
+            'compact_full': round(_per_row_ms(anytime.forest.predict_proba, X), 4),
+            'early_exit': round(_per_row_ms(anytime.predict_proba, X), 4)
+        },
+        'batch_rows_per_second': {
+            'sklearn': _rows_per_second(sklearn_model.predict_proba, X),
+            'compact_full': _rows_per_second(anytime.forest.predict_proba, X),
+            'early_exit': _rows_per_second(anytime.predict_proba, X)
+        }
+    }
+
+if __name__ == "__main__":
+    from api_fixed import DECISION_POINTS
+
+    parser = argparse.ArgumentParser(description='Order trees for early-exit inference and benchmark it')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument('--delta', type=float, default=DEFAULT_DELTA)
+    parser.add_argument('--synthetic', type=int, default=2000, help='synthetic app requests to benchmark')
+    args = parser.parse_args()
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    model_dir = os.path.join(current_dir, '..', 'models')
+    model = joblib.load(os.path.join(model_dir, 'pcos_model.joblib'))
+    scaler = joblib.load(os.path.join(model_dir, 'pcos_scaler.joblib'))
+    feature_names = joblib.load(os.path.join(model_dir, 'feature_names.joblib'))
+    threshold = joblib.load(os.path.join(model_dir, 'model_info.joblib')).get('optimal_threshold', 0.5)
+    boundaries = [threshold] + [point / 100 for point in DECISION_POINTS]
+
+    X_train, X_test, _, _ = load_splits(feature_names)
+    X_real = scaler.transform(X_test)
+    X_synthetic = _synthetic_requests(args.synthetic)
+
+    # The order is fitted on the training rows, so the held-out benchmark is
+    # not flattered by it, and saved for both serving backends
+    forests = [('sklearn', compact_forest(model))]
+    compact_path = os.path.join(model_dir, COMPACT_MODEL_FILE)
+    if os.path.exists(compact_path):
+        forests.append(('compact', load_compact_forest(compact_path)))
+
+    report = {}
+    for backend, forest in forests:
+        order = fidelity_order(forest, scaler.transform(X_train))
+        print(f"💾 Tree order for the {backend} backend saved: {save_tree_order(forest, order, model_dir)}")
+        for label, tree_order in (('natural_order', None), ('fidelity_order', order)):
+            anytime = EarlyExitForest(forest, boundaries, tree_order, args.block_size, args.delta)
+            for distribution, X in (('real_holdout', X_real), ('synthetic_requests', X_synthetic)):
+                result = benchmark(model, anytime, X, threshold)
+                report.setdefault(backend, {}).setdefault(label, {})[distribution] = result
+
+                latency = result['latency_ms_per_row']
+                throughput = result['batch_rows_per_second']
+                print(f"📊 {backend:<8}{label:<16}{distribution:<20}"
+                      f"trees {result['mean_trees_evaluated']:>6.1f}/{result['trees_total']:<4}"
+                      f"disagreements {result['prediction_disagreements']}/{result['risk_band_disagreements']}")
+                print(f"   ms/row     sklearn {latency['sklearn']:>9.3f}  full {latency['compact_full']:>9.3f}  "
+                      f"early {latency['early_exit']:>9.3f}")
+                print(f"   batch rows/s sklearn {throughput['sklearn']:>7.0f}  full {throughput['compact_full']:>9.0f}  "
+                      f"early {throughput['early_exit']:>9.0f}")
+
+    report_path = os.path.join(model_dir, 'early_exit_report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Benchmark report saved: {report_path}")
@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import roc_auc_score, roc_curve
+from sklearn.model_selection import RepeatedStratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+EVALUATION_REPORT_FILE = 'evaluation_report.json'
+
+# Per-worker state, set once by _init_worker instead of pickled with every task
+_worker_X = None
+_worker_y = None
+_worker_estimator = None
+_worker_resample = None
+
+def _init_worker(matrix_path, y, estimator, resample):
+    global _worker_X, _worker_y, _worker_estimator, _worker_resample
+    _worker_X = np.load(matrix_path, mmap_mode='r')
+    _worker_y = y
+    _worker_estimator = estimator
+    _worker_resample = resample
+
+def _fit_fold(task):
+    """Fit scaler + estimator on one training fold and score its held-out rows"""
+    repeat, fold, train_idx, test_idx = task
+
+    X_train = np.asarray(_worker_X[train_idx])
+    y_train = _worker_y[train_idx]
+
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+
+    # Resampling only ever sees the training fold
+    if _worker_resample is not None:
+        X_train, y_train = _worker_resample(X_train, y_train)
+
+    model = clone(_worker_estimator).fit(X_train, y_train)
+    proba = model.predict_proba(scaler.transform(_worker_X[test_idx]))[:, 1]
+    return repeat, fold, test_idx, proba
+
+def youden_threshold(y_true, y_score):
+    """Threshold maximizing TPR - FPR (Youden's J)"""
+    fpr, tpr, thresholds = roc_curve(y_true, y_score)
+    best = np.argmax(tpr - fpr)
+    # roc_curve prepends an inf threshold for the all-negative point
+    return float(min(thresholds[best], 1.0)), float(tpr[best] - fpr[best])
+
+def _bootstrap_thresholds(y, oof, n_bootstrap, rng):
+    """Bootstrap over patients; a drawn patient brings the scores from every repeat
+
+    Resampling the pooled rows would treat a patient's repeated out-of-fold
+    scores as independent and make the intervals about sqrt(n_repeats) too narrow.
+    """
+    thresholds, aucs = [], []
+    n_repeats, n = oof.shape
+    for _ in range(n_bootstrap):
+        sample = rng.integers(0, n, n)
+        y_sample = y[sample]
+        if y_sample.min() == y_sample.max():
+            continue
+        scores = oof[:, sample]
+        thresholds.append(youden_threshold(np.tile(y_sample, n_repeats), scores.ravel())[0])
+        aucs.append(np.mean([roc_auc_score(y_sample, scores[r]) for r in range(n_repeats)]))
+    return np.array(thresholds), np.array(aucs)
+
+def evaluate_model(X, y, estimator, n_splits=5, n_repeats=3, resample=None,
+                   n_jobs=None, n_bootstrap=1000, confidence=0.95, random_state=42):
+    """Repeated stratified K-fold in parallel processes with pooled out-of-fold threshold selection
+
+    The feature matrix is written once to a memory-mapped .npy file that all
+    workers open, and an unfitted clone of the estimator is sent once per
+    worker, so only fold indices travel with each task. Folds and seeds
+    are fixed by random_state, so results do not depend on n_jobs.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    splitter = RepeatedStratifiedKFold(n_splits=n_splits, n_repeats=n_repeats, random_state=random_state)
+    tasks = [
+        (i // n_splits, i % n_splits, train_idx, test_idx)
+        for i, (train_idx, test_idx) in enumerate(splitter.split(X, y))
+    ]
+
+    start = time.perf_counter()
+    work_dir = tempfile.mkdtemp(prefix='pcos_cv_')
+    try:
+        matrix_path = os.path.join(work_dir, 'X.npy')
+        np.save(matrix_path, X)
+
+        oof = np.full((n_repeats, len(y)), np.nan)
+        fold_aucs = []
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks)), initializer=_init_worker,
+                                 initargs=(matrix_path, y, clone(estimator), resample)) as pool:
+            for repeat, fold, test_idx, proba in pool.map(_fit_fold, tasks):
+                oof[repeat, test_idx] = proba
+                fold_aucs.append(roc_auc_score(y[test_idx], proba))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+
+    # Pool the out-of-fold scores of every repeat for threshold selection
+    pooled_y = np.tile(y, n_repeats)
+    pooled_scores = oof.ravel()
+    threshold, j_statistic = youden_threshold(pooled_y, pooled_scores)
+
+    rng = np.random.default_rng(random_state)
+    boot_thresholds, boot_aucs = _bootstrap_thresholds(y, oof, n_bootstrap, rng)
+    tail = (1 - confidence) / 2 * 100
+
+    repeat_aucs = [roc_auc_score(y, oof[r]) for r in range(n_repeats)]
+    predictions = pooled_scores > threshold
+
+    return {
+        'scheme': f"{n_repeats}x repeated stratified {n_splits}-fold",
+        'n_samples': int(len(y)),
+        'n_jobs': int(n_jobs),
+        'random_state': random_state,
+        'resampling': getattr(resample, '__name__', type(resample).__name__) if resample else None,
+        'seconds': round(elapsed, 2),
+        'fold_auc_mean': float(np.mean(fold_aucs)),
+        'fold_auc_std': float(np.std(fold_aucs)),
+        'oof_auc': float(np.mean(repeat_aucs)),
+        'oof_auc_ci': [float(np.percentile(boot_aucs, tail)), float(np.percentile(boot_aucs, 100 - tail))],
+        'threshold': threshold,
+        'threshold_ci': [float(np.percentile(boot_thresholds, tail)),
+                         float(np.percentile(boot_thresholds, 100 - tail))],
+        'youden_j': j_statistic,
+        'oof_accuracy_at_threshold': float((predictions == pooled_y).mean()),
+        'confidence': confidence,
+        'n_bootstrap': int(len(boot_thresholds))
+    }
+
+def print_evaluation(report):
+    print(f"\n🧪 Cross-validation ({report['scheme']}, {report['n_jobs']} workers, {report['seconds']}s):")
+    print(f"   Fold AUC: {report['fold_auc_mean']:.3f} ± {report['fold_auc_std']:.3f}")
+    low, high = report['oof_auc_ci']
+    print(f"   Out-of-fold AUC: {report['oof_auc']:.3f} (CI {low:.3f}-{high:.3f})")
+    low, high = report['threshold_ci']
+    print(f"🎯 Pooled OOF threshold: {report['threshold']:.3f} "
+          f"({report['confidence']:.0%} CI {low:.3f}-{high:.3f}, J={report['youden_j']:.3f})")
+
+def save_evaluation_report(report, model_dir):
+    """Store the report next to the model files"""
+    path = os.path.join(model_dir, EVALUATION_REPORT_FILE)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
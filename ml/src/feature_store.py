@@ -0,0 +1,415 @@
+import argparse
+import threading
+import time
+import tracemalloc
+from bisect import insort
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+from local_store import to_epoch
+from request_schema import PCOSRecord
+
+# History kept per user: the latest cycle starts and the latest days of health logs
+CYCLE_WINDOW = 12
+HEALTH_WINDOW_DAYS = 30
+DEFAULT_MAX_USERS = 50000
+
+# Cycle lengths outside this range, or varying by more than the spread, count as irregular
+NORMAL_CYCLE_DAYS = (21, 35)
+IRREGULAR_SPREAD_DAYS = 7
+# Longer gaps between logged starts are months the user did not log
+MAX_CYCLE_GAP_DAYS = 90
+
+# Fitted weight change over the window that counts as weight gain, and the
+# span of weigh-ins needed before a trend is trusted
+WEIGHT_GAIN_KG = 2.0
+MIN_WEIGHT_SPAN_DAYS = 7
+MIN_WEIGHT_LOGS = 3
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def day_number(value):
+    """Proleptic day number of an ISO date string or a Firestore timestamp"""
+    if value is None:
+        return None
+    if isinstance(value, str) and len(value) >= 10 and value[4] == '-' and value[7] == '-':
+        return date.fromisoformat(value[:10]).toordinal()
+    try:
+        epoch = to_epoch(value)
+    except (TypeError, ValueError):
+        return None
+    return None if epoch is None else EPOCH_ORDINAL + int(epoch // 86400)
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value) if value == value else None
+
+class UserHistory:
+    """Constant-size history of one user with its model features precomputed
+
+    Daily logs are kept for a sliding window of days together with running
+    sums (weight regression terms, sleep and stress totals) that are
+    adjusted as days enter and leave it. `features` holds training columns
+    (cycle length, regularity, weight gain, latest weight) and `summary` the
+    aggregates behind them; both are refreshed when a log arrives, never at
+    lookup time.
+    """
+    __slots__ = ('cycle_starts', 'days', 'newest', 'anchor', 'sums', 'first_weight_day', 'latest_weight_day',
+                 'features', 'summary', 'updated_at')
+
+    def __init__(self):
+        self.cycle_starts = []
+        self.days = {}
+        self.newest = None
+        self.anchor = None
+        # weight: count, sum x, sum y, sum xy, sum xx (x = day - anchor); sleep: count, sum; stress: count, sum
+        self.sums = [0.0] * 9
+        self.first_weight_day = None
+        self.latest_weight_day = None
+        self.features = {}
+        self.summary = {}
+        self.updated_at = 0.0
+
+    def add_cycle(self, doc):
+        start = day_number(doc.get('startDate')) or day_number(doc.get('createdAt'))
+        if start is None:
+            return False
+        if start not in self.cycle_starts:
+            insort(self.cycle_starts, start)
+            del self.cycle_starts[:-CYCLE_WINDOW]
+        return True
+
+    def _apply(self, day, logged, sign):
+        weight, sleep, stress = logged
+        sums = self.sums
+        if weight is not None:
+            x = day - self.anchor
+            sums[0] += sign
+            sums[1] += sign * x
+            sums[2] += sign * weight
+            sums[3] += sign * x * weight
+            sums[4] += sign * x * x
+        if sleep is not None:
+            sums[5] += sign
+            sums[6] += sign * sleep
+        if stress is not None:
+            sums[7] += sign
+            sums[8] += sign * stress
+
+    def add_daily_health(self, doc):
+        day = day_number(doc.get('date')) or day_number(doc.get('createdAt'))
+        if day is None:
+            return False
+        if self.newest is not None and day <= self.newest - HEALTH_WINDOW_DAYS:
+            # Older than the window; accepted but nothing to update
+            return True
+        if self.anchor is None:
+            self.anchor = day
+        stress = doc.get('stress', doc.get('stressLevel'))
+        logged = (_number(doc.get('weight')), _number(doc.get('sleepHours')), _number(stress))
+
+        # A second log for the same day only replaces the values it has
+        previous = self.days.get(day)
+        if previous is not None:
+            self._apply(day, previous, -1)
+            logged = tuple(new if new is not None else old for new, old in zip(logged, previous))
+        self.days[day] = logged
+        self._apply(day, logged, 1)
+        if logged[0] is not None:
+            if self.latest_weight_day is None or day > self.latest_weight_day:
+                self.latest_weight_day = day
+            if self.first_weight_day is None or day < self.first_weight_day:
+                self.first_weight_day = day
+
+        if self.newest is None or day > self.newest:
+            self.newest = day
+            for old in [d for d in self.days if d <= day - HEALTH_WINDOW_DAYS]:
+                self._apply(old, self.days.pop(old), -1)
+            if self.latest_weight_day is not None and self.latest_weight_day <= day - HEALTH_WINDOW_DAYS:
+                self.first_weight_day = self.latest_weight_day = None
+            elif self.first_weight_day is not None and self.first_weight_day <= day - HEALTH_WINDOW_DAYS:
+                self.first_weight_day = min((d for d, logged in self.days.items() if logged[0] is not None),
+                                            default=None)
+        return True
+
+    def refresh(self):
+        features = {}
+        summary = {'cycles_logged': len(self.cycle_starts), 'days_logged': len(self.days)}
+
+        starts = self.cycle_starts
+        lengths = [b - a for a, b in zip(starts, starts[1:]) if b - a <= MAX_CYCLE_GAP_DAYS]
+        if lengths:
+            mean_length = sum(lengths) / len(lengths)
+            features['Cycle length(days)'] = round(mean_length, 1)
+            summary['mean_cycle_length'] = round(mean_length, 1)
+            summary['cycle_length_spread'] = max(lengths) - min(lengths)
+        if len(lengths) >= 2:
+            low, high = NORMAL_CYCLE_DAYS
+            irregular = (max(lengths) - min(lengths) > IRREGULAR_SPREAD_DAYS or
+                         any(not low <= length <= high for length in lengths))
+            features['Cycle(R/I)'] = 0.0 if irregular else 1.0
+
+        n, sx, sy, sxy, sxx, n_sleep, sleep, n_stress, stress = self.sums
+        if self.latest_weight_day is not None:
+            latest_weight = self.days[self.latest_weight_day][0]
+            features['Weight (Kg)'] = latest_weight
+            summary['latest_weight'] = latest_weight
+        if n >= MIN_WEIGHT_LOGS:
+            # Least-squares slope from the running sums, over the span of weigh-ins
+            span = self.latest_weight_day - self.first_weight_day
+            spread = sxx - sx * sx / n
+            if span >= MIN_WEIGHT_SPAN_DAYS and spread > 0:
+                change = (sxy - sx * sy / n) / spread * span
+                features['Weight gain(Y/N)'] = 1.0 if change >= WEIGHT_GAIN_KG else 0.0
+                summary['weight_change_kg'] = round(change, 2)
+        if n_sleep:
+            summary['mean_sleep_hours'] = round(sleep / n_sleep, 2)
+        if n_stress:
+            summary['mean_stress'] = round(stress / n_stress, 2)
+
+        self.features = features
+        self.summary = summary
+        self.updated_at = time.time()
+
+def store_loader(store):
+    """Loader that rebuilds a user's history from a LocalStore with bounded index scans"""
+    def load(user_id):
+        cycles = store.query('cycles', user_id, 'startDate', limit=CYCLE_WINDOW)
+        daily = store.query('dailyHealth', user_id, 'date', limit=HEALTH_WINDOW_DAYS * 2)
+        return cycles, daily
+    return load
+
+class FeatureStore:
+    """LRU-bounded per-user aggregates from cycle and daily-health logs
+
+    observe() folds a new log into the user's history as it arrives; enrich()
+    fills the fields a prediction request did not send from the precomputed
+    features, so the request path does a dict lookup instead of a history
+    scan. Users evicted or never seen are rebuilt through `loader` (e.g.
+    store_loader) when one is configured.
+    """
+
+    COLLECTIONS = ('cycles', 'dailyHealth')
+
+    def __init__(self, max_users=DEFAULT_MAX_USERS, loader=None):
+        self.max_users = max_users
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+        self.observed = 0
+        self.rejected = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.evictions = 0
+        self.enriched = 0
+
+    def _put(self, user_id, history):
+        # Caller holds the lock
+        self._users[user_id] = history
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, user_id):
+        """History rebuilt from the loader, or None without one"""
+        if self.loader is None:
+            return None
+        try:
+            cycles, daily = self.loader(user_id)
+        except Exception as e:
+            print(f"⚠️ Feature history for a user could not be loaded: {e}")
+            with self._lock:
+                self.load_errors += 1
+            return None
+        history = UserHistory()
+        for doc in cycles:
+            history.add_cycle(doc)
+        for doc in daily:
+            history.add_daily_health(doc)
+        history.refresh()
+        with self._lock:
+            self.loads += 1
+        return history
+
+    def observe(self, collection, doc):
+        """Fold one logged document (Firestore field names, with userId) into its user's aggregates"""
+        user_id = doc.get('userId') if isinstance(doc, dict) else None
+        if collection not in self.COLLECTIONS or not user_id:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        with self._lock:
+            history = self._users.get(user_id)
+        if history is None:
+            # Rebuild first so the new log is added to the full history, not an empty one
+            history = self._load(user_id) or UserHistory()
+
+        with self._lock:
+            history = self._users.get(user_id, history)
+            added = history.add_cycle(doc) if collection == 'cycles' else history.add_daily_health(doc)
+            if added:
+                history.refresh()
+                self.observed += 1
+            else:
+                self.rejected += 1
+            self._put(user_id, history)
+        return added
+
+    def lookup(self, user_id):
+        with self._lock:
+            history = self._users.get(user_id)
+            if history is not None:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return history
+            self.misses += 1
+
+        history = self._load(user_id)
+        if history is not None:
+            with self._lock:
+                history = self._users.setdefault(user_id, history)
+                self._put(user_id, history)
+        return history
+
+    def enrich(self, record, user_id):
+        """Record with unsent fields filled from history, and {field: value} of what was filled
+
+        Values the request sent always win; weight from history also fills
+        BMI when the request sent a height but no BMI.
+        """
+        history = self.lookup(user_id) if user_id else None
+        if history is None or not history.features:
+            return record, {}
+
+        slots = record.schema.slots
+        values = None
+        filled = {}
+        for name, value in history.features.items():
+            slot = slots.get(name)
+            if slot is None or record.values[slot] == record.values[slot]:
+                continue
+            if values is None:
+                values = list(record.values)
+            values[slot] = value
+            filled[name] = value
+        if values is None:
+            return record, {}
+
+        if 'Weight (Kg)' in filled and 'BMI' in slots and 'Height(Cm)' in slots:
+            bmi, height = values[slots['BMI']], values[slots['Height(Cm)']]
+            if bmi != bmi and height == height and height > 0:
+                values[slots['BMI']] = filled['BMI'] = round(filled['Weight (Kg)'] / (height / 100) ** 2, 1)
+
+        with self._lock:
+            self.enriched += 1
+        return PCOSRecord(values, record.schema), filled
+
+    def summary(self, user_id):
+        history = self.lookup(user_id)
+        return dict(history.summary) if history is not None else None
+
+    def report(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'users': len(self._users),
+                'max_users': self.max_users,
+                'loader': self.loader is not None,
+                'observed': self.observed,
+                'rejected': self.rejected,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'loads': self.loads,
+                'load_errors': self.load_errors,
+                'evictions': self.evictions,
+                'enriched': self.enriched
+            }
+
+def _synthetic_logs(n_users, days, rng):
+    """Per-day interleaved cycle and daily-health logs, as they would arrive"""
+    today = date.today().toordinal()
+    cycle_length = rng.integers(24, 40, n_users)
+    offset = rng.integers(0, 40, n_users)
+    base_weight = rng.uniform(50, 95, n_users)
+    gain = rng.uniform(-0.03, 0.08, n_users)
+    for d in range(days):
+        day = today - days + d
+        iso = date.fromordinal(day).isoformat()
+        for u in np.flatnonzero((d + offset) % cycle_length == 0):
+            yield 'cycles', {'userId': f"user-{u:06d}", 'startDate': iso, 'flow': 'medium'}
+        # Daily logs are patchier: about half of the users log on a given day
+        for u in rng.choice(n_users, n_users // 2, replace=False):
+            user = f"user-{u:06d}"
+            yield 'dailyHealth', {'userId': user, 'date': iso, 'weight': round(base_weight[u] + gain[u] * d, 1),
+                                  'sleepHours': 7, 'stress': 5}
+
+def benchmark(n_users=10000, days=90, max_users=None, seed=42):
+    """Ingest rate, enrichment latency and memory per cached user"""
+    from request_schema import compile_schema
+
+    rng = np.random.default_rng(seed)
+    logs = list(_synthetic_logs(n_users, days, rng))
+    store = FeatureStore(max_users or n_users)
+
+    start = time.perf_counter()
+    for collection, doc in logs:
+        store.observe(collection, doc)
+    ingest_seconds = time.perf_counter() - start
+
+    # tracemalloc slows ingestion several times over, so memory is measured on a sample of users
+    sample = {f"user-{u:06d}" for u in range(min(n_users, 1000))}
+    tracemalloc.start()
+    sampled = FeatureStore(len(sample))
+    for collection, doc in logs:
+        if doc['userId'] in sample:
+            sampled.observe(collection, doc)
+    bytes_per_user = tracemalloc.get_traced_memory()[0] / len(sample)
+    tracemalloc.stop()
+
+    schema = compile_schema()
+    record = schema.parse({'age': 28, 'height': 162, 'bmi': 27.4, 'cycle_regular': 1, 'weight_gain': 0})
+    users = [f"user-{u:06d}" for u in rng.integers(0, n_users, 20000)]
+    samples = np.empty(len(users))
+    for i, user in enumerate(users):
+        t = time.perf_counter()
+        store.enrich(record, user)
+        samples[i] = (time.perf_counter() - t) * 1e6
+    p50, p99 = np.percentile(samples, [50, 99])
+
+    print(f"⏱️ Feature store benchmark ({len(logs)} logs, {n_users} users, {days} days)")
+    print(f"   ingest:  {len(logs) / ingest_seconds:.0f} logs/s ({ingest_seconds / len(logs) * 1e6:.1f} µs/log)")
+    print(f"   enrich:  p50 {p50:.1f} µs, p99 {p99:.1f} µs")
+    print(f"   memory:  {bytes_per_user:.0f} bytes/user ({bytes_per_user * store.max_users / 1e6:.1f} MB at max_users={store.max_users})")
+    print(f"   example: {store.summary(users[0])}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Per-user history features for prediction requests')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bench = subparsers.add_parser('benchmark', help='time ingestion and enrichment on synthetic logs')
+    bench.add_argument('--users', type=int, default=10000)
+    bench.add_argument('--days', type=int, default=90)
+    bench.add_argument('--max-users', type=int)
+
+    show = subparsers.add_parser('show', help="print one user's aggregates from a local store")
+    show.add_argument('user_id')
+    show.add_argument('--db', help='local_store.py database (default: its STORE_PATH)')
+    args = parser.parse_args()
+
+    if args.command == 'benchmark':
+        benchmark(args.users, args.days, args.max_users)
+    else:
+        from local_store import STORE_PATH, LocalStore
+        store = FeatureStore(loader=store_loader(LocalStore(args.db or STORE_PATH)))
+        history = store.lookup(args.user_id)
+        print(f"👤 {args.user_id}: {history.summary}")
+        print(f"   features: {history.features}")
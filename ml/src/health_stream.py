@@ -0,0 +1,412 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from datetime import date
+from multiprocessing import Pool
+
+import numpy as np
+
+from bulk_jobs import line_ranges
+from feature_store import day_number
+
+# Basal temperature: the three-over-six rule. Readings in a row above the
+# highest of the six before them mark the post-ovulation rise once the third
+# is at least TEMPERATURE_SHIFT_C above it, or once there are four of them.
+# The state resets when a reading falls back below the coverline.
+TEMPERATURE_BASELINE_DAYS = 6
+TEMPERATURE_HIGH_DAYS = 3
+TEMPERATURE_SHIFT_C = 0.2
+# Readings outside this range are typos or not basal temperatures; above
+# FAHRENHEIT_ABOVE they are taken to be °F
+TEMPERATURE_RANGE_C = (35.0, 38.5)
+FAHRENHEIT_ABOVE = 45.0
+# A longer gap in readings restarts the baseline
+MAX_TEMPERATURE_GAP_DAYS = 3
+
+# Weight: one-sided CUSUM of daily weight over a slow moving baseline
+WEIGHT_BASELINE_ALPHA = 0.03
+WEIGHT_CUSUM_SLACK_KG = 0.3
+WEIGHT_CUSUM_LIMIT_KG = 4.0
+
+# Symptoms: a run of consecutive logged days with a symptom the user
+# usually logs on fewer than SYMPTOM_USUAL_RATE of days
+SYMPTOM_STREAK_DAYS = 5
+SYMPTOM_USUAL_RATE = 0.3
+SYMPTOM_RATE_ALPHA = 0.05
+MAX_TRACKED_SYMPTOMS = 16
+
+DEFAULT_MAX_USERS = 100000
+
+OVULATION_SHIFT = 'ovulation_temperature_shift'
+WEIGHT_GAIN = 'sustained_weight_gain'
+SYMPTOM_STREAK = 'symptom_streak'
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+    return float(value) if value == value else None
+
+def _celsius(value):
+    value = _number(value)
+    if value is None:
+        return None
+    if value > FAHRENHEIT_ABOVE:
+        value = (value - 32) / 1.8
+    low, high = TEMPERATURE_RANGE_C
+    return value if low <= value <= high else None
+
+def _symptoms(value):
+    if not isinstance(value, (list, tuple)):
+        return ()
+    return tuple(sorted({str(s).strip().lower() for s in value if s}))
+
+def compact_event(doc):
+    """(userId, day, temperature °C, weight, symptoms) of a dailyHealth document, or None"""
+    if not isinstance(doc, dict):
+        return None
+    user_id = doc.get('userId')
+    day = day_number(doc.get('date')) or day_number(doc.get('createdAt'))
+    if not user_id or day is None:
+        return None
+    return (user_id, day, _celsius(doc.get('temperature')), _number(doc.get('weight')),
+            _symptoms(doc.get('symptoms')))
+
+class UserState:
+    """Everything the detector keeps for one user; its size does not grow with history"""
+    __slots__ = ('last_day', 'temperature_day', 'temperatures', 'high_run', 'high_sum', 'high_start',
+                 'luteal', 'coverline', 'weight_baseline', 'weight_cusum', 'symptoms')
+
+    def __init__(self):
+        self.last_day = None
+        self.temperature_day = None
+        self.temperatures = deque(maxlen=TEMPERATURE_BASELINE_DAYS)
+        self.high_run = 0
+        self.high_sum = 0.0
+        self.high_start = None
+        self.luteal = False
+        self.coverline = None
+        self.weight_baseline = None
+        self.weight_cusum = 0.0
+        # symptom -> [current streak, usual rate, usual rate when the streak began]
+        self.symptoms = {}
+
+def _insight(user_id, day, kind, **detail):
+    return {'userId': user_id, 'date': date.fromordinal(day).isoformat(), 'type': kind, 'detail': detail}
+
+class HealthStreamDetector:
+    """Per-user online detectors over daily-health events, emitting insights as they fire
+
+    Events for a user must arrive in date order; earlier or repeated dates
+    are counted and skipped. State per user is a fixed handful of numbers,
+    and at most max_users users are held (least recently seen evicted).
+    Insights are returned from process() and passed to `sink` if given.
+    """
+
+    def __init__(self, max_users=DEFAULT_MAX_USERS, sink=None):
+        self.max_users = max_users
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+        self.events = 0
+        self.skipped = 0
+        self.out_of_order = 0
+        self.evictions = 0
+        self.insights = {OVULATION_SHIFT: 0, WEIGHT_GAIN: 0, SYMPTOM_STREAK: 0}
+
+    def process_document(self, doc):
+        """Insights fired by one dailyHealth document (Firestore field names)"""
+        event = compact_event(doc)
+        if event is None:
+            with self._lock:
+                self.skipped += 1
+            return []
+        return self.process(*event)
+
+    def process(self, user_id, day, temperature, weight, symptoms):
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                state = self._users[user_id] = UserState()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._users.move_to_end(user_id)
+
+            if state.last_day is not None and day <= state.last_day:
+                self.out_of_order += 1
+                return []
+            gap = day - state.last_day if state.last_day is not None else None
+            state.last_day = day
+            self.events += 1
+
+            fired = []
+            if temperature is not None:
+                self._temperature(state, user_id, day, temperature, fired)
+            if weight is not None:
+                self._weight(state, user_id, day, weight, fired)
+            self._symptoms(state, user_id, day, gap, symptoms, fired)
+            for insight in fired:
+                self.insights[insight['type']] += 1
+
+        if self.sink is not None:
+            for insight in fired:
+                self.sink(insight)
+        return fired
+
+    def _temperature(self, state, user_id, day, value, fired):
+        if state.temperature_day is not None and day - state.temperature_day > MAX_TEMPERATURE_GAP_DAYS:
+            state.temperatures.clear()
+            state.high_run = 0
+        state.temperature_day = day
+
+        if state.luteal:
+            # Still in the raised phase until a reading drops below the coverline
+            if value >= state.coverline:
+                return
+            state.luteal = False
+            state.temperatures.clear()
+
+        temperatures = state.temperatures
+        if len(temperatures) == TEMPERATURE_BASELINE_DAYS and value > max(temperatures):
+            if state.high_run == 0:
+                state.high_start = day
+                state.high_sum = 0.0
+            state.high_run += 1
+            state.high_sum += value
+            baseline = max(temperatures)
+            if ((state.high_run == TEMPERATURE_HIGH_DAYS and value >= baseline + TEMPERATURE_SHIFT_C) or
+                    state.high_run > TEMPERATURE_HIGH_DAYS):
+                fired.append(_insight(user_id, day, OVULATION_SHIFT,
+                                      estimated_ovulation=date.fromordinal(state.high_start - 1).isoformat(),
+                                      baseline_max_c=round(baseline, 2),
+                                      shift_c=round(state.high_sum / state.high_run - baseline, 2)))
+                state.luteal = True
+                state.coverline = baseline
+                state.high_run = 0
+            return
+
+        state.high_run = 0
+        temperatures.append(value)
+
+    def _weight(self, state, user_id, day, value, fired):
+        if state.weight_baseline is None:
+            state.weight_baseline = value
+            return
+        state.weight_cusum = max(0.0, state.weight_cusum + value - state.weight_baseline - WEIGHT_CUSUM_SLACK_KG)
+        if state.weight_cusum > WEIGHT_CUSUM_LIMIT_KG:
+            fired.append(_insight(user_id, day, WEIGHT_GAIN,
+                                  baseline_kg=round(state.weight_baseline, 1), latest_kg=round(value, 1),
+                                  gain_kg=round(value - state.weight_baseline, 1)))
+            # Start over from the new level so one gain is reported once
+            state.weight_baseline = value
+            state.weight_cusum = 0.0
+            return
+        state.weight_baseline += WEIGHT_BASELINE_ALPHA * (value - state.weight_baseline)
+
+    def _symptoms(self, state, user_id, day, gap, present, fired):
+        tracked = state.symptoms
+        for name in present:
+            if name not in tracked:
+                if len(tracked) >= MAX_TRACKED_SYMPTOMS:
+                    # Make room by forgetting the rarest symptom that is not on a streak
+                    idle = [s for s, (streak, _, _) in tracked.items() if streak == 0]
+                    if not idle:
+                        continue
+                    del tracked[min(idle, key=lambda s: tracked[s][1])]
+                tracked[name] = [0, 0.0, 0.0]
+
+        for name, entry in tracked.items():
+            streak, rate, _ = entry
+            if name in present:
+                if streak == 0 or gap != 1:
+                    streak = 0
+                    entry[2] = rate
+                streak += 1
+                if streak == SYMPTOM_STREAK_DAYS and entry[2] < SYMPTOM_USUAL_RATE:
+                    fired.append(_insight(user_id, day, SYMPTOM_STREAK, symptom=name, days=streak,
+                                          usual_rate=round(entry[2], 3)))
+                entry[1] = rate + SYMPTOM_RATE_ALPHA * (1.0 - rate)
+            else:
+                streak = 0
+                entry[1] = rate - SYMPTOM_RATE_ALPHA * rate
+            entry[0] = streak
+
+    def report(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'max_users': self.max_users,
+                'events': self.events,
+                'skipped': self.skipped,
+                'out_of_order': self.out_of_order,
+                'evictions': self.evictions,
+                'insights': dict(self.insights)
+            }
+
+def _partition_of(user_id, partitions):
+    return zlib.crc32(user_id.encode('utf-8')) % partitions
+
+def _spill_shard(task):
+    """Parse one byte range and spill its events into per-partition files"""
+    path, start, end, shard, partitions, spool = task
+    buckets = [[] for _ in range(partitions)]
+    lines = skipped = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for line in f.read(end - start).splitlines():
+            if not line.strip():
+                continue
+            lines += 1
+            try:
+                event = compact_event(json.loads(line))
+            except ValueError:
+                event = None
+            if event is None:
+                skipped += 1
+                continue
+            buckets[_partition_of(event[0], partitions)].append(event)
+    for partition, events in enumerate(buckets):
+        if events:
+            with open(os.path.join(spool, f"part{partition:04d}-shard{shard:05d}.pkl"), 'wb') as f:
+                pickle.dump(events, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return lines, skipped
+
+def _detect_partition(task):
+    """Run the detector over one partition in (user, date) order; returns (events, insights, path)"""
+    partition, spool = task
+    events = []
+    prefix = f"part{partition:04d}-"
+    for name in sorted(os.listdir(spool)):
+        if name.startswith(prefix):
+            with open(os.path.join(spool, name), 'rb') as f:
+                events.extend(pickle.load(f))
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    # Users arrive one after another, so one user's state is all that is ever held
+    detector = HealthStreamDetector(max_users=1)
+    output = os.path.join(spool, f"insights{partition:04d}.ndjson")
+    with open(output, 'w') as f:
+        for event in events:
+            for insight in detector.process(*event):
+                f.write(json.dumps(insight) + '\n')
+    report = detector.report()
+    return report['events'] + report['out_of_order'], report['insights'], output
+
+def backfill(path, output, workers=None, partitions=None):
+    """Detect insights over a whole dailyHealth NDJSON export on all cores
+
+    Phase one splits the file into line-aligned byte ranges, parses them in
+    parallel and spills events into user-hash partitions. Phase two sorts
+    each partition by user and date and runs the detector on it, so every
+    user's events are seen in order by exactly one process.
+    """
+    workers = workers or os.cpu_count() or 1
+    partitions = partitions or workers * 4
+    spool = tempfile.mkdtemp(prefix='health_stream_', dir=os.path.dirname(os.path.abspath(output)))
+    totals = {OVULATION_SHIFT: 0, WEIGHT_GAIN: 0, SYMPTOM_STREAK: 0}
+    try:
+        start = time.perf_counter()
+        shards = [(path, s, e, i, partitions, spool) for i, (s, e) in enumerate(line_ranges(path, workers * 4))]
+        with Pool(workers) as pool:
+            parsed = pool.map(_spill_shard, shards)
+            split_seconds = time.perf_counter() - start
+            results = pool.map(_detect_partition, [(p, spool) for p in range(partitions)])
+        lines = sum(n for n, _ in parsed)
+        skipped = sum(s for _, s in parsed)
+
+        with open(output, 'w') as out:
+            for _, insights, part in results:
+                for kind, count in insights.items():
+                    totals[kind] += count
+                with open(part) as f:
+                    shutil.copyfileobj(f, out)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(spool, ignore_errors=True)
+
+    return {
+        'lines': lines,
+        'skipped': skipped,
+        'events': sum(events for events, _, _ in results),
+        'insights': totals,
+        'workers': workers,
+        'partitions': partitions,
+        'split_seconds': round(split_seconds, 2),
+        'seconds': round(elapsed, 2),
+        'events_per_second': round(lines / elapsed) if elapsed else None
+    }
+
+def synthetic_export(path, n_users=2000, days=365, seed=42):
+    """dailyHealth export with cycles, weight drifts and symptom runs, in shuffled order"""
+    rng = np.random.default_rng(seed)
+    start = date.today().toordinal() - days
+    cycle_length = rng.integers(25, 35, n_users)
+    phase = rng.integers(0, 35, n_users)
+    weight = rng.uniform(50, 95, n_users)
+    gain_from = rng.integers(0, days * 2, n_users)
+    symptoms = ['cramps', 'bloating', 'headache', 'fatigue', 'acne', 'mood swings']
+
+    lines = []
+    for u in range(n_users):
+        for d in range(days):
+            if rng.random() < 0.15:
+                continue
+            cycle_day = (d + phase[u]) % cycle_length[u]
+            luteal = cycle_day >= cycle_length[u] - 14
+            temperature = 36.4 + (0.35 if luteal else 0.0) + rng.normal(0, 0.08)
+            kg = weight[u] + (0.06 * (d - gain_from[u]) if d > gain_from[u] else 0.0) + rng.normal(0, 0.4)
+            logged = [s for s in symptoms if rng.random() < 0.08]
+            if cycle_day < 3:
+                logged.append('cramps')
+            lines.append(json.dumps({
+                'userId': f"user-{u:06d}", 'date': date.fromordinal(start + d).isoformat(),
+                'temperature': round(float(temperature), 2), 'weight': round(float(kg), 1),
+                'sleepHours': 7, 'stress': 5, 'symptoms': logged
+            }))
+    order = rng.permutation(len(lines))
+    with open(path, 'w') as f:
+        for i in order:
+            f.write(lines[i] + '\n')
+    return len(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Ovulation, weight and symptom insights from dailyHealth logs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('backfill', help='detect insights over an NDJSON export on all cores')
+    run.add_argument('path')
+    run.add_argument('--output', default='health_insights.ndjson')
+    run.add_argument('--workers', type=int)
+
+    bench = subparsers.add_parser('benchmark', help='backfill a synthetic export')
+    bench.add_argument('--users', type=int, default=2000)
+    bench.add_argument('--days', type=int, default=365)
+    bench.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        report = backfill(args.path, args.output, args.workers)
+    else:
+        directory = tempfile.mkdtemp(prefix='health_stream_bench_')
+        path = os.path.join(directory, 'dailyHealth.ndjson')
+        n = synthetic_export(path, args.users, args.days)
+        print(f"🧪 Synthetic export: {n} events for {args.users} users ({os.path.getsize(path) / 1e6:.1f} MB)")
+        report = backfill(path, os.path.join(directory, 'insights.ndjson'), args.workers)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"🌡️ {report['events']} events from {report['lines']} lines ({report['skipped']} skipped) "
+          f"on {report['workers']} workers in {report['seconds']}s ({report['events_per_second']} events/s)")
+    for kind, count in report['insights'].items():
+        print(f"   {kind}: {count}")
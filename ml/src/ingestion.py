@@ -0,0 +1,163 @@
+import glob
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Install: pip install pyarrow
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(CURRENT_DIR, '..', 'data', 'processed')
+CACHE_DIR = os.path.join(CURRENT_DIR, '..', 'data', 'cache')
+
+XLSX_SHEET = 'Full_new'
+JOIN_KEY = 'Patient File No.'
+ROW_KEY = 'Sl. No'
+
+# Bump when the merge or harmonization rules change so old caches are ignored
+INGESTION_VERSION = 1
+
+def harmonize_columns(df):
+    """Strip stray spaces from column names and drop unnamed spreadsheet columns"""
+    df = df.rename(columns=lambda col: str(col).strip())
+    return df.loc[:, [col for col in df.columns if not col.startswith('Unnamed:')]]
+
+def harmonize_dtypes(df, source):
+    """Coerce every column to a numeric dtype; unparseable cells become NaN"""
+    for col in df.columns:
+        if df[col].dtype.kind in 'biuf':
+            continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        bad = int(values.isna().sum() - df[col].isna().sum())
+        if bad:
+            print(f"⚠️ {source}: {bad} non-numeric value(s) in '{col}' treated as missing")
+        df[col] = values
+
+    # Whole-number columns without gaps are stored as integers
+    for col in df.columns:
+        values = df[col]
+        if values.dtype.kind == 'f' and not values.isna().any() and np.all(values == np.round(values)):
+            df[col] = values.astype(np.int64)
+    return df
+
+def _source_files(data_dir):
+    csv_files = sorted(glob.glob(os.path.join(data_dir, 'PCOS*.csv')))
+    xlsx_files = sorted(glob.glob(os.path.join(data_dir, 'PCOS*.xlsx')))
+    return csv_files, xlsx_files
+
+def content_hash(paths):
+    """sha256 over the source file bytes and the ingestion rules version"""
+    digest = hashlib.sha256(f"v{INGESTION_VERSION}".encode())
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def _align_keys(base, extra):
+    """Map the extra table's file numbers onto the base table's
+
+    The CSV numbers patients 10001.. where the spreadsheet uses 1.., so when
+    the keys do not overlap a constant offset is accepted only if it lines up
+    every row.
+    """
+    base_keys = set(base[JOIN_KEY])
+    extra_keys = extra[JOIN_KEY]
+    if base_keys & set(extra_keys):
+        return extra
+
+    offset = extra_keys.min() - min(base_keys)
+    if set(extra_keys - offset) != base_keys:
+        raise ValueError(f"Cannot align '{JOIN_KEY}' between the CSV and XLSX files")
+
+    print(f"🔗 Aligned '{JOIN_KEY}' with an offset of {offset}")
+    extra = extra.copy()
+    extra[JOIN_KEY] = extra_keys - offset
+    return extra
+
+def merge_sources(csv_files, xlsx_files):
+    """Outer-join every processed file on the patient file number"""
+    tables = []
+    for path in xlsx_files:
+        df = pd.read_excel(path, sheet_name=XLSX_SHEET)
+        tables.append(harmonize_dtypes(harmonize_columns(df), os.path.basename(path)))
+    for path in csv_files:
+        df = pd.read_csv(path)
+        tables.append(harmonize_dtypes(harmonize_columns(df), os.path.basename(path)))
+    if not tables:
+        raise FileNotFoundError("No PCOS CSV or XLSX files to merge")
+
+    merged = tables[0].drop(columns=[ROW_KEY], errors='ignore')
+    for extra in tables[1:]:
+        extra = _align_keys(merged, extra.drop(columns=[ROW_KEY], errors='ignore'))
+        merged = merged.merge(extra, on=JOIN_KEY, how='outer', suffixes=('', '_extra'))
+
+        # Columns present in both files: keep the later file's value where it has one
+        for col in [c for c in extra.columns if c != JOIN_KEY and c + '_extra' in merged.columns]:
+            other = merged.pop(col + '_extra')
+            conflicts = int((other.notna() & merged[col].notna() & (other != merged[col])).sum())
+            if conflicts:
+                print(f"⚠️ '{col}': {conflicts} value(s) differ between files, using the CSV value")
+            merged[col] = other.where(other.notna(), merged[col])
+
+    merged = merged.sort_values(JOIN_KEY, kind='mergesort').reset_index(drop=True)
+    merged.insert(0, ROW_KEY, np.arange(1, len(merged) + 1))
+    return harmonize_dtypes(merged, 'merged')
+
+def load_pcos_data(data_dir=None, use_cache=True):
+    """Merged processed dataset, served from a content-addressed parquet cache
+
+    Each data directory keeps its own cache file, so loading one directory
+    never evicts the cache built for another.
+    """
+    data_dir = data_dir or DATA_DIR
+    csv_files, xlsx_files = _source_files(data_dir)
+    if not csv_files and not xlsx_files:
+        raise FileNotFoundError(f"No PCOS CSV or XLSX files found in {data_dir}")
+    source = hashlib.sha256(os.path.abspath(data_dir).encode()).hexdigest()[:8]
+    key = content_hash(xlsx_files + csv_files)
+    cache_path = os.path.join(CACHE_DIR, f"pcos_merged_{source}_{key}.parquet")
+
+    if use_cache and PARQUET_AVAILABLE and os.path.exists(cache_path):
+        df = pd.read_parquet(cache_path)
+        print(f"📦 Loaded cached dataset {df.shape} ({key})")
+        return df
+
+    start = time.perf_counter()
+    df = merge_sources(csv_files, xlsx_files)
+    sources = ', '.join(os.path.basename(p) for p in xlsx_files + csv_files)
+    print(f"📊 Merged {sources}: {df.shape} in {time.perf_counter() - start:.2f}s")
+
+    if use_cache and PARQUET_AVAILABLE:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = cache_path + '.tmp'
+        df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, cache_path)
+        for stale in glob.glob(os.path.join(CACHE_DIR, f"pcos_merged_{source}_*.parquet")):
+            if stale != cache_path:
+                os.remove(stale)
+        print(f"💾 Cached dataset: {cache_path}")
+    elif use_cache:
+        print("⚠️ pyarrow not installed, dataset will be re-parsed on every load")
+
+    return df
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    df = load_pcos_data(use_cache=False)
+    cold = time.perf_counter() - start
+
+    load_pcos_data()
+    start = time.perf_counter()
+    load_pcos_data()
+    warm = time.perf_counter() - start
+
+    print(f"\n⏱️ Parse + merge: {cold * 1000:.0f} ms, cached load: {warm * 1000:.1f} ms")
+    print(df.dtypes.value_counts().to_string())
@@ -0,0 +1,370 @@
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_PATH = os.path.join(CURRENT_DIR, '..', 'data', 'store', 'luna.db')
+
+# Firestore collection -> table, and the sort fields firebase.js queries each by.
+# Every (userId, field) pair gets a composite index, so each query is one index
+# range scan in the requested order.
+COLLECTIONS = {
+    'cycles': {'table': 'cycles', 'order_fields': {'createdAt': 'created_at', 'startDate': 'start_date'}},
+    'dailyHealth': {'table': 'daily_health', 'order_fields': {'createdAt': 'created_at', 'date': 'date'}},
+    'pcosAssessments': {'table': 'pcos_assessments', 'order_fields': {'createdAt': 'created_at'}}
+}
+
+# Columns whose values are dates rather than timestamps are stored as ISO text
+DATE_COLUMNS = ('start_date', 'date')
+
+DEFAULT_POOL_SIZE = 4
+IMPORT_BATCH_SIZE = 50000
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA busy_timeout=5000'
+)
+
+def _table_sql(table, order_columns):
+    extra = ''.join(f', {column} {"TEXT" if column in DATE_COLUMNS else "REAL"}'
+                    for column in order_columns if column != 'created_at')
+    return (f"CREATE TABLE IF NOT EXISTS {table} "
+            f"(id TEXT PRIMARY KEY, user_id TEXT NOT NULL, created_at REAL{extra}, data TEXT NOT NULL)")
+
+def _index_sql(table, column):
+    return f"CREATE INDEX IF NOT EXISTS {table}_user_{column} ON {table} (user_id, {column} DESC)"
+
+def to_epoch(value):
+    """Seconds since the epoch for the timestamp shapes found in Firestore exports"""
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        seconds = value.get('seconds', value.get('_seconds'))
+        if seconds is None:
+            return None
+        return seconds + value.get('nanoseconds', value.get('_nanoseconds', 0)) / 1e9
+    if isinstance(value, (int, float)):
+        # Date.now() values are milliseconds
+        return value / 1000 if value > 1e11 else float(value)
+    text = str(value).strip().replace('Z', '+00:00')
+    parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def to_date(value):
+    """ISO date text (YYYY-MM-DD...) so lexical order is date order"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    epoch = to_epoch(value)
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat() if epoch is not None else None
+
+class ConnectionPool:
+    """Fixed number of SQLite connections handed out to threads one at a time"""
+
+    def __init__(self, path, size=DEFAULT_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            conn = self._connect() if create else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class LocalStore:
+    """Embedded SQLite stand-in for the app's Firestore collections
+
+    Documents keep their Firestore field names in a JSON column; userId and
+    the fields firebase.js sorts on are copied into indexed columns. Queries
+    mirror the app's where('userId', '==', uid).orderBy(field).limit(n).
+    """
+
+    def __init__(self, path=STORE_PATH, pool_size=DEFAULT_POOL_SIZE):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.pool = ConnectionPool(path, pool_size)
+        self.create_schema()
+
+    def create_schema(self, indexes=True):
+        with self.pool.connection() as conn:
+            for spec in COLLECTIONS.values():
+                conn.execute(_table_sql(spec['table'], spec['order_fields'].values()))
+            if indexes:
+                self.create_indexes(conn)
+
+    def create_indexes(self, conn=None):
+        if conn is None:
+            with self.pool.connection() as conn:
+                return self.create_indexes(conn)
+        for spec in COLLECTIONS.values():
+            for column in spec['order_fields'].values():
+                conn.execute(_index_sql(spec['table'], column))
+
+    def drop_indexes(self):
+        """Drop the composite indexes; a bulk load then rebuilds them once at the end"""
+        with self.pool.connection() as conn:
+            for spec in COLLECTIONS.values():
+                for column in spec['order_fields'].values():
+                    conn.execute(f"DROP INDEX IF EXISTS {spec['table']}_user_{column}")
+
+    def _row(self, collection, doc):
+        spec = COLLECTIONS[collection]
+        doc = dict(doc)
+        doc_id = doc.pop('id', None) or doc.pop('_id', None) or uuid.uuid4().hex
+        row = [str(doc_id), doc['userId']]
+        for column in spec['order_fields'].values():
+            field = next(f for f, c in spec['order_fields'].items() if c == column)
+            row.append(to_date(doc.get(field)) if column in DATE_COLUMNS else to_epoch(doc.get(field)))
+        row.append(json.dumps(doc, separators=(',', ':'), default=str))
+        return row
+
+    def _insert_sql(self, collection):
+        spec = COLLECTIONS[collection]
+        columns = ['id', 'user_id'] + list(spec['order_fields'].values()) + ['data']
+        return (f"INSERT OR REPLACE INTO {spec['table']} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})")
+
+    def insert_rows(self, collection, rows):
+        """Write prepared row tuples in one transaction (ids replace existing documents)"""
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                conn.executemany(self._insert_sql(collection), rows)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def insert(self, collection, docs):
+        self.insert_rows(collection, [self._row(collection, doc) for doc in docs])
+
+    def import_ndjson(self, collection, path, batch_size=IMPORT_BATCH_SIZE):
+        """Stream a newline-delimited JSON export into a collection; returns (imported, skipped)"""
+        imported = skipped = 0
+        batch = []
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(self._row(collection, json.loads(line)))
+                except (ValueError, KeyError, TypeError):
+                    skipped += 1
+                    continue
+                if len(batch) >= batch_size:
+                    self.insert_rows(collection, batch)
+                    imported += len(batch)
+                    batch = []
+        if batch:
+            self.insert_rows(collection, batch)
+            imported += len(batch)
+        return imported, skipped
+
+    def query(self, collection, user_id, order_by='createdAt', descending=True, since=None, limit=None):
+        """Documents of one user ordered by an indexed field, optionally from `since` on"""
+        spec = COLLECTIONS[collection]
+        column = spec['order_fields'].get(order_by)
+        if column is None:
+            raise ValueError(f"'{collection}' is not indexed by '{order_by}'")
+
+        sql = f"SELECT id, data FROM {spec['table']} WHERE user_id = ?"
+        params = [user_id]
+        if since is not None:
+            sql += f" AND {column} >= ?"
+            params.append(to_date(since) if column in DATE_COLUMNS else to_epoch(since))
+        sql += f" ORDER BY {column} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [dict(json.loads(data), id=doc_id) for doc_id, data in rows]
+
+    # The same queries as firebase.js
+    def user_cycles(self, user_id, limit=50, order_by='createdAt'):
+        return self.query('cycles', user_id, order_by, limit=limit)
+
+    def user_daily_health(self, user_id, days=30, order_by='createdAt'):
+        cutoff = time.time() - days * 86400
+        if order_by == 'date':
+            cutoff = datetime.fromtimestamp(cutoff, timezone.utc).date().isoformat()
+        return self.query('dailyHealth', user_id, order_by, since=cutoff)
+
+    def user_assessments(self, user_id, limit=20):
+        return self.query('pcosAssessments', user_id, limit=limit)
+
+    def latest_assessment(self, user_id):
+        found = self.user_assessments(user_id, limit=1)
+        return found[0] if found else None
+
+    def explain(self, collection, order_by='createdAt', since=False):
+        """SQLite's plan for a query shape, to check it is an index range scan"""
+        spec = COLLECTIONS[collection]
+        column = spec['order_fields'][order_by]
+        sql = (f"EXPLAIN QUERY PLAN SELECT id, data FROM {spec['table']} WHERE user_id = ?"
+               f"{f' AND {column} >= ?' if since else ''} ORDER BY {column} DESC LIMIT 20")
+        with self.pool.connection() as conn:
+            return [row[-1] for row in conn.execute(sql, ['u', 0] if since else ['u'])]
+
+    def count(self, collection):
+        with self.pool.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {COLLECTIONS[collection]['table']}").fetchone()[0]
+
+    def close(self):
+        self.pool.close()
+
+def _synthetic_rows(collection, n, n_users, rng, start_id=0):
+    """Row tuples with users interleaved in arrival order, as a real export would be"""
+    users = rng.integers(0, n_users, n)
+    created = time.time() - rng.uniform(0, 3 * 365 * 86400, n)
+    dates = np.datetime_as_string((created * 1e6).astype('datetime64[us]'), unit='D')
+    data = {
+        'cycles': '{"flow":"medium","symptoms":["cramps"],"mood":"ok"}',
+        'dailyHealth': '{"weight":62.5,"sleepHours":7,"stressLevel":4,"exerciseMinutes":30}',
+        'pcosAssessments': '{"predictionResult":{"risk_score":31.2,"risk_level":"Low"}}'
+    }[collection]
+    for i in range(n):
+        user = f"user-{users[i]:07d}"
+        row = [f"{collection}-{start_id + i}", user, float(created[i])]
+        if collection != 'pcosAssessments':
+            row.append(str(dates[i]))
+        row.append(data)
+        yield row
+
+def _latency(fn, users, repeats):
+    samples = np.empty(repeats)
+    for i in range(repeats):
+        user = users[i % len(users)]
+        start = time.perf_counter()
+        fn(user)
+        samples[i] = (time.perf_counter() - start) * 1e6
+    p50, p99 = np.percentile(samples, [50, 99])
+    return round(float(p50), 1), round(float(p99), 1)
+
+def benchmark(path, rows, n_users, threads=4, repeats=2000, seed=42):
+    """Bulk-load synthetic collections and time the app's range queries"""
+    rng = np.random.default_rng(seed)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    store = LocalStore(path, pool_size=threads)
+    store.drop_indexes()
+
+    # Daily logs dominate; cycles and assessments are rarer per user
+    sizes = {'dailyHealth': rows, 'cycles': max(rows // 10, 1), 'pcosAssessments': max(rows // 20, 1)}
+    for collection, n in sizes.items():
+        start = time.perf_counter()
+        generator = _synthetic_rows(collection, n, n_users, rng)
+        while True:
+            chunk = [row for _, row in zip(range(IMPORT_BATCH_SIZE * 4), generator)]
+            if not chunk:
+                break
+            store.insert_rows(collection, chunk)
+        elapsed = time.perf_counter() - start
+        print(f"💾 Loaded {n} {collection} rows in {elapsed:.1f}s ({n / elapsed:.0f} rows/s)")
+
+    start = time.perf_counter()
+    store.create_indexes()
+    print(f"🔧 Built composite indexes in {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(path) / 1e9:.2f} GB on disk)")
+
+    users = [f"user-{u:07d}" for u in rng.integers(0, n_users, repeats)]
+    checks = {
+        'cycles by createdAt, limit 50': lambda u: store.user_cycles(u),
+        'cycles by startDate, limit 12': lambda u: store.query('cycles', u, 'startDate', limit=12),
+        'dailyHealth last 30 days by createdAt': lambda u: store.user_daily_health(u, 30),
+        'dailyHealth last 30 days by date': lambda u: store.user_daily_health(u, 30, 'date'),
+        'dailyHealth by createdAt, limit 20': lambda u: store.query('dailyHealth', u, limit=20),
+        'pcosAssessments by createdAt, limit 20': lambda u: store.user_assessments(u)
+    }
+    print(f"📊 Range queries over {n_users} users ({sum(sizes.values())} rows), single thread:")
+    for label, fn in checks.items():
+        p50, p99 = _latency(fn, users, repeats)
+        print(f"   {label:<42} p50 {p50:>8.1f} µs   p99 {p99:>8.1f} µs")
+
+    # Pooled connections from several threads at once
+    fn = checks['dailyHealth by createdAt, limit 20']
+    done = []
+
+    def worker(offset):
+        for i in range(repeats):
+            fn(users[(offset + i) % len(users)])
+        done.append(repeats)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(t * 97,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    print(f"   {threads} threads, dailyHealth limit 20: {sum(done) / elapsed:.0f} queries/s")
+    print(f"   plan: {store.explain('dailyHealth', since=True)}")
+    store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local SQLite store for cycles, daily health and assessments')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    importer = subparsers.add_parser('import', help='import an NDJSON export into a collection')
+    importer.add_argument('collection', choices=sorted(COLLECTIONS))
+    importer.add_argument('path')
+    importer.add_argument('--db', default=STORE_PATH)
+
+    bench = subparsers.add_parser('benchmark', help='bulk-load synthetic rows and time range queries')
+    bench.add_argument('--db', default=os.path.join(CURRENT_DIR, '..', 'data', 'store', 'benchmark.db'))
+    bench.add_argument('--rows', type=int, default=20000000, help='dailyHealth rows; cycles get 1/10, assessments 1/20')
+    bench.add_argument('--users', type=int, default=200000)
+    bench.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        store = LocalStore(args.db)
+        start = time.perf_counter()
+        imported, skipped = store.import_ndjson(args.collection, args.path)
+        print(f"💾 Imported {imported} {args.collection} documents ({skipped} skipped) "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        benchmark(args.db, args.rows, args.users, args.threads)
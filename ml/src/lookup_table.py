@@ -0,0 +1,278 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+LOOKUP_TABLE_FILE = 'pcos_lookup.npz'
+
+# The fields predictPCOSRisk sends; everything else must be absent for a lookup
+GRID_FIELDS = ('Age (yrs)', 'BMI', 'Height(Cm)')
+WEIGHT_FIELD = 'Weight (Kg)'
+FLAG_FIELDS = ('Cycle(R/I)', 'Weight gain(Y/N)', 'hair growth(Y/N)', 'Pimples(Y/N)',
+               'Fast food (Y/N)', 'Reg.Exercise(Y/N)')
+
+# (start, stop, step) of each grid axis; BMI steps land on the 18.5/25/30 cut points
+DEFAULT_AXES = {
+    'Age (yrs)': (15.0, 50.0, 1.0),
+    'BMI': (14.0, 45.0, 0.5),
+    'Height(Cm)': (140.0, 190.0, 5.0)
+}
+
+# Grid weights are BMI * height^2; a request whose weight is further off than
+# this is not an app-form request and goes to the full model
+WEIGHT_TOLERANCE_KG = 0.5
+
+# Probabilities are stored as uint16, a quantization step of 1/65535
+QUANTIZATION_LEVELS = 65535
+
+def axis_points(start, stop, step):
+    return start + step * np.arange(int(round((stop - start) / step)) + 1)
+
+class LookupTable:
+    """Dense grid of full-model probabilities over the app's reduced input form
+
+    table[flags, age, bmi, height] holds the quantized probability at each
+    grid point, where flags packs the six 0/1 fields into a 6-bit code.
+    Continuous inputs are interpolated trilinearly between the 8 surrounding
+    points, so a lookup is a few multiplications with no tree traversal.
+    Scores within `margin` of a boundary are left to the full model. The
+    margin is the largest error seen on the check requests at distillation
+    time, not a proven bound on the interpolation error, so an input unlike
+    those checks can still land on the other side of a boundary; the
+    distillation report counts the disagreements served on held-out requests.
+    """
+
+    def __init__(self, table, axes, model_version, schema, margin=0.0, boundaries=()):
+        self.table = table
+        self.axes = axes
+        self.model_version = model_version
+        self.margin = margin
+        self.boundaries = tuple(boundaries)
+
+        self._bounds = [(start, start + step * (size - 1), step, size)
+                        for (start, _, step), size in zip((axes[name] for name in GRID_FIELDS), table.shape[1:])]
+        self._grid_slots = [schema.slots[name] for name in GRID_FIELDS]
+        self._weight_slot = schema.slots[WEIGHT_FIELD]
+        self._flag_slots = [schema.slots[name] for name in FLAG_FIELDS]
+        used = set(self._grid_slots + self._flag_slots + [self._weight_slot])
+        self._other_slots = [slot for slot in range(len(schema.names)) if slot not in used]
+        self._scale = 1.0 / QUANTIZATION_LEVELS
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def lookup(self, record):
+        """Interpolated probability for an app-form record, or None when it is off the grid"""
+        values = record.values
+        for slot in self._other_slots:
+            if values[slot] == values[slot]:
+                return None
+
+        code = 0
+        for bit, slot in enumerate(self._flag_slots):
+            value = values[slot]
+            if value == 1.0:
+                code |= 1 << bit
+            elif value != 0.0:
+                return None
+
+        position = []
+        for slot, (low, high, step, size) in zip(self._grid_slots, self._bounds):
+            value = values[slot]
+            # NaN fails this comparison too
+            if not low <= value <= high:
+                return None
+            f = (value - low) / step
+            i = min(int(f), size - 2)
+            position.append((i, f - i))
+
+        bmi, height = values[self._grid_slots[1]], values[self._grid_slots[2]]
+        if not abs(values[self._weight_slot] - bmi * (height / 100) ** 2) <= WEIGHT_TOLERANCE_KG:
+            return None
+
+        (a, ta), (b, tb), (h, th) = position
+        cube = self.table[code, a:a + 2, b:b + 2, h:h + 2]
+        weights_a = (1 - ta, ta)
+        weights_b = (1 - tb, tb)
+        weights_h = (1 - th, th)
+        total = 0.0
+        for i in (0, 1):
+            for j in (0, 1):
+                for k in (0, 1):
+                    total += weights_a[i] * weights_b[j] * weights_h[k] * int(cube[i, j, k])
+        probability = total * self._scale
+
+        for boundary in self.boundaries:
+            if abs(probability - boundary) < self.margin:
+                return None
+        return probability
+
+    def save(self, path):
+        np.savez_compressed(
+            path, table=self.table, model_version=np.array(self.model_version),
+            axes=np.array([self.axes[name] for name in GRID_FIELDS]), margin=np.array(self.margin)
+        )
+
+def load_lookup_table(path, schema, boundaries=()):
+    """Load a table written by LookupTable.save for the given request schema and decision boundaries"""
+    with np.load(path, allow_pickle=False) as bundle:
+        axes = {name: tuple(float(v) for v in row) for name, row in zip(GRID_FIELDS, bundle['axes'])}
+        return LookupTable(bundle['table'], axes, str(bundle['model_version']), schema,
+                           float(bundle['margin']), boundaries)
+
+def _flag_values(code):
+    return [float((code >> bit) & 1) for bit in range(len(FLAG_FIELDS))]
+
+def distill(api, axes=None, progress=True):
+    """Evaluate the served model at every grid point through the API's feature path"""
+    from request_schema import MISSING, PCOSRecord
+
+    axes = axes or DEFAULT_AXES
+    points = [axis_points(*axes[name]) for name in GRID_FIELDS]
+    age, bmi, height = (grid.ravel() for grid in np.meshgrid(*points, indexing='ij'))
+    weight = bmi * (height / 100) ** 2
+
+    schema = api.request_schema
+    slots = [schema.slots[name] for name in GRID_FIELDS + (WEIGHT_FIELD,)]
+    flag_slots = [schema.slots[name] for name in FLAG_FIELDS]
+    grid_values = np.column_stack([age, bmi, height, weight]).tolist()
+
+    n_codes = 1 << len(FLAG_FIELDS)
+    table = np.empty((n_codes,) + tuple(len(p) for p in points), dtype=np.uint16)
+    start = time.perf_counter()
+    for code in range(n_codes):
+        template = [MISSING] * len(schema.names)
+        for slot, value in zip(flag_slots, _flag_values(code)):
+            template[slot] = value
+
+        rows = []
+        for row in grid_values:
+            values = template[:]
+            for slot, value in zip(slots, row):
+                values[slot] = value
+            rows.append(api.create_feature_vector(PCOSRecord(values, schema), api.feature_names))
+
+        probability = api.predict_probabilities(np.vstack(rows))[:, 1]
+        table[code] = np.round(probability * QUANTIZATION_LEVELS).reshape(table.shape[1:])
+        if progress and (code + 1) % 8 == 0:
+            print(f"   {code + 1}/{n_codes} flag combinations ({time.perf_counter() - start:.0f}s)")
+
+    return LookupTable(table, axes, api.model_version, schema)
+
+def evaluate(api, lookup, payloads):
+    """Error of the table against the full model on request payloads it covers"""
+    records = [api.request_schema.parse(payload) for payload in payloads]
+    covered = [(record, lookup.lookup(record)) for record in records]
+    covered = [(record, value) for record, value in covered if value is not None]
+    if not covered:
+        return {'requests': len(records), 'covered': 0}
+
+    features = np.vstack([api.create_feature_vector(record, api.feature_names) for record, _ in covered])
+    exact = api.predict_probabilities(features)[:, 1]
+    approx = np.array([value for _, value in covered])
+    errors = np.abs(approx - exact)
+
+    threshold = api.optimal_threshold
+    levels = [api.classify_risk(p * 100) for p in exact]
+    approx_levels = [api.classify_risk(p * 100) for p in approx]
+
+    sample = [record for record, _ in covered[:500]]
+    start = time.perf_counter()
+    for record in sample:
+        lookup.lookup(record)
+    lookup_us = (time.perf_counter() - start) / len(sample) * 1e6
+    start = time.perf_counter()
+    for record in sample[:100]:
+        api.predict_probabilities(api.create_feature_vector(record, api.feature_names))
+    model_us = (time.perf_counter() - start) / min(len(sample), 100) * 1e6
+
+    return {
+        'requests': len(records),
+        'covered': len(covered),
+        'max_abs_error': round(float(errors.max()), 5),
+        'mean_abs_error': round(float(errors.mean()), 5),
+        'p99_abs_error': round(float(np.percentile(errors, 99)), 5),
+        'prediction_disagreements': int(((approx > threshold) != (exact > threshold)).sum()),
+        'risk_level_disagreements': sum(a != b for a, b in zip(levels, approx_levels)),
+        'lookup_us': round(lookup_us, 2),
+        'full_model_us': round(model_us, 2)
+    }
+
+def _random_grid_payloads(axes, n, seed):
+    """App-form payloads drawn uniformly over the grid, to find the worst cells"""
+    rng = np.random.default_rng(seed)
+    columns = {name: rng.uniform(axes[name][0], axes[name][1], n) for name in GRID_FIELDS}
+    payloads = []
+    for i in range(n):
+        payload = {name: float(columns[name][i]) for name in GRID_FIELDS}
+        payload[WEIGHT_FIELD] = payload['BMI'] * (payload['Height(Cm)'] / 100) ** 2
+        for name, value in zip(FLAG_FIELDS, _flag_values(int(rng.integers(1 << len(FLAG_FIELDS))))):
+            payload[name] = value
+        payloads.append(payload)
+    return payloads
+
+if __name__ == "__main__":
+    import json
+
+    parser = argparse.ArgumentParser(description='Distill the served model into an app-form lookup table')
+    parser.add_argument('--age-step', type=float, default=DEFAULT_AXES['Age (yrs)'][2])
+    parser.add_argument('--bmi-step', type=float, default=DEFAULT_AXES['BMI'][2])
+    parser.add_argument('--height-step', type=float, default=DEFAULT_AXES['Height(Cm)'][2])
+    parser.add_argument('--check', type=int, default=5000, help='requests used to measure the error')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # The table is distilled from whichever backend PCOS_MODEL_BACKEND serves
+    import api_fixed as api
+    from ingestion import load_pcos_data
+    from synthetic_data import SyntheticPCOSGenerator
+
+    steps = {'Age (yrs)': args.age_step, 'BMI': args.bmi_step, 'Height(Cm)': args.height_step}
+    axes = {name: (start, stop, steps[name]) for name, (start, stop, _) in DEFAULT_AXES.items()}
+    cells = np.prod([len(axis_points(*axes[name])) for name in GRID_FIELDS]) << len(FLAG_FIELDS)
+    print(f"🔧 Distilling model {api.model_version} ({api.MODEL_BACKEND}) over {cells} grid points...")
+    lookup = distill(api, axes)
+
+    data = load_pcos_data()
+    generator = SyntheticPCOSGenerator(random_state=args.seed).fit(data)
+    app_requests = list(generator.generate_payloads(args.check))
+    grid_requests = _random_grid_payloads(axes, args.check, args.seed)
+    report = {
+        'model_version': lookup.model_version,
+        'axes': axes,
+        'synthetic_app_requests': evaluate(api, lookup, app_requests),
+        'uniform_over_grid': evaluate(api, lookup, grid_requests)
+    }
+
+    # Scores this close to a boundary fall back to the full model when served;
+    # an empirical margin, so served disagreements are rare rather than impossible
+    lookup.margin = max(report[name].get('max_abs_error', 0) for name in ('synthetic_app_requests', 'uniform_over_grid'))
+    lookup.boundaries = tuple([api.optimal_threshold] + [point / 100 for point in api.DECISION_POINTS])
+    report['error_margin'] = lookup.margin
+
+    # The margin was set on the requests above, so serving is checked on a
+    # held-out set drawn with another seed
+    held_out = SyntheticPCOSGenerator(random_state=args.seed + 1).fit(data)
+    report['served_held_out_app_requests'] = evaluate(api, lookup, list(held_out.generate_payloads(args.check)))
+    report['served_held_out_grid'] = evaluate(api, lookup, _random_grid_payloads(axes, args.check, args.seed + 1))
+
+    for name in ('synthetic_app_requests', 'uniform_over_grid', 'served_held_out_app_requests', 'served_held_out_grid'):
+        result = report[name]
+        print(f"📊 {name}: {result['covered']}/{result['requests']} answered from the table")
+        if result['covered']:
+            print(f"   abs error max {result['max_abs_error']:.4f}  mean {result['mean_abs_error']:.4f}  "
+                  f"p99 {result['p99_abs_error']:.4f}")
+            print(f"   disagreements: prediction {result['prediction_disagreements']}, "
+                  f"risk level {result['risk_level_disagreements']}")
+            print(f"   latency: lookup {result['lookup_us']:.1f} µs vs full model {result['full_model_us']:.1f} µs")
+
+    model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models')
+    path = os.path.join(model_dir, LOOKUP_TABLE_FILE)
+    lookup.save(path)
+    print(f"💾 Lookup table saved: {path} ({lookup.nbytes / 1e6:.1f} MB in memory, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB on disk), fallback margin {lookup.margin:.4f}")
+
+    with open(os.path.join(model_dir, 'lookup_table_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
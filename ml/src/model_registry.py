@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from request_coalescing import SingleFlight
+from request_schema import compile_schema
+from response_cache import ResponseCache
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.path.join(CURRENT_DIR, '..', 'models', 'registry')
+
+BUNDLE_FILES = ('pcos_model.joblib', 'pcos_scaler.joblib', 'feature_names.joblib', 'model_info.joblib')
+OPTIONAL_FILES = ('label_encoders.joblib', 'reference_profile.json', 'evaluation_report.json')
+MANIFEST_FILE = 'bundle.json'
+CURRENT_FILE = 'CURRENT'
+
+# Loaded variants beyond this estimated size are evicted least recently used first
+DEFAULT_MEMORY_CAP_MB = 512
+
+LATENCY_SAMPLES = 2048
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def publish_bundle(model_dir, variant, trainer, source_columns=(), registry_dir=REGISTRY_DIR):
+    """Copy the bundle a trainer just wrote into registry/<variant>/<version> and make it current
+
+    The manifest records the feature plan: the model's feature order and
+    which of those features are engineered rather than read from a column.
+    """
+    model_sha = _sha256(os.path.join(model_dir, 'pcos_model.joblib'))
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{model_sha[:8]}"
+    bundle_dir = os.path.join(registry_dir, variant, version)
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    for name in BUNDLE_FILES + OPTIONAL_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            shutil.copy2(path, bundle_dir)
+
+    feature_names = list(joblib.load(os.path.join(model_dir, 'feature_names.joblib')))
+    source_columns = set(source_columns)
+    manifest = {
+        'variant': variant,
+        'version': version,
+        'trainer': trainer,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model_sha256': model_sha,
+        'feature_plan': {
+            'features': feature_names,
+            'engineered': [name for name in feature_names if source_columns and name not in source_columns]
+        }
+    }
+    with open(os.path.join(bundle_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Switch the current pointer atomically so a running API never reads half a name
+    current_path = os.path.join(registry_dir, variant, CURRENT_FILE)
+    with open(current_path + '.tmp', 'w') as f:
+        f.write(version)
+    os.replace(current_path + '.tmp', current_path)
+
+    print(f"📚 Registered '{variant}' model version {version}")
+    return version
+
+def _forest_nbytes(model):
+    """Approximate resident size of a fitted forest's node and value arrays"""
+    total = 0
+    for estimator in getattr(model, 'estimators_', ()):
+        state = estimator.tree_.__getstate__()
+        total += state['nodes'].nbytes + state['values'].nbytes
+    return total
+
+class ModelBundle:
+    """One loaded registry version: model, scaler and the compiled request schema"""
+
+    def __init__(self, bundle_dir, manifest, model=None, model_nbytes=None):
+        self.path = bundle_dir
+        self.manifest = manifest
+        self.variant = manifest['variant']
+        self.version = manifest['version']
+
+        self.model = model if model is not None else joblib.load(os.path.join(bundle_dir, 'pcos_model.joblib'))
+        self.scaler = joblib.load(os.path.join(bundle_dir, 'pcos_scaler.joblib'))
+        self.feature_names = joblib.load(os.path.join(bundle_dir, 'feature_names.joblib'))
+        self.model_info = joblib.load(os.path.join(bundle_dir, 'model_info.joblib'))
+        self.schema = compile_schema(self.feature_names)
+        self.threshold = self.model_info.get('optimal_threshold', 0.5)
+        self.nbytes = model_nbytes if model_nbytes is not None else _forest_nbytes(self.model)
+        # A scaler fit on a DataFrame warns on every plain-array transform
+        self.scaler_columns = list(self.feature_names) if hasattr(self.scaler, 'feature_names_in_') else None
+
+        # Same spliced constant section as the default model's responses
+        self.responses = ResponseCache()
+        self.responses.set_prediction_constants({
+            'model_accuracy': round(self.model_info.get('accuracy', 0) * 100, 1),
+            'features_used': len(self.feature_names),
+            'threshold_used': round(self.threshold, 3),
+            'model_variant': self.variant,
+            'model_version': self.version
+        })
+
+    def predict_proba(self, X):
+        if self.scaler_columns is not None:
+            X = pd.DataFrame(X, columns=self.scaler_columns)
+        return self.model.predict_proba(self.scaler.transform(X))
+
+class VariantMetrics:
+    """Request counters and recent latencies for one variant"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.positives = 0
+        self.score_sum = 0.0
+        self.risk_levels = {}
+        self.last_used = None
+        self.latency_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, latency_ms, prediction, risk_score, risk_level):
+        with self._lock:
+            self.requests += 1
+            self.positives += prediction
+            self.score_sum += risk_score
+            self.risk_levels[risk_level] = self.risk_levels.get(risk_level, 0) + 1
+            self.latency_ms.append(latency_ms)
+            self.last_used = time.time()
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def to_dict(self):
+        with self._lock:
+            latency = None
+            if self.latency_ms:
+                p50, p95, p99 = np.percentile(np.fromiter(self.latency_ms, dtype=np.float64), [50, 95, 99])
+                latency = {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3)}
+            requests = max(self.requests, 1)
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'positive_rate': round(self.positives / requests, 4),
+                'mean_risk_score': round(self.score_sum / requests, 2),
+                'risk_levels': dict(self.risk_levels),
+                'latency_ms': latency,
+                'last_used': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.last_used)) if self.last_used else None
+            }
+
+class ModelRegistry:
+    """Lazily loaded model variants with an LRU memory cap and per-variant metrics
+
+    Each (variant, version) is loaded once per process. Bundles whose model
+    file has the same sha256 share one model object, so republishing an
+    unchanged model, or two variants pointing at the same forest, costs no
+    extra memory.
+    """
+
+    def __init__(self, registry_dir=REGISTRY_DIR, memory_cap_mb=DEFAULT_MEMORY_CAP_MB):
+        self.registry_dir = registry_dir
+        self.memory_cap = int(memory_cap_mb * 1e6)
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()
+        self._metrics = {}
+        # Concurrent first requests for one (variant, version) share a single load
+        self._loads = SingleFlight()
+        self.evictions = 0
+        self.current = {}
+        self.refresh()
+
+    def refresh(self):
+        """Re-read each variant's CURRENT pointer"""
+        current = {}
+        if os.path.isdir(self.registry_dir):
+            for variant in sorted(os.listdir(self.registry_dir)):
+                pointer = os.path.join(self.registry_dir, variant, CURRENT_FILE)
+                if os.path.exists(pointer):
+                    with open(pointer) as f:
+                        current[variant] = f.read().strip()
+        with self._lock:
+            self.current = current
+        return current
+
+    def metrics(self, name):
+        metrics = self._metrics.get(name)
+        if metrics is None:
+            metrics = self._metrics.setdefault(name, VariantMetrics())
+        return metrics
+
+    def get(self, variant):
+        """Loaded bundle for a variant's current version; raises KeyError for unknown variants
+
+        Loading happens outside the registry lock, so a cold variant does not
+        stall lookups of bundles that are already loaded.
+        """
+        with self._lock:
+            version = self.current.get(variant)
+            if version is None:
+                raise KeyError(variant)
+
+            key = (variant, version)
+            bundle = self._loaded.get(key)
+            if bundle is not None:
+                self._loaded.move_to_end(key)
+                return bundle
+
+        bundle, _ = self._loads.do(key, lambda: self._load(key))
+        return bundle
+
+    def _load(self, key):
+        variant, version = key
+        with self._lock:
+            # A load that finished just before this one started
+            bundle = self._loaded.get(key)
+            if bundle is not None:
+                return bundle
+
+        bundle_dir = os.path.join(self.registry_dir, variant, version)
+        with open(os.path.join(bundle_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+
+        with self._lock:
+            twin = next((b for b in self._loaded.values()
+                         if b.manifest['model_sha256'] == manifest['model_sha256']), None)
+        start = time.perf_counter()
+        if twin is not None:
+            bundle = ModelBundle(bundle_dir, manifest, twin.model, twin.nbytes)
+        else:
+            bundle = ModelBundle(bundle_dir, manifest)
+        print(f"📚 Loaded '{variant}' {version} in {time.perf_counter() - start:.2f}s "
+              f"(~{bundle.nbytes / 1e6:.1f} MB)")
+
+        with self._lock:
+            self._loaded[key] = bundle
+            self._evict(keep=key)
+        return bundle
+
+    def _resident_bytes(self):
+        # Shared model objects are only counted once
+        return sum({id(b.model): b.nbytes for b in self._loaded.values()}.values())
+
+    def _evict(self, keep):
+        while len(self._loaded) > 1 and self._resident_bytes() > self.memory_cap:
+            oldest = next(iter(self._loaded))
+            if oldest == keep:
+                break
+            evicted = self._loaded.pop(oldest)
+            self.evictions += 1
+            print(f"📚 Evicted '{evicted.variant}' {evicted.version} (memory cap {self.memory_cap / 1e6:.0f} MB)")
+
+    def report(self):
+        with self._lock:
+            variants = {}
+            for variant, version in self.current.items():
+                bundle = self._loaded.get((variant, version))
+                variants[variant] = {
+                    'version': version,
+                    'loaded': bundle is not None,
+                    'features': len(bundle.feature_names) if bundle else None,
+                    'estimated_mb': round(bundle.nbytes / 1e6, 2) if bundle else None
+                }
+            resident = self._resident_bytes()
+        for name, metrics in list(self._metrics.items()):
+            variants.setdefault(name, {})['metrics'] = metrics.to_dict()
+        return {
+            'registry_dir': os.path.abspath(self.registry_dir),
+            'memory_cap_mb': round(self.memory_cap / 1e6, 1),
+            'resident_mb': round(resident / 1e6, 2),
+            'evictions': self.evictions,
+            'variants': variants
+        }
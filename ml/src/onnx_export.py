@@ -0,0 +1,149 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+ONNX_MODEL_FILE = 'pcos_pipeline.onnx'
+
+# Install: pip install skl2onnx onnxruntime
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+def export_onnx(model, scaler, path):
+    """Write StandardScaler + RandomForest as a single ONNX graph
+
+    The scaler is expressed as double-precision Sub/Div followed by a Cast to
+    float, which is exactly what sklearn does (scale in float64, trees compare
+    float32), so split decisions match sklearn bit for bit.
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[('scaled', FloatTensorType([None, scaler.n_features_in_]))],
+        # Plain probability tensor instead of a list of {class: prob} maps
+        options={id(model): {'zipmap': False}}
+    )
+    graph = onnx_model.graph
+
+    scaling_nodes = [
+        helper.make_node('Sub', ['features', 'scaler_mean'], ['centered']),
+        helper.make_node('Div', ['centered', 'scaler_scale'], ['scaled_double']),
+        helper.make_node('Cast', ['scaled_double'], ['scaled'], to=TensorProto.FLOAT),
+    ]
+    initializers = [
+        numpy_helper.from_array(np.asarray(scaler.mean_, dtype=np.float64), 'scaler_mean'),
+        numpy_helper.from_array(np.asarray(scaler.scale_, dtype=np.float64), 'scaler_scale'),
+    ]
+
+    pipeline_graph = helper.make_graph(
+        scaling_nodes + list(graph.node),
+        'pcos_pipeline',
+        [helper.make_tensor_value_info('features', TensorProto.DOUBLE, [None, scaler.n_features_in_])],
+        list(graph.output),
+        initializer=initializers + list(graph.initializer)
+    )
+    pipeline_model = helper.make_model(pipeline_graph, opset_imports=onnx_model.opset_import)
+    pipeline_model.ir_version = onnx_model.ir_version
+    onnx.checker.check_model(pipeline_model)
+
+    with open(path, 'wb') as f:
+        f.write(pipeline_model.SerializeToString())
+    return path
+
+class OnnxPipeline:
+    """onnxruntime CPU session over the exported pipeline; takes unscaled feature rows"""
+
+    # The graph contains the scaler, so callers pass raw create_feature_vector output
+    includes_scaler = True
+
+    def __init__(self, path, intra_op_threads=1):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime not available. Install with: pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(path, sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.n_features_in_ = self.session.get_inputs()[0].shape[1]
+        self.classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        return self.session.run(['probabilities'], {self.input_name: X})[0]
+
+def verify_parity(model, scaler, onnx_pipeline, X, threshold=0.5, tolerance=1e-4):
+    """Compare ONNX and sklearn probabilities on raw feature rows"""
+    expected = model.predict_proba(scaler.transform(X))[:, 1]
+    actual = onnx_pipeline.predict_proba(X)[:, 1]
+
+    differences = np.abs(expected - actual)
+    class_flips = int(((expected > threshold) != (actual > threshold)).sum())
+    passed = differences.max() <= tolerance and class_flips == 0
+
+    print(f"🧪 Parity check on {len(X)} rows:")
+    print(f"   Max |onnx - sklearn|: {differences.max():.2e} (tolerance {tolerance:.0e})")
+    print(f"   Rows above tolerance: {int((differences > tolerance).sum())}")
+    print(f"   Class flips at threshold {threshold:.3f}: {class_flips}")
+    print(f"   {'✅ PASSED' if passed else '❌ FAILED'}")
+    return passed
+
+def benchmark_backends(model, scaler, onnx_pipeline, X, batch_sizes=(1, 32, 256, 1024), repeats=30):
+    """Latency and throughput of sklearn vs onnxruntime for several batch sizes"""
+    def sklearn_predict(batch):
+        return model.predict_proba(scaler.transform(batch))
+
+    print(f"\n⏱️ Backend benchmark (ms per call / rows per second)")
+    print(f"   {'rows':>6}{'sklearn ms':>14}{'onnx ms':>12}{'sklearn rows/s':>18}{'onnx rows/s':>14}")
+
+    for size in batch_sizes:
+        batch = X[np.arange(size) % len(X)]
+        timings = []
+        for predict in (sklearn_predict, onnx_pipeline.predict_proba):
+            predict(batch)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                predict(batch)
+            timings.append((time.perf_counter() - start) / repeats)
+
+        sk, ox = timings
+        print(f"   {size:>6}{sk * 1000:>14.3f}{ox * 1000:>12.3f}{size / sk:>18.0f}{size / ox:>14.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the PCOS pipeline to ONNX and compare backends')
+    parser.add_argument('--threads', type=int, default=1, help='onnxruntime intra-op threads')
+    args = parser.parse_args()
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    model_dir = os.path.join(current_dir, '..', 'models')
+
+    model = joblib.load(os.path.join(model_dir, 'pcos_model.joblib'))
+    scaler = joblib.load(os.path.join(model_dir, 'pcos_scaler.joblib'))
+    model_info = joblib.load(os.path.join(model_dir, 'model_info.joblib'))
+
+    onnx_path = export_onnx(model, scaler, os.path.join(model_dir, ONNX_MODEL_FILE))
+    print(f"💾 ONNX pipeline saved: {onnx_path} ({os.path.getsize(onnx_path) / 1024:.0f} KB)")
+
+    onnx_pipeline = OnnxPipeline(onnx_path, intra_op_threads=args.threads)
+
+    # Raw-space rows spread around the training distribution, with some fields
+    # left at 0 the way create_feature_vector fills fields a client did not send
+    rng = np.random.default_rng(42)
+    X = scaler.mean_ + rng.normal(size=(2000, scaler.n_features_in_)) * scaler.scale_
+    X[rng.random(X.shape) < 0.3] = 0
+
+    verify_parity(model, scaler, onnx_pipeline, X, threshold=model_info.get('optimal_threshold', 0.5))
+    benchmark_backends(model, scaler, onnx_pipeline, X)
@@ -0,0 +1,342 @@
+import argparse
+import atexit
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(CURRENT_DIR, '..', 'data', 'prediction_log')
+
+# File layout: MAGIC, then frames of <length u32><crc32 u32><zlib(JSON columns)>.
+# A frame holds one flushed batch; a crash can only lose the frame being written.
+MAGIC = b'PCOSLOG1'
+FRAME_HEADER = struct.Struct('<II')
+LOG_SUFFIX = '.plog'
+OPEN_SUFFIX = '.open'
+
+DEFAULT_BUFFER_SIZE = 10000
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_FLUSH_SECONDS = 1.0
+DEFAULT_ROTATE_BYTES = 64 * 1024 * 1024
+DEFAULT_ROTATE_SECONDS = 3600
+COMPRESSION_LEVEL = 6
+
+def encode_frame(records):
+    """One batch of records as a compressed, checksummed frame with one list per column"""
+    columns = {}
+    for i, record in enumerate(records):
+        for name, value in record.items():
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = [None] * len(records)
+            column[i] = value
+    payload = zlib.compress(json.dumps({'rows': len(records), 'columns': columns},
+                                       separators=(',', ':')).encode('utf-8'), COMPRESSION_LEVEL)
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+class PredictionLog:
+    """Write-behind, append-only log of served predictions
+
+    append() only adds a dict to a bounded in-memory buffer; when the buffer
+    is full the record is dropped and counted, so the request path never
+    waits on disk. A background thread flushes the buffer in batches and
+    rotates files by size or age. The file being written ends in .open;
+    start() finalizes .open files left behind by a writer that crashed.
+    """
+
+    def __init__(self, directory=LOG_DIR, buffer_size=DEFAULT_BUFFER_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_seconds=DEFAULT_FLUSH_SECONDS, rotate_bytes=DEFAULT_ROTATE_BYTES,
+                 rotate_seconds=DEFAULT_ROTATE_SECONDS):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._file = None
+        self._path = None
+        self._opened_at = 0.0
+        self._sequence = 0
+
+        self.appended = 0
+        self.dropped = 0
+        self.written = 0
+        self.frames = 0
+        self.files = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+        self.recovered_files = 0
+        self.last_flush_ms = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.recovered_files = recover_open_files(self.directory)
+        if self.recovered_files:
+            print(f"📝 Finalized {self.recovered_files} prediction log file(s) left open by a crash")
+        self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def append(self, record):
+        """Queue one record; returns False when the buffer was full and it was dropped"""
+        with self._cond:
+            if len(self._buffer) >= self.buffer_size:
+                self.dropped += 1
+                return False
+            self._buffer.append(record)
+            self.appended += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_seconds)
+                batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.batch_size))]
+                closed = self._closed and not self._buffer
+            if batch:
+                self._write(batch)
+            elif self._file is not None and time.time() - self._opened_at >= self.rotate_seconds:
+                self._finish_file()
+            if closed:
+                self._finish_file()
+                return
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            frame = encode_frame(batch)
+            if self._file is not None and (self._file.tell() + len(frame) > self.rotate_bytes or
+                                           time.time() - self._opened_at >= self.rotate_seconds):
+                self._finish_file()
+            if self._file is None:
+                self._open_file()
+            self._file.write(frame)
+            self._file.flush()
+        except Exception as e:
+            print(f"❌ Prediction log write failed, {len(batch)} records lost: {e}")
+            self.write_errors += 1
+            return
+        self.written += len(batch)
+        self.frames += 1
+        self.bytes_written += len(frame)
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def _open_file(self):
+        self._sequence += 1
+        name = f"predictions-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:04d}{LOG_SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path + OPEN_SUFFIX, 'wb')
+        self._file.write(MAGIC)
+        self._opened_at = time.time()
+        self.files += 1
+
+    def _finish_file(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path + OPEN_SUFFIX, self._path)
+        self._file = None
+
+    def close(self, timeout=5.0):
+        """Flush whatever is buffered and close the current file"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def report(self):
+        with self._cond:
+            buffered = len(self._buffer)
+        return {
+            'directory': os.path.abspath(self.directory),
+            'buffered': buffered,
+            'buffer_size': self.buffer_size,
+            'appended': self.appended,
+            'dropped': self.dropped,
+            'written': self.written,
+            'write_errors': self.write_errors,
+            'recovered_files': self.recovered_files,
+            'frames': self.frames,
+            'files': self.files,
+            'bytes_written': self.bytes_written,
+            'current_file': os.path.basename(self._path) if self._file is not None else None,
+            'last_flush_ms': round(self.last_flush_ms, 3) if self.last_flush_ms is not None else None
+        }
+
+def log_files(directory=LOG_DIR, include_open=True):
+    """Log files in write order; the file still being written comes last"""
+    paths = sorted(glob.glob(os.path.join(directory, '*' + LOG_SUFFIX)))
+    if include_open:
+        paths += sorted(glob.glob(os.path.join(directory, '*' + LOG_SUFFIX + OPEN_SUFFIX)))
+    return paths
+
+def _writer_alive(pid):
+    """Whether the process that named a log file may still be writing it"""
+    if pid == os.getpid():
+        return False
+    try:
+        import psutil
+        return psutil.pid_exists(pid)
+    except ImportError:
+        pass
+    if os.name == 'nt':
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _complete_length(path):
+    """Byte length of the magic plus every complete, checksummed frame; 0 if the magic is missing"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return 0
+        end = f.tell()
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return end
+            length, crc = FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return end
+            end = f.tell()
+
+def recover_open_files(directory=LOG_DIR):
+    """Cut the torn tail off .open files whose writer is gone and rename them to .plog
+
+    Returns how many files were finalized; a file without even the magic is removed.
+    """
+    recovered = 0
+    for path in glob.glob(os.path.join(directory, '*' + LOG_SUFFIX + OPEN_SUFFIX)):
+        # predictions-<date>-<time>-<pid>-<sequence>.plog.open
+        try:
+            pid = int(os.path.basename(path).split('-')[3])
+        except (IndexError, ValueError):
+            continue
+        if _writer_alive(pid):
+            continue
+        end = _complete_length(path)
+        if end == 0:
+            os.remove(path)
+            continue
+        with open(path, 'r+b') as f:
+            f.truncate(end)
+        os.replace(path, path[:-len(OPEN_SUFFIX)])
+        recovered += 1
+    return recovered
+
+def iter_frames(path):
+    """Yield each complete frame of one file as a dict of columns; a torn last frame is skipped"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a prediction log")
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            length, crc = FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            yield json.loads(zlib.decompress(payload))
+
+def iter_prediction_batches(directory=LOG_DIR, columns=None, include_open=True):
+    """Stream logged predictions as DataFrames, one per flushed batch
+
+    Input fields use the training column names, so a batch can be fed to the
+    same preprocessing as load_pcos_data() output; fields a request did not
+    send are NaN. Values filled from the user's history are only in the
+    history_fields column.
+    """
+    for path in log_files(directory, include_open):
+        for frame in iter_frames(path):
+            data = frame['columns']
+            if columns is not None:
+                data = {name: data.get(name, [None] * frame['rows']) for name in columns}
+            yield pd.DataFrame(data).fillna(value=np.nan)
+
+def read_prediction_log(directory=LOG_DIR, columns=None, include_open=True):
+    batches = list(iter_prediction_batches(directory, columns, include_open))
+    return pd.concat(batches, ignore_index=True) if batches else pd.DataFrame(columns=columns or [])
+
+def benchmark(n=100000, directory=None):
+    """Request-path cost of append() and the writer's sustained throughput"""
+    import tempfile
+
+    directory = directory or tempfile.mkdtemp(prefix='pcos_log_')
+    log = PredictionLog(directory, buffer_size=n).start()
+    record = {
+        'logged_at': time.time(), 'model_version': 'abc123def456', 'variant': 'default',
+        'Age (yrs)': 28.0, 'Weight (Kg)': 78.0, 'Height(Cm)': 162.0, 'BMI': 29.7,
+        'Cycle(R/I)': 0.0, 'Weight gain(Y/N)': 1.0, 'hair growth(Y/N)': 1.0, 'Pimples(Y/N)': 1.0,
+        'Fast food (Y/N)': 1.0, 'Reg.Exercise(Y/N)': 0.0, 'probability': 0.4123, 'prediction': 0,
+        'risk_level': 'Moderate', 'latency_ms': 31.2
+    }
+
+    start = time.perf_counter()
+    for i in range(n):
+        log.append(dict(record, probability=i / n))
+    append_us = (time.perf_counter() - start) / n * 1e6
+    log.close(timeout=60)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = len(read_prediction_log(directory))
+    read_seconds = time.perf_counter() - start
+    raw_bytes = len(json.dumps(record)) * n
+    print(f"⏱️ Prediction log benchmark ({n} records, {directory})")
+    print(f"   append():   {append_us:.2f} µs/record (request path)")
+    print(f"   written:    {log.written} records in {log.frames} frames, {elapsed:.2f}s end to end")
+    print(f"   size:       {log.bytes_written / 1e6:.2f} MB ({raw_bytes / max(log.bytes_written, 1):.1f}x smaller than JSON lines)")
+    print(f"   read back:  {rows} rows in {read_seconds:.2f}s ({rows / max(read_seconds, 1e-9):.0f} rows/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect or benchmark the prediction log')
+    parser.add_argument('command', choices=['summary', 'export', 'benchmark'])
+    parser.add_argument('--directory', default=LOG_DIR)
+    parser.add_argument('--output', help='parquet or csv path for export')
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == 'benchmark':
+        benchmark(args.records)
+    elif args.command == 'summary':
+        df = read_prediction_log(args.directory)
+        print(f"📒 {len(df)} logged predictions in {len(log_files(args.directory))} files")
+        if len(df):
+            print(f"   from {time.ctime(df['logged_at'].min())} to {time.ctime(df['logged_at'].max())}")
+            print(df.groupby(['variant', 'model_version']).agg(
+                requests=('probability', 'size'), mean_probability=('probability', 'mean'),
+                positive_rate=('prediction', 'mean')).to_string())
+    else:
+        df = read_prediction_log(args.directory)
+        if args.output.endswith('.parquet'):
+            df.to_parquet(args.output, index=False)
+        else:
+            df.to_csv(args.output, index=False)
+        print(f"💾 Exported {len(df)} logged predictions to {args.output}")
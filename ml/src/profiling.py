@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+MAX_PROFILE_SECONDS = 60
+
+# Leaf frames of a parked thread: queue/condition waits (log writer, shadow
+# scorer, job workers) and the server's accept loop
+IDLE_FRAMES = {('threading.py', 'wait'), ('selectors.py', 'select')}
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+def _is_idle(frame):
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+def sample_stacks(seconds, interval=0.005, include_idle=False):
+    """Sample every other thread's stack for `seconds` and count identical stacks
+
+    Returns a Counter of 'root;...;leaf' strings, i.e. the collapsed format
+    read by flamegraph.pl, speedscope and similar tools. Threads parked in a
+    wait are skipped unless include_idle is set, so idle background workers
+    do not drown out the request threads.
+    """
+    own_thread = threading.get_ident()
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+
+    while time.perf_counter() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread or (not include_idle and _is_idle(frame)):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks[';'.join(reversed(labels))] += 1
+        time.sleep(interval)
+
+    return stacks
+
+def collapsed_output(stacks):
+    """Render sampled stacks as 'stack count' lines"""
+    return '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common()) + '\n'
+
+class StageStats:
+    """Running totals for one instrumented stage"""
+    __slots__ = ('calls', 'overlapped', 'blocks', 'peak_bytes', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.overlapped = 0
+        self.blocks = 0
+        self.peak_bytes = 0
+        self.seconds = 0.0
+
+    def to_dict(self):
+        calls = max(self.calls, 1)
+        return {
+            'calls': self.calls,
+            'overlapped_calls': self.overlapped,
+            'avg_net_blocks': round(self.blocks / calls, 1),
+            'avg_peak_bytes': round(self.peak_bytes / calls, 1) if tracemalloc.is_tracing() else None,
+            'avg_ms': round(self.seconds / calls * 1000, 4)
+        }
+
+class ServiceProfiler:
+    """On-demand CPU sampling and allocation tracking for the prediction service
+
+    Everything is off by default. While disabled, track() only checks a flag
+    and calls the function directly.
+
+    Allocation counts come from process-wide counters (tracemalloc peak and
+    sys.getallocatedblocks), so a stage's numbers include whatever other
+    threads allocated meanwhile. They are exact only when one request runs at
+    a time; calls that overlapped another tracked call are counted separately.
+    """
+
+    def __init__(self):
+        self.allocation_tracking = False
+        self.stages = {}
+        self._cpu_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._active = 0
+        self._overlap_epoch = 0
+
+    def track(self, stage, fn, *args):
+        """Run fn(*args), recording allocations under `stage` when tracking is on"""
+        if not self.allocation_tracking:
+            return fn(*args)
+
+        with self._stats_lock:
+            self._active += 1
+            crowded = self._active > 1
+            if crowded:
+                self._overlap_epoch += 1
+            epoch = self._overlap_epoch
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base_bytes = tracemalloc.get_traced_memory()[0]
+        blocks_before = sys.getallocatedblocks()
+        start = time.perf_counter()
+
+        try:
+            result = fn(*args)
+        finally:
+            with self._stats_lock:
+                self._active -= 1
+                overlapped = crowded or self._overlap_epoch != epoch or self._active > 0
+
+        elapsed = time.perf_counter() - start
+        blocks = sys.getallocatedblocks() - blocks_before
+        peak = tracemalloc.get_traced_memory()[1] - base_bytes if tracing else 0
+
+        with self._stats_lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.calls += 1
+            stats.overlapped += overlapped
+            stats.blocks += blocks
+            stats.peak_bytes += peak
+            stats.seconds += elapsed
+        return result
+
+    def profile_cpu(self, seconds, interval=0.005, include_idle=False):
+        """Run the sampling profiler; only one capture may run at a time"""
+        if not self._cpu_lock.acquire(blocking=False):
+            raise RuntimeError("A CPU profile is already running")
+        try:
+            return sample_stacks(min(seconds, MAX_PROFILE_SECONDS), interval, include_idle)
+        finally:
+            self._cpu_lock.release()
+
+    def set_memory_tracking(self, enabled, frames=10):
+        """Toggle tracemalloc and per-stage allocation tracking together"""
+        if enabled:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            with self._stats_lock:
+                self.stages = {}
+            self.allocation_tracking = True
+        else:
+            self.allocation_tracking = False
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def memory_report(self, limit=25, group_by='lineno'):
+        """Top allocation sites from a tracemalloc snapshot plus per-stage counts"""
+        report = {
+            'tracing': tracemalloc.is_tracing(),
+            'allocation_tracking': self.allocation_tracking,
+            # Stage numbers are process-wide; only calls with no overlap are exact
+            'process_wide': True,
+            'stages': {name: stats.to_dict() for name, stats in self.stages.items()},
+            'top_allocations': []
+        }
+        if not tracemalloc.is_tracing():
+            return report
+
+        current, peak = tracemalloc.get_traced_memory()
+        report['traced_bytes'] = current
+        report['traced_peak_bytes'] = peak
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        for stat in snapshot.statistics(group_by)[:limit]:
+            report['top_allocations'].append({
+                'site': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                'size_bytes': stat.size,
+                'count': stat.count
+            })
+        return report
@@ -0,0 +1,295 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Replays are neither rate-limited, logged as live predictions nor allowed to
+# pick up bulk jobs; everything else is configured as for the service
+for _name in ('PCOS_ADMISSION', 'PCOS_PREDICTION_LOG', 'PCOS_JOBS'):
+    os.environ.setdefault(_name, '0')
+
+# Importing the API loads the configured backend exactly as the service does
+import api_fixed as api
+from request_schema import SchemaError
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(CURRENT_DIR, '..', 'data', 'fixtures')
+DEFAULT_FIXTURE = os.path.join(FIXTURE_DIR, 'replay_fixture.ndjson')
+
+# Absolute tolerance on the positive-class probability
+DEFAULT_TOLERANCE = 1e-6
+
+DEFAULT_BATCH_SIZE = 256
+
+class ReplayTarget:
+    """The model a fixture is replayed against: the default model or a registry variant"""
+
+    def __init__(self, variant=None):
+        self.variant = variant
+        self.client = api.app.test_client()
+        self.headers = {api.VARIANT_HEADER: variant} if variant else {}
+        if variant:
+            bundle = api.model_registry.get(variant)
+            self.schema = bundle.schema
+            self.feature_names = bundle.feature_names
+            self.predict = bundle.predict_proba
+            self.threshold = bundle.threshold
+            self.version = bundle.version
+        else:
+            if api.model is None:
+                raise RuntimeError('Model not loaded. Run train_pcos_model.py first!')
+            self.schema = api.request_schema
+            self.feature_names = api.feature_names
+            self.predict = api.predict_probabilities
+            self.threshold = api.optimal_threshold
+            self.version = api.model_version
+
+    def describe(self):
+        return {
+            'variant': self.variant or 'default',
+            'backend': None if self.variant else api.MODEL_BACKEND,
+            'model_version': self.version,
+            'threshold': round(float(self.threshold), 6),
+            'features': len(self.feature_names)
+        }
+
+def _output(record, probability, threshold):
+    """The scored fields of an exact /predict-pcos response for one row"""
+    risk_score = probability * 100
+    risk_level = api.classify_risk(risk_score)
+    return {
+        'probability': float(probability),
+        'prediction': int(probability > threshold),
+        'risk_score': round(float(risk_score), 1),
+        'risk_level': risk_level,
+        'recommendations': api.generate_dynamic_recommendations(record, risk_score, risk_level),
+        'exact_score': True
+    }
+
+def _response_output(response):
+    """The scored fields of a /predict-pcos response, or its validation error"""
+    body = response.get_json()
+    if not body.get('success'):
+        return {'error': body.get('details') or body.get('error')}
+    output = {
+        'prediction': body['prediction'],
+        'risk_score': body['risk_score'],
+        'risk_level': body['risk_level'],
+        'recommendations': body['recommendations'],
+        # Lookup-table and early-exit scores are estimates
+        'exact_score': (body.get('inference') or {}).get('exact_score', True)
+    }
+    # Only exact scores carry the unrounded probability
+    if 'probability' in body:
+        output['probability'] = body['probability']
+    return output
+
+def replay_single(target, payloads):
+    """POST payloads to /predict-pcos one at a time; returns outputs and per-request latencies in ms
+
+    Requests go through the Flask view in-process, so history enrichment,
+    the lookup table, early exit and the cached response encoding are all
+    part of what is replayed.
+    """
+    outputs, latency_ms = [], np.empty(len(payloads))
+    # The view logs every request to stdout
+    with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+        for i, payload in enumerate(payloads):
+            start = time.perf_counter()
+            response = target.client.post('/predict-pcos', json=payload, headers=target.headers)
+            outputs.append(_response_output(response))
+            latency_ms[i] = (time.perf_counter() - start) * 1000
+    return outputs, latency_ms
+
+def replay_batch(target, payloads, batch_size=DEFAULT_BATCH_SIZE):
+    """Score payloads in batches with one exact predict_proba call per batch"""
+    outputs = []
+    for offset in range(0, len(payloads), batch_size):
+        chunk = [None] * len(payloads[offset:offset + batch_size])
+        records, rows, positions = [], [], []
+        for i, payload in enumerate(payloads[offset:offset + batch_size]):
+            if not payload:
+                chunk[i] = {'error': 'No JSON data provided'}
+                continue
+            try:
+                record = target.schema.parse(payload)
+            except SchemaError as e:
+                chunk[i] = {'error': e.errors}
+                continue
+            records.append(record)
+            rows.append(api.create_feature_vector(record, target.feature_names))
+            positions.append(i)
+
+        if rows:
+            probabilities = target.predict(np.vstack(rows))[:, 1]
+            for i, record, probability in zip(positions, records, probabilities):
+                chunk[i] = _output(record, probability, target.threshold)
+        outputs.extend(chunk)
+    return outputs
+
+def compare(expected, actual, tolerance=DEFAULT_TOLERANCE):
+    """Differences between one expected and one replayed output, empty when they match"""
+    if 'error' in expected or 'error' in actual:
+        if expected.get('error') != actual.get('error'):
+            return [{'field': 'error', 'expected': expected.get('error'), 'actual': actual.get('error')}]
+        return []
+
+    diffs = []
+    if expected.get('exact_score', True) and actual.get('exact_score', True):
+        if 'probability' not in expected or 'probability' not in actual:
+            return [{'field': 'probability', 'expected': expected.get('probability'),
+                     'actual': actual.get('probability')}]
+        delta = abs(expected['probability'] - actual['probability'])
+        if delta > tolerance:
+            diffs.append({'field': 'probability', 'expected': expected['probability'],
+                          'actual': actual['probability'], 'delta': delta})
+    # Estimates are not compared on score, only on the fields below
+    for field in ('prediction', 'risk_level', 'recommendations'):
+        if expected[field] != actual[field]:
+            diffs.append({'field': field, 'expected': expected[field], 'actual': actual[field]})
+    return diffs
+
+def read_fixture(path):
+    """Header and cases of a recorded fixture"""
+    header, cases = {}, []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'fixture' in entry:
+                header = entry['fixture']
+            else:
+                cases.append(entry)
+    return header, cases
+
+def read_payloads(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def record_fixture(target, payloads, path):
+    """POST payloads to /predict-pcos and write them with the responses' scored fields"""
+    outputs, _ = replay_single(target, payloads)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        header = dict(target.describe(), recorded=time.strftime('%Y-%m-%dT%H:%M:%S'), cases=len(payloads))
+        f.write(json.dumps({'fixture': header}, sort_keys=True) + '\n')
+        for payload, output in zip(payloads, outputs):
+            f.write(json.dumps({'payload': payload, 'expected': output}, sort_keys=True) + '\n')
+    print(f"💾 Recorded {len(payloads)} cases to {path}")
+    return header
+
+def _mismatches(cases, outputs, tolerance):
+    found = []
+    for i, (case, output) in enumerate(zip(cases, outputs)):
+        diffs = compare(case['expected'], output, tolerance)
+        if diffs:
+            found.append({'case': i, 'diffs': diffs})
+    return found
+
+def replay_fixture(target, path, tolerance=DEFAULT_TOLERANCE, batch_size=DEFAULT_BATCH_SIZE,
+                   modes=('single', 'batch')):
+    """Replay a fixture in each mode and check every output against the recording"""
+    header, cases = read_fixture(path)
+    payloads = [case['payload'] for case in cases]
+
+    # One untimed pass so imports, lazy loads and caches don't count against throughput
+    replay_batch(target, payloads[:batch_size], batch_size)
+    replay_single(target, payloads[:10])
+
+    report = {
+        'fixture': os.path.abspath(path),
+        'recorded_with': header,
+        'replayed_with': target.describe(),
+        'cases': len(cases),
+        'tolerance': tolerance,
+        'modes': {}
+    }
+    if header.get('model_version') and header['model_version'] != target.version:
+        print(f"⚠️ Fixture was recorded with model {header['model_version']}, replaying on {target.version}")
+
+    outputs_by_mode = {}
+    for mode in modes:
+        start = time.perf_counter()
+        if mode == 'single':
+            outputs, latency_ms = replay_single(target, payloads)
+        else:
+            outputs, latency_ms = replay_batch(target, payloads, batch_size), None
+        elapsed = time.perf_counter() - start
+
+        mismatches = _mismatches(cases, outputs, tolerance)
+        result = {
+            'rows_per_second': round(len(cases) / max(elapsed, 1e-9), 1),
+            'elapsed_seconds': round(elapsed, 4),
+            'mismatches': len(mismatches),
+            'first_mismatches': mismatches[:10]
+        }
+        if latency_ms is not None and len(latency_ms):
+            p50, p99 = np.percentile(latency_ms, [50, 99])
+            result['latency_ms'] = {'p50': round(float(p50), 3), 'p99': round(float(p99), 3)}
+        if mode == 'batch':
+            result['batch_size'] = batch_size
+        report['modes'][mode] = result
+        outputs_by_mode[mode] = outputs
+
+    # Batching must never change an answer, whatever the recording says
+    if len(outputs_by_mode) == 2:
+        single = [{'expected': output} for output in outputs_by_mode['single']]
+        report['single_batch_mismatches'] = len(_mismatches(single, outputs_by_mode['batch'], tolerance))
+
+    report['passed'] = (all(m['mismatches'] == 0 for m in report['modes'].values())
+                        and not report.get('single_batch_mismatches'))
+    return report
+
+def print_report(report):
+    print(f"🔁 Replayed {report['cases']} cases from {report['fixture']}")
+    for mode, result in report['modes'].items():
+        line = f"   {mode:<6} {result['rows_per_second']:>10.1f} rows/s  mismatches: {result['mismatches']}"
+        if 'latency_ms' in result:
+            line += f"  p50 {result['latency_ms']['p50']:.3f} ms  p99 {result['latency_ms']['p99']:.3f} ms"
+        print(line)
+        for mismatch in result['first_mismatches']:
+            print(f"      case {mismatch['case']}: {mismatch['diffs']}")
+    if 'single_batch_mismatches' in report:
+        print(f"   single vs batch mismatches: {report['single_batch_mismatches']}")
+    print("✅ Replay matches the recording" if report['passed'] else "❌ Replay differs from the recording")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Record and replay /predict-pcos fixtures in-process')
+    parser.add_argument('command', choices=['record', 'replay'])
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE)
+    parser.add_argument('--payloads', help='NDJSON request bodies to record (see synthetic_data.py)')
+    parser.add_argument('--synthetic', type=int, default=1000,
+                        help='number of synthetic payloads to record when --payloads is not given')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--variant', help='replay against a registry variant instead of the default model')
+    parser.add_argument('--mode', choices=['single', 'batch', 'both'], default='both')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--report', help='also write the replay report as JSON')
+    args = parser.parse_args()
+
+    target = ReplayTarget(args.variant)
+
+    if args.command == 'record':
+        if args.payloads:
+            payloads = read_payloads(args.payloads)
+        else:
+            from ingestion import load_pcos_data
+            from synthetic_data import SyntheticPCOSGenerator
+            generator = SyntheticPCOSGenerator(random_state=args.seed).fit(load_pcos_data())
+            payloads = list(generator.generate_payloads(args.synthetic))
+        record_fixture(target, payloads, args.fixture)
+        sys.exit(0)
+
+    modes = ('single', 'batch') if args.mode == 'both' else (args.mode,)
+    report = replay_fixture(target, args.fixture, args.tolerance, args.batch_size, modes)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report['passed'] else 1)
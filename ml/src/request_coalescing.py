@@ -0,0 +1,138 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Stored idempotent results live this long (seconds) and at most this many are kept
+DEFAULT_IDEMPOTENCY_TTL = 24 * 3600
+DEFAULT_IDEMPOTENCY_ENTRIES = 10000
+
+def request_fingerprint(method, path, args, variant, body):
+    """Stable hash of everything that determines a scoring response"""
+    canonical = json.dumps([method, path, sorted(args), variant, body], sort_keys=True,
+                           separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ResponseSnapshot:
+    """Status, body and content type of a finished response, replayable to other callers"""
+    __slots__ = ('status', 'body', 'mimetype', 'headers')
+
+    def __init__(self, status, body, mimetype, headers=()):
+        self.status = status
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = tuple(headers)
+
+    @property
+    def storable(self):
+        # Server errors and load shedding are worth retrying, so they are not remembered
+        return self.status < 500 and self.status != 429
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers with the same key share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Return (result, shared); shared is True when another caller computed it"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+class IdempotencyStore:
+    """Bounded, TTL-limited map of (client, Idempotency-Key) to the first response given for it"""
+
+    def __init__(self, ttl=DEFAULT_IDEMPOTENCY_TTL, max_entries=DEFAULT_IDEMPOTENCY_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.replays = 0
+        self.conflicts = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """(fingerprint, snapshot) stored for a key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, fingerprint, snapshot = entry
+            if expires <= now:
+                del self._entries[key]
+                return None
+            return fingerprint, snapshot
+
+    def put(self, key, fingerprint, snapshot):
+        """Remember a response unless the key already has one"""
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (now + self.ttl, fingerprint, snapshot)
+
+            # Entries are in insertion order with one TTL, so expired ones are at the front
+            while self._entries and next(iter(self._entries.values()))[0] <= now:
+                self._entries.popitem(last=False)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_replay(self):
+        with self._lock:
+            self.replays += 1
+
+    def record_conflict(self):
+        with self._lock:
+            self.conflicts += 1
+
+    def report(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'replays': self.replays,
+                'key_reuse_conflicts': self.conflicts,
+                'evictions': self.evictions
+            }
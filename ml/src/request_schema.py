@@ -0,0 +1,179 @@
+import time
+
+NUMBER = 'number'
+FLAG = 'flag'
+
+# Canonical training column, accepted aliases, value kind and allowed range
+FIELDS = (
+    ('Age (yrs)', ('age', 'Age'), NUMBER, (0, 120)),
+    ('Weight (Kg)', ('weight', 'Weight'), NUMBER, (0, 500)),
+    ('Height(Cm)', ('height', 'Height'), NUMBER, (0, 300)),
+    ('BMI', ('bmi',), NUMBER, (0, 200)),
+    ('Cycle(R/I)', ('cycle_regular', 'regular_cycle'), NUMBER, None),
+    ('Cycle length(days)', ('cycle_length',), NUMBER, (0, 365)),
+    ('Weight gain(Y/N)', ('weight_gain',), FLAG, None),
+    ('hair growth(Y/N)', ('hair_growth',), FLAG, None),
+    ('Pimples(Y/N)', ('pimples', 'acne'), FLAG, None),
+    ('Fast food (Y/N)', ('fast_food',), FLAG, None),
+    ('Reg.Exercise(Y/N)', ('regular_exercise', 'exercise'), FLAG, None),
+    ('FSH(mIU/mL)', ('fsh',), NUMBER, (0, None)),
+    ('LH(mIU/mL)', ('lh',), NUMBER, (0, None)),
+    ('AMH(ng/mL)', ('amh',), NUMBER, (0, None)),
+    ('PRL(ng/mL)', ('prl',), NUMBER, (0, None)),
+)
+
+FLAG_STRINGS = {
+    '1': 1.0, 'y': 1.0, 'yes': 1.0, 'true': 1.0,
+    '0': 0.0, 'n': 0.0, 'no': 0.0, 'false': 0.0
+}
+
+MISSING = float('nan')
+
+class SchemaError(ValueError):
+    """Raised when a request payload fails validation"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+def _coerce_number(value):
+    # bool is a subclass of int, so it is accepted here as 0/1
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return float(value.strip())
+    raise ValueError
+
+def _coerce_flag(value):
+    if isinstance(value, str):
+        return FLAG_STRINGS[value.strip().lower()]
+    number = _coerce_number(value)
+    if number not in (0.0, 1.0):
+        raise ValueError
+    return number
+
+class PCOSRecord:
+    """Validated request with one float slot per schema field (NaN = not sent)"""
+    __slots__ = ('values', 'schema')
+
+    def __init__(self, values, schema):
+        self.values = values
+        self.schema = schema
+
+    def get(self, name, default=0.0):
+        value = self.values[self.schema.slots[name]]
+        return default if value != value else value
+
+    def has(self, name):
+        value = self.values[self.schema.slots[name]]
+        return value == value
+
+class RequestSchema:
+    """Request schema compiled once per model into a key -> slot lookup table"""
+
+    def __init__(self, feature_names=()):
+        self.slots = {}
+        self.names = []
+        self._index = {}
+
+        for canonical, aliases, kind, bounds in FIELDS:
+            self._add_field(canonical, aliases, kind, bounds)
+
+        # Any other model column may be sent directly under its training name
+        for name in feature_names:
+            if name not in self.slots:
+                self._add_field(name, (), NUMBER, None)
+
+        self._template = [MISSING] * len(self.names)
+        self._ranks = [0] * len(self.names)
+
+    def _add_field(self, canonical, aliases, kind, bounds):
+        slot = len(self.names)
+        self.names.append(canonical)
+        self.slots[canonical] = slot
+
+        coerce = _coerce_flag if kind == FLAG else _coerce_number
+        low, high = bounds if bounds else (None, None)
+
+        # Rank 0 is the canonical name, which wins over any alias
+        for rank, key in enumerate((canonical,) + tuple(aliases)):
+            self._index.setdefault(key, (slot, rank, coerce, low, high))
+
+    def parse(self, data):
+        """Validate and normalize a payload into a PCOSRecord in a single pass"""
+        if not isinstance(data, dict):
+            raise SchemaError(['Request body must be a JSON object'])
+
+        values = self._template[:]
+        ranks = self._ranks[:]
+        errors = []
+
+        for key, raw in data.items():
+            entry = self._index.get(key)
+            if entry is None or raw is None:
+                continue
+
+            slot, rank, coerce, low, high = entry
+            if values[slot] == values[slot] and ranks[slot] <= rank:
+                continue
+
+            # JSON numbers for plain numeric fields skip the coercion call
+            if coerce is _coerce_number and type(raw) in (int, float):
+                value = float(raw)
+            else:
+                try:
+                    value = coerce(raw)
+                except (ValueError, KeyError, TypeError):
+                    errors.append(f"'{key}' has invalid value {raw!r}")
+                    continue
+
+            # Only NaN and +/-inf fail this check, without a math.isfinite call
+            if value - value != 0.0:
+                errors.append(f"'{key}' must be a finite number")
+                continue
+            if (low is not None and value < low) or (high is not None and value > high):
+                errors.append(f"'{key}'={value:g} is outside the allowed range")
+                continue
+
+            values[slot] = value
+            ranks[slot] = rank
+
+        if errors:
+            raise SchemaError(errors)
+
+        return PCOSRecord(values, self)
+
+def compile_schema(feature_names=()):
+    """Build the request schema for a model's feature list"""
+    return RequestSchema(feature_names)
+
+def benchmark_parsing(iterations=100000):
+    """Measure per-request parsing cost for valid and rejected payloads"""
+    schema = compile_schema()
+
+    valid = {
+        'Age (yrs)': 28, 'Weight (Kg)': 78, 'Height(Cm)': 162, 'BMI': 29.7,
+        'cycle_regular': 0, 'weight_gain': 1, 'hair_growth': 1, 'pimples': 1,
+        'fast_food': 1, 'regular_exercise': 0
+    }
+    invalid = dict(valid, BMI='heavy', weight_gain=3)
+
+    print(f"⏱️ Parsing benchmark ({iterations} iterations each)")
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        schema.parse(valid)
+    elapsed = time.perf_counter() - start
+    print(f"   Valid payload:    {elapsed / iterations * 1e6:.2f} µs/request")
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            schema.parse(invalid)
+        except SchemaError:
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"   Rejected payload: {elapsed / iterations * 1e6:.2f} µs/request")
+
+if __name__ == "__main__":
+    benchmark_parsing()
@@ -0,0 +1,122 @@
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+# Synthetic rows are generated in chunks so temporaries stay small
+GENERATION_CHUNK = 65536
+
+class SmoteResampler:
+    """SMOTE oversampling on float32 data with a single preallocated output buffer
+
+    The minority-class neighbour index is built once per call and all
+    synthetic rows are written straight into the output matrix. Instances are
+    picklable and callable, so they can be passed as the `resample` hook of
+    evaluation.evaluate_model, which only ever hands them a training fold.
+    """
+
+    def __init__(self, k_neighbors=5, random_state=42):
+        self.k_neighbors = k_neighbors
+        self.random_state = random_state
+
+    def fit_resample(self, X, y):
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y)
+
+        counts = Counter(y.tolist())
+        if len(counts) != 2:
+            return X, y
+        (majority, n_majority), (minority, n_minority) = counts.most_common()
+        n_new = n_majority - n_minority
+        if n_new == 0 or n_minority < 2:
+            return X, y
+
+        minority_rows = X[y == minority]
+        k = min(self.k_neighbors, n_minority - 1)
+
+        # Neighbour index over the minority class only, queried once for all rows
+        index = NearestNeighbors(n_neighbors=k + 1).fit(minority_rows)
+        neighbors = index.kneighbors(minority_rows, return_distance=False)[:, 1:]
+
+        rng = np.random.default_rng(self.random_state)
+        out = np.empty((len(X) + n_new, X.shape[1]), dtype=np.float32)
+        out[:len(X)] = X
+        y_out = np.empty(len(X) + n_new, dtype=y.dtype)
+        y_out[:len(X)] = y
+        y_out[len(X):] = minority
+
+        for start in range(0, n_new, GENERATION_CHUNK):
+            size = min(GENERATION_CHUNK, n_new - start)
+            base = rng.integers(0, n_minority, size)
+            partner = neighbors[base, rng.integers(0, k, size)]
+            gap = rng.random((size, 1), dtype=np.float32)
+
+            target = out[len(X) + start:len(X) + start + size]
+            np.subtract(minority_rows[partner], minority_rows[base], out=target)
+            target *= gap
+            target += minority_rows[base]
+
+        return out, y_out
+
+    __call__ = fit_resample
+
+def enlarge_dataset(X, y, factor=100, noise=0.01, random_state=0):
+    """Tile a dataset `factor` times with small per-feature jitter"""
+    rng = np.random.default_rng(random_state)
+    X = np.asarray(X, dtype=np.float64)
+    scale = X.std(axis=0) * noise
+    X_big = np.tile(X, (factor, 1))
+    X_big += rng.normal(size=X_big.shape) * scale
+    return X_big, np.tile(np.asarray(y), factor)
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def benchmark_resampling(factor=100):
+    """Peak memory and time of the v2 trainer's SMOTE path versus SmoteResampler"""
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    import train_pcos_model_v2
+    from ingestion import load_pcos_data
+
+    df = load_pcos_data()
+    X, y, _, _ = train_pcos_model_v2.preprocess_pcos_data(df)
+    X, y = enlarge_dataset(X, y, factor)
+    print(f"\n📊 Enlarged dataset: {X.shape} ({X.nbytes / 1e6:.0f} MB as float64)")
+
+    def current_path():
+        X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+        X_scaled = StandardScaler().fit_transform(X_train)
+        return SMOTE(random_state=42, k_neighbors=5).fit_resample(X_scaled, y_train)
+
+    def float32_path():
+        X32 = np.asarray(X, dtype=np.float32)
+        X_train, _, y_train, _ = train_test_split(X32, y, test_size=0.2, random_state=42, stratify=y)
+        scaler = StandardScaler(copy=False).fit(X_train)
+        X_train = scaler.transform(X_train)
+        return SmoteResampler(k_neighbors=5)(X_train, y_train)
+
+    print(f"\n⏱️ Resampling benchmark ({factor}x data)")
+    print(f"   {'path':<26}{'seconds':>10}{'peak MB':>10}{'rows out':>12}")
+
+    paths = [('float32 SmoteResampler', float32_path)]
+    try:
+        from imblearn.over_sampling import SMOTE
+        paths.insert(0, ('float64 imblearn SMOTE', current_path))
+    except ImportError:
+        print("   ⚠️ imbalanced-learn not installed, skipping the previous SMOTE path")
+
+    for name, fn in paths:
+        (X_out, _), elapsed, peak = _measure(fn)
+        print(f"   {name:<26}{elapsed:>10.2f}{peak / 1e6:>10.0f}{len(X_out):>12}")
+
+if __name__ == "__main__":
+    benchmark_resampling()
@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+
+# orjson is several times faster than the stdlib encoder and emits bytes directly
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if ORJSON_AVAILABLE else 0
+
+def _json_default(value):
+    """Fallback conversion for numpy values in the stdlib encoder"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(payload):
+    """Encode payload to JSON bytes using the fastest available encoder"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload, option=ORJSON_OPTIONS)
+    return json.dumps(payload, default=_json_default, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+class ResponseCache:
+    """Pre-encoded JSON bodies that only change when the model is reloaded"""
+
+    def __init__(self):
+        self._bodies = {}
+        self._prediction_suffix = b'}'
+
+    def store(self, name, payload, status=200):
+        """Encode a full response once and keep it as bytes"""
+        self._bodies[name] = (dumps(payload), status)
+
+    def get(self, name):
+        """Return (body, status) for a cached response, or None"""
+        return self._bodies.get(name)
+
+    def set_prediction_constants(self, constants):
+        """Pre-encode the fields appended to every prediction response"""
+        # Keep the encoded object without its opening brace so it can be spliced
+        self._prediction_suffix = dumps(constants)[1:] if constants else b'}'
+
+    def encode_prediction(self, variable_fields):
+        """Encode /predict-pcos fields and splice in the cached constant section"""
+        body = dumps(variable_fields)
+        if self._prediction_suffix == b'}':
+            return body
+        return body[:-1] + b',' + self._prediction_suffix
+
+    def clear(self):
+        self._bodies.clear()
+        self._prediction_suffix = b'}'
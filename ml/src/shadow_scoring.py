@@ -0,0 +1,213 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import joblib
+import numpy as np
+
+from compact_model import compact_forest
+from request_schema import SchemaError, compile_schema
+
+# Mirrored requests waiting to be scored; further requests are dropped
+SHADOW_QUEUE_SIZE = 1000
+
+# Queued requests are scored together, one predict_proba call per batch.
+# A forest's per-call overhead dwarfs its per-row cost, so the worker waits
+# up to SHADOW_LINGER_SECONDS for a batch to fill before scoring it.
+SHADOW_BATCH_SIZE = 64
+SHADOW_LINGER_SECONDS = 0.25
+
+# Latency percentiles are computed over the most recent samples only
+LATENCY_SAMPLES = 2048
+
+DELTA_EDGES = np.array([-0.5, -0.25, -0.1, -0.05, -0.01, 0.01, 0.05, 0.1, 0.25, 0.5])
+
+def load_bundle(model_dir):
+    """Model, scaler, feature names and threshold of a trained bundle"""
+    model_path = os.path.join(model_dir, 'pcos_model.joblib')
+    model_info = joblib.load(os.path.join(model_dir, 'model_info.joblib'))
+    feature_names = joblib.load(os.path.join(model_dir, 'feature_names.joblib'))
+
+    with open(model_path, 'rb') as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:12]
+
+    # Scored as a lossless CompactForest: its vectorized predict costs a small
+    # fraction of sklearn's per-tree loop, CPU the shadow thread would otherwise
+    # take from live requests
+    return {
+        'model': compact_forest(joblib.load(model_path)),
+        'scaler': joblib.load(os.path.join(model_dir, 'pcos_scaler.joblib')),
+        'feature_names': feature_names,
+        'schema': compile_schema(feature_names),
+        'threshold': model_info.get('optimal_threshold', 0.5),
+        'version': version
+    }
+
+def _percentiles(samples):
+    if not samples:
+        return None
+    values = np.fromiter(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3)}
+
+class ShadowScorer:
+    """Scores mirrored live requests with a candidate bundle on a background thread
+
+    submit() only does a non-blocking put on a bounded queue, so the primary
+    request path never waits on the candidate; when the queue is full the
+    request is counted as shed and dropped. The candidate parses each
+    payload with its own schema, so it may use a different feature set.
+    """
+
+    def __init__(self, model_dir, feature_fn, max_queue=SHADOW_QUEUE_SIZE, batch_size=SHADOW_BATCH_SIZE,
+                 linger=SHADOW_LINGER_SECONDS):
+        self.model_dir = model_dir
+        self.bundle = load_bundle(model_dir)
+        self.feature_fn = feature_fn
+        self.batch_size = batch_size
+        self.linger = linger
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.submitted = 0
+            self.shed = 0
+            self.skipped_estimates = 0
+            self.scored = 0
+            self.failed = 0
+            self.agreements = 0
+            self.candidate_only_positive = 0
+            self.primary_only_positive = 0
+            self.delta_sum = 0.0
+            self.abs_delta_sum = 0.0
+            self.max_abs_delta = 0.0
+            self.delta_counts = np.zeros(len(DELTA_EDGES) + 1, dtype=np.int64)
+            self.primary_ms = deque(maxlen=LATENCY_SAMPLES)
+            self.candidate_ms = deque(maxlen=LATENCY_SAMPLES)
+            self.queue_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, payload, primary_score, primary_prediction, primary_ms):
+        """Mirror one request; returns False when it was shed"""
+        try:
+            self._queue.put_nowait((payload, primary_score, primary_prediction, primary_ms, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self.shed += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def skip_estimate(self):
+        """Count a request left unmirrored because the primary score was an estimate"""
+        with self._lock:
+            self.skipped_estimates += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.linger
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._score(batch)
+            except Exception as e:
+                print(f"❌ Shadow scoring error: {e}")
+                with self._lock:
+                    self.failed += len(batch)
+
+    def _score(self, batch):
+        bundle = self.bundle
+        rows, primary, failed = [], [], 0
+        for payload, primary_score, primary_prediction, primary_ms, enqueued in batch:
+            try:
+                record = bundle['schema'].parse(payload)
+            except SchemaError:
+                failed += 1
+                continue
+            rows.append(self.feature_fn(record, bundle['feature_names']))
+            primary.append((primary_score, primary_prediction, primary_ms, enqueued))
+
+        scores = np.empty(0)
+        elapsed_ms = 0.0
+        if rows:
+            start = time.perf_counter()
+            features = bundle['scaler'].transform(np.vstack(rows))
+            scores = bundle['model'].predict_proba(features)[:, 1]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        done = time.perf_counter()
+
+        primary_scores = np.array([p[0] for p in primary])
+        deltas = scores - primary_scores
+        predictions = (scores > bundle['threshold']).astype(int)
+        primary_predictions = np.array([p[1] for p in primary], dtype=int)
+
+        with self._lock:
+            self.failed += failed
+            self.scored += len(scores)
+            self.agreements += int((predictions == primary_predictions).sum())
+            self.candidate_only_positive += int(((predictions == 1) & (primary_predictions == 0)).sum())
+            self.primary_only_positive += int(((predictions == 0) & (primary_predictions == 1)).sum())
+            self.delta_sum += float(deltas.sum())
+            self.abs_delta_sum += float(np.abs(deltas).sum())
+            if len(deltas):
+                self.max_abs_delta = max(self.max_abs_delta, float(np.abs(deltas).max()))
+            self.delta_counts += np.bincount(np.searchsorted(DELTA_EDGES, deltas, side='right'),
+                                             minlength=len(DELTA_EDGES) + 1)
+            for _, _, primary_ms, enqueued in primary:
+                self.primary_ms.append(primary_ms)
+                self.candidate_ms.append(elapsed_ms / len(scores))
+                self.queue_ms.append((done - enqueued) * 1000)
+
+    def report(self):
+        with self._lock:
+            scored = max(self.scored, 1)
+            return {
+                'candidate_dir': os.path.abspath(self.model_dir),
+                'candidate_version': self.bundle['version'],
+                'candidate_threshold': round(self.bundle['threshold'], 3),
+                'candidate_features': len(self.bundle['feature_names']),
+                'since': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'queue': {
+                    'capacity': self._queue.maxsize,
+                    'depth': self._queue.qsize(),
+                    'submitted': self.submitted,
+                    'shed': self.shed,
+                    'skipped_estimates': self.skipped_estimates
+                },
+                'scored': self.scored,
+                'failed': self.failed,
+                'agreement_rate': round(self.agreements / scored, 4),
+                'candidate_only_positive': self.candidate_only_positive,
+                'primary_only_positive': self.primary_only_positive,
+                'score_delta': {
+                    'mean': round(self.delta_sum / scored, 4),
+                    'mean_abs': round(self.abs_delta_sum / scored, 4),
+                    'max_abs': round(self.max_abs_delta, 4),
+                    'histogram_edges': DELTA_EDGES.tolist(),
+                    'histogram': self.delta_counts.tolist()
+                },
+                'latency_ms': {
+                    'primary_predict': _percentiles(self.primary_ms),
+                    'candidate_predict_per_row': _percentiles(self.candidate_ms),
+                    'queue_to_scored': _percentiles(self.queue_ms)
+                }
+            }
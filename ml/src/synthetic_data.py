@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+from ingestion import load_pcos_data
+
+# Columns with at most this many distinct values are sampled from observed values only
+DISCRETE_MAX_VALUES = 20
+
+# Columns that identify a row rather than describe a patient
+ID_COLUMNS = ('Sl. No', 'Patient File No.')
+
+class _ClassModel:
+    """Gaussian copula for one class: empirical marginals + normal-score correlation"""
+
+    def __init__(self, frame, columns):
+        self.columns = columns
+        self.marginals = []
+        self.missing_rate = frame.isna().mean().to_numpy()
+
+        scores = np.zeros((len(frame), len(columns)))
+        for j, column in enumerate(columns):
+            observed = frame[column].dropna().to_numpy(dtype=np.float64)
+            values = np.sort(observed)
+            discrete = len(np.unique(values)) <= DISCRETE_MAX_VALUES
+            integral = bool(len(values)) and np.all(values == np.round(values))
+            self.marginals.append((values, discrete, integral))
+
+            # Rank-based normal scores; missing entries sit at the mean (0)
+            if len(values) > 1:
+                ranks = frame[column].rank(method='average').to_numpy()
+                present = ~np.isnan(ranks)
+                scores[present, j] = ndtri((ranks[present] - 0.5) / len(values))
+
+        correlation = np.corrcoef(scores, rowvar=False) if len(frame) > 1 else np.eye(len(columns))
+        correlation = np.nan_to_num(correlation)
+        np.fill_diagonal(correlation, 1.0)
+
+        # Clip to the nearest positive-definite matrix so Cholesky succeeds
+        eigenvalues, eigenvectors = np.linalg.eigh(correlation)
+        eigenvalues = np.clip(eigenvalues, 1e-6, None)
+        correlation = eigenvectors @ np.diag(eigenvalues) @ eigenvectors.T
+        d = np.sqrt(np.diag(correlation))
+        self.cholesky = np.linalg.cholesky(correlation / np.outer(d, d))
+
+    def sample(self, n, rng):
+        uniforms = ndtr(rng.standard_normal((n, len(self.columns))) @ self.cholesky.T)
+        out = np.empty((n, len(self.columns)))
+
+        for j, (values, discrete, integral) in enumerate(self.marginals):
+            if len(values) == 0:
+                out[:, j] = np.nan
+                continue
+            if discrete:
+                positions = np.minimum((uniforms[:, j] * len(values)).astype(np.int64), len(values) - 1)
+                out[:, j] = values[positions]
+            else:
+                grid = (np.arange(len(values)) + 0.5) / len(values)
+                out[:, j] = np.interp(uniforms[:, j], grid, values)
+                if integral:
+                    out[:, j] = np.round(out[:, j])
+
+        out[rng.random(out.shape) < self.missing_rate] = np.nan
+        return out
+
+class SyntheticPCOSGenerator:
+    """Fits per-class marginals and correlations and streams synthetic rows in the source schema"""
+
+    def __init__(self, random_state=42):
+        self.random_state = random_state
+
+    def fit(self, df, target_col=None):
+        if target_col is None:
+            target_col = [col for col in df.columns if 'PCOS' in col.upper()][0]
+
+        self.target_col = target_col
+        self.schema = list(df.columns)
+        self.columns = [c for c in df.columns if c != target_col and c not in ID_COLUMNS]
+
+        numeric = df[self.columns].apply(pd.to_numeric, errors='coerce')
+        target = df[target_col]
+        self.classes = sorted(target.dropna().unique().tolist())
+        self.priors = np.array([(target == c).mean() for c in self.classes])
+        self.priors = self.priors / self.priors.sum()
+        self.models = [_ClassModel(numeric[target == c], self.columns) for c in self.classes]
+        return self
+
+    def generate_chunks(self, n_rows, chunk_size=100000):
+        """Yield DataFrames of up to chunk_size rows until n_rows have been produced"""
+        rng = np.random.default_rng(self.random_state)
+        produced = 0
+
+        while produced < n_rows:
+            size = min(chunk_size, n_rows - produced)
+            labels = rng.choice(len(self.classes), size=size, p=self.priors)
+            block = np.empty((size, len(self.columns)))
+            for k, model in enumerate(self.models):
+                rows = labels == k
+                if rows.any():
+                    block[rows] = model.sample(int(rows.sum()), rng)
+
+            chunk = pd.DataFrame(block, columns=self.columns)
+            chunk[self.target_col] = np.asarray(self.classes)[labels]
+            row_ids = np.arange(produced + 1, produced + size + 1)
+            for column in ID_COLUMNS:
+                if column in self.schema:
+                    chunk[column] = row_ids
+
+            produced += size
+            yield chunk[self.schema]
+
+    def write_csv(self, path, n_rows, chunk_size=100000):
+        """Stream n_rows to a CSV file without holding them all in memory"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        start = time.perf_counter()
+        for i, chunk in enumerate(self.generate_chunks(n_rows, chunk_size)):
+            chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        elapsed = time.perf_counter() - start
+        print(f"💾 Wrote {n_rows} synthetic rows to {path} ({n_rows / max(elapsed, 1e-9):.0f} rows/s)")
+
+    def generate_payloads(self, n, chunk_size=100000):
+        """Yield /predict-pcos request bodies using the field names sent by aiService.js"""
+        for chunk in self.generate_chunks(n, chunk_size):
+            for row in chunk.to_dict('records'):
+                yield to_app_payload(row)
+
+def _present(value):
+    return value is not None and value == value
+
+def to_app_payload(row):
+    """Map a dataset row onto the predictPCOSRisk request body"""
+    payload = {}
+    for field in ('Age (yrs)', 'Weight (Kg)', 'Height(Cm)'):
+        if _present(row.get(field)):
+            payload[field] = round(float(row[field]), 1)
+
+    # The app derives BMI from weight and height, so keep the three consistent
+    if 'Weight (Kg)' in payload and payload.get('Height(Cm)'):
+        payload['BMI'] = round(payload['Weight (Kg)'] / (payload['Height(Cm)'] / 100) ** 2, 1)
+    elif _present(row.get('BMI')):
+        payload['BMI'] = round(float(row['BMI']), 1)
+
+    # The dataset codes Cycle(R/I) as 2 = regular, 4 = irregular
+    if _present(row.get('Cycle(R/I)')):
+        payload['cycle_regular'] = 1 if row['Cycle(R/I)'] <= 2 else 0
+
+    for field, column in (('weight_gain', 'Weight gain(Y/N)'), ('hair_growth', 'hair growth(Y/N)'),
+                          ('pimples', 'Pimples(Y/N)'), ('fast_food', 'Fast food (Y/N)'),
+                          ('regular_exercise', 'Reg.Exercise(Y/N)')):
+        if _present(row.get(column)):
+            payload[field] = int(row[column] >= 0.5)
+
+    return payload
+
+def write_payloads(generator, path, n):
+    """Write n request payloads as newline-delimited JSON"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        for payload in generator.generate_payloads(n):
+            f.write(json.dumps(payload))
+            f.write('\n')
+    print(f"💾 Wrote {n} API payloads to {path}")
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    synthetic_dir = os.path.join(current_dir, '..', 'data', 'synthetic')
+
+    parser = argparse.ArgumentParser(description='Generate synthetic PCOS data and API payloads')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--output', default=os.path.join(synthetic_dir, 'PCOS_synthetic.csv'))
+    parser.add_argument('--payloads', type=int, default=0, help='number of API payloads to write')
+    parser.add_argument('--payload-output', default=os.path.join(synthetic_dir, 'payloads.ndjson'))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    generator = SyntheticPCOSGenerator(random_state=args.seed).fit(load_pcos_data())
+    if args.rows:
+        generator.write_csv(args.output, args.rows, args.chunk_size)
+    if args.payloads:
+        write_payloads(generator, args.payload_output, args.payloads)
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+for flag in ('PCOS_ADMISSION', 'PCOS_PREDICTION_LOG', 'PCOS_JOBS'):
+    os.environ.setdefault(flag, '0')
+
+import api_fixed as api
+from admission import BULK, INTERACTIVE
+
+class StubAuthenticator:
+    """Accepts 'Bearer token-<uid>' in place of a Firebase ID token"""
+
+    def verify(self, header):
+        if header and header.startswith('Bearer token-'):
+            return header[len('Bearer token-'):]
+        return None
+
+@pytest.fixture(autouse=True)
+def stubbed(monkeypatch):
+    monkeypatch.setattr(api, 'user_auth', StubAuthenticator())
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', 'admin-secret')
+
+def _identity(headers):
+    with api.app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '203.0.113.7'}):
+        return api.request_client(), api.request_lane()
+
+def test_client_header_and_bulk_lane_are_ignored_without_the_admin_token():
+    assert _identity({'X-Client-Id': 'fresh-id', 'X-Request-Lane': 'bulk'}) == ('addr:203.0.113.7', INTERACTIVE)
+
+def test_verified_uid_is_the_client():
+    headers = {'Authorization': 'Bearer token-alice', 'X-Client-Id': 'someone-else'}
+    assert _identity(headers) == ('uid:alice', INTERACTIVE)
+
+def test_admin_tools_name_their_client_and_lane():
+    headers = {'X-Admin-Token': 'admin-secret', 'X-Client-Id': 'nightly-export', 'X-Request-Lane': 'bulk'}
+    assert _identity(headers) == ('client:nightly-export', BULK)
+
+def test_rotating_client_ids_share_one_bucket():
+    for i in range(5):
+        client, lane = _identity({'X-Client-Id': f'id-{i}'})
+        api.admission._bucket(client, lane, 0.0)
+    clients = {client for client, _ in api.admission._buckets}
+    assert 'addr:203.0.113.7' in clients
+    assert not any(client.startswith('client:id-') for client in clients)
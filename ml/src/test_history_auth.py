@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+for flag in ('PCOS_ADMISSION', 'PCOS_PREDICTION_LOG', 'PCOS_JOBS'):
+    os.environ.setdefault(flag, '0')
+
+import api_fixed as api
+from feature_store import FeatureStore
+
+class StubAuthenticator:
+    """Accepts 'Bearer token-<uid>' in place of a Firebase ID token"""
+
+    def verify(self, header):
+        if header and header.startswith('Bearer token-'):
+            return header[len('Bearer token-'):]
+        return None
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, 'user_auth', StubAuthenticator())
+    monkeypatch.setattr(api, 'ADMIN_TOKEN', 'admin-secret')
+    monkeypatch.setattr(api, 'feature_store', FeatureStore())
+    monkeypatch.setattr(api, 'local_store', None)
+    return api.app.test_client()
+
+def _log(user_id=None):
+    doc = {'date': '2026-03-01', 'weight': 64.0, 'sleepHours': 7}
+    if user_id is not None:
+        doc['userId'] = user_id
+    return doc
+
+def test_history_requires_credentials(client):
+    response = client.post('/history/daily-health', json=_log('alice'))
+    assert response.status_code == 401
+    assert api.feature_store.summary('alice') is None
+
+def test_history_rejects_another_users_id(client):
+    response = client.post('/history/daily-health', json=_log('bob'),
+                           headers={'Authorization': 'Bearer token-alice'})
+    assert response.status_code == 403
+    assert api.feature_store.summary('bob') is None
+
+def test_history_defaults_to_the_signed_in_user(client):
+    response = client.post('/history/daily-health', json=_log(),
+                           headers={'Authorization': 'Bearer token-alice'})
+    assert response.status_code == 200
+    assert response.get_json()['accepted'] == 1
+    assert api.feature_store.summary('alice') is not None
+
+def test_admin_token_writes_any_user(client):
+    response = client.post('/history/daily-health', json=[_log('bob'), _log('carol')],
+                           headers={'X-Admin-Token': 'admin-secret'})
+    assert response.status_code == 200
+    assert response.get_json()['accepted'] == 2
+
+def test_scoring_only_trusts_the_callers_own_user_id(client):
+    with api.app.test_request_context(headers={'Authorization': 'Bearer token-alice'}):
+        assert api.request_user_id({'user_id': 'alice'}) == 'alice'
+        assert api.request_user_id({'user_id': 'bob'}) is None
+    with api.app.test_request_context():
+        assert api.request_user_id({'userId': 'alice'}) is None
+    with api.app.test_request_context(headers={'X-Admin-Token': 'admin-secret'}):
+        assert api.request_user_id({'userId': 'bob'}) == 'bob'
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('skl2onnx')
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from onnx_export import OnnxPipeline, export_onnx, verify_parity
+
+@pytest.fixture(scope='module')
+def fitted():
+    """Small scaler + forest fitted on synthetic rows shaped like the PCOS features"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(loc=20, scale=5, size=(400, 12))
+    y = (X[:, 0] + X[:, 3] - X[:, 7] + rng.normal(scale=3, size=400) > 20).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=25, class_weight='balanced', random_state=0)
+    model.fit(scaler.transform(X), y)
+    return model, scaler, X
+
+def test_exported_pipeline_matches_sklearn(fitted, tmp_path):
+    """The ONNX graph (scaler included) scores raw rows like scaler + forest in sklearn"""
+    model, scaler, X = fitted
+    pipeline = OnnxPipeline(export_onnx(model, scaler, str(tmp_path / 'pipeline.onnx')))
+
+    # Unseen rows, with fields zeroed the way create_feature_vector fills missing ones
+    rng = np.random.default_rng(1)
+    rows = scaler.mean_ + rng.normal(size=(1000, X.shape[1])) * scaler.scale_
+    rows[rng.random(rows.shape) < 0.3] = 0
+
+    for threshold in (0.5, 0.463):
+        assert verify_parity(model, scaler, pipeline, rows, threshold=threshold)
+
+def test_pipeline_returns_both_class_columns(fitted, tmp_path):
+    model, scaler, X = fitted
+    pipeline = OnnxPipeline(export_onnx(model, scaler, str(tmp_path / 'pipeline.onnx')))
+
+    probabilities = pipeline.predict_proba(X[:5])
+    assert probabilities.shape == (5, 2)
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1, atol=1e-5)
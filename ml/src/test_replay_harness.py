@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import replay_harness as harness
+from replay_harness import DEFAULT_FIXTURE, ReplayTarget, compare, read_fixture, replay_fixture
+
+api = harness.api
+
+def _fixture_model():
+    header, _ = read_fixture(DEFAULT_FIXTURE)
+    return header.get('model_version')
+
+needs_fixture_model = pytest.mark.skipif(
+    api.model is None or api.model_version != _fixture_model(),
+    reason='the committed fixture was recorded with another model; re-record it with replay_harness.py record')
+
+def _exact(probability, **fields):
+    return dict({'prediction': 0, 'risk_score': round(probability * 100, 1), 'risk_level': 'Low',
+                 'recommendations': [], 'exact_score': True, 'probability': probability}, **fields)
+
+def test_fixture_is_committed_with_exact_probabilities():
+    header, cases = read_fixture(DEFAULT_FIXTURE)
+    assert header['cases'] == len(cases)
+    exact = [case['expected'] for case in cases if 'error' not in case['expected']]
+    assert exact and all('probability' in expected for expected in exact)
+
+def test_probability_is_compared_within_the_tolerance():
+    assert compare(_exact(0.4), _exact(0.4 + 5e-7), tolerance=1e-6) == []
+    diffs = compare(_exact(0.4), _exact(0.4 + 5e-5), tolerance=1e-6)
+    assert [diff['field'] for diff in diffs] == ['probability']
+    assert compare(_exact(0.4), _exact(0.4 + 5e-5), tolerance=1e-4) == []
+
+def test_exact_output_without_a_probability_is_a_mismatch():
+    actual = _exact(0.4)
+    del actual['probability']
+    assert [diff['field'] for diff in compare(_exact(0.4), actual)] == ['probability']
+
+def test_estimates_are_only_compared_on_class_and_level():
+    estimate = _exact(0.41, exact_score=False)
+    del estimate['probability']
+    assert compare(_exact(0.4), estimate) == []
+    assert compare(_exact(0.4), dict(estimate, risk_level='Moderate'))[0]['field'] == 'risk_level'
+
+@needs_fixture_model
+def test_committed_fixture_replays_through_the_endpoint():
+    report = replay_fixture(ReplayTarget(), DEFAULT_FIXTURE)
+    assert report['passed'], report
+    assert report['single_batch_mismatches'] == 0
+
+@needs_fixture_model
+def test_replay_catches_a_regression_in_the_view(monkeypatch):
+    """A change that only affects the endpoint path (here history enrichment) fails the replay"""
+    def shifted(record, data):
+        values = list(record.values)
+        values[record.schema.slots['Weight (Kg)']] += 40
+        return type(record)(values, record.schema), {}
+
+    monkeypatch.setattr(api, 'enrich_from_history', shifted)
+    report = replay_fixture(ReplayTarget(), DEFAULT_FIXTURE, modes=('single',))
+    assert not report['passed']
+    assert report['modes']['single']['mismatches'] > 0
@@ -1,26 +1,17 @@
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score
+from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import accuracy_score, classification_report, roc_auc_score, roc_curve
+from sklearn.metrics import accuracy_score, classification_report, roc_auc_score
 from sklearn.utils import class_weight
 from collections import Counter
 import joblib
 import os
-import glob
 
-def find_data_file():
-    """Find PCOS data file dynamically"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(current_dir, '..', 'data', 'processed')
-    
-    # Look for PCOS CSV files
-    data_files = glob.glob(os.path.join(data_dir, 'PCOS*.csv'))
-    if not data_files:
-        raise FileNotFoundError(f"No PCOS CSV files found in {data_dir}")
-    
-    return data_files[0]
+from drift_monitor import build_reference_profile, save_reference_profile
+from evaluation import evaluate_model, print_evaluation, save_evaluation_report
+from ingestion import load_pcos_data
+from model_registry import publish_bundle
 
 def preprocess_enhanced(df):
     """Enhanced preprocessing with better feature handling"""
@@ -96,9 +87,7 @@ def train_enhanced_model():
     os.makedirs(model_dir, exist_ok=True)
     
     # Load data
-    data_file = find_data_file()
-    print(f"📊 Loading data from: {data_file}")
-    df = pd.read_csv(data_file)
+    df = load_pcos_data()
     
     # Enhanced preprocessing
     X, y, feature_names, label_encoders = preprocess_enhanced(df)
@@ -139,9 +128,9 @@ def train_enhanced_model():
     
     model.fit(X_train_scaled, y_train)
     
-    # Cross-validation for robust evaluation
-    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-    cv_scores = cross_val_score(model, X_train_scaled, y_train, cv=cv, scoring='roc_auc')
+    # Repeated CV in parallel; the scaler is refit inside every fold
+    evaluation = evaluate_model(X_train, y_train, model)
+    print_evaluation(evaluation)
     
     # Evaluate model
     y_pred = model.predict(X_test_scaled)
@@ -153,16 +142,13 @@ def train_enhanced_model():
     print(f"\n🎯 Model Performance:")
     print(f"   Test Accuracy: {accuracy:.3f} ({accuracy*100:.1f}%)")
     print(f"   Test AUC: {auc_score:.3f}")
-    print(f"   CV AUC: {cv_scores.mean():.3f} ± {cv_scores.std():.3f}")
+    print(f"   CV AUC: {evaluation['fold_auc_mean']:.3f} ± {evaluation['fold_auc_std']:.3f}")
     
     if hasattr(model, 'oob_score_'):
         print(f"   OOB Score: {model.oob_score_:.3f}")
     
-    # Find optimal threshold
-    fpr, tpr, thresholds = roc_curve(y_test, y_proba)
-    j_scores = tpr - fpr
-    optimal_idx = np.argmax(j_scores)
-    optimal_threshold = thresholds[optimal_idx]
+    # Threshold from pooled out-of-fold scores rather than the single test split
+    optimal_threshold = evaluation['threshold']
     
     print(f"🎯 Optimal threshold: {optimal_threshold:.3f}")
     
@@ -185,8 +171,10 @@ def train_enhanced_model():
     model_info = {
         'accuracy': accuracy_optimal,
         'auc': auc_score,
-        'cv_auc_mean': cv_scores.mean(),
+        'cv_auc_mean': evaluation['fold_auc_mean'],
         'optimal_threshold': optimal_threshold,
+        'threshold_ci': evaluation['threshold_ci'],
+        'evaluation': evaluation,
         'features': feature_names,
         'feature_count': len(feature_names),
         'training_samples': len(X_train),
@@ -196,6 +184,14 @@ def train_enhanced_model():
     }
     
     joblib.dump(model_info, os.path.join(model_dir, 'model_info.joblib'))
+    save_evaluation_report(evaluation, model_dir)
+    
+    # Training distribution the API's drift monitor compares live requests against
+    missing_rates = {name: df[name].isna().mean() for name in feature_names if name in df.columns}
+    save_reference_profile(build_reference_profile(X_train, feature_names, y_proba, missing_rates), model_dir)
+    
+    # Versioned copy under models/registry/enhanced, so the other trainer cannot overwrite it
+    publish_bundle(model_dir, 'enhanced', 'train_enhanced_model.py', source_columns=df.columns)
     
     print("✅ Enhanced model training complete!")
     return accuracy_optimal
@@ -3,25 +3,24 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, roc_curve
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 from sklearn.utils import class_weight
 from collections import Counter
 import joblib
 import os
 
-# Install: pip install imbalanced-learn
-try:
-    from imblearn.over_sampling import SMOTE
-    SMOTE_AVAILABLE = True
-except ImportError:
-    print("⚠️  SMOTE not available. Install with: pip install imbalanced-learn")
-    SMOTE_AVAILABLE = False
+from drift_monitor import build_reference_profile, save_reference_profile
+from evaluation import evaluate_model, print_evaluation, save_evaluation_report
+from ingestion import load_pcos_data
+from model_registry import publish_bundle
+from resampling import SmoteResampler
 
 def create_enhanced_features(X, feature_names):
     """Create additional risk-based features for better prediction variety"""
     print("🔧 Creating enhanced features...")
     
-    X_enhanced = X.copy()
+    # New columns are collected and written into one preallocated matrix at the end
+    new_columns = []
     new_features = []
     
     # BMI-based features
@@ -35,7 +34,7 @@ def create_enhanced_features(X, feature_names):
         obese = (bmi_values > 30).astype(int)
         underweight = (bmi_values < 18.5).astype(int)
         
-        X_enhanced = np.column_stack([X_enhanced, overweight, obese, underweight])
+        new_columns.extend([overweight, obese, underweight])
         new_features.extend(['BMI_overweight', 'BMI_obese', 'BMI_underweight'])
     
     # Age-based risk features
@@ -49,7 +48,7 @@ def create_enhanced_features(X, feature_names):
         young_age = (age_values < 20).astype(int)
         peak_repro_age = ((age_values >= 20) & (age_values <= 30)).astype(int)
         
-        X_enhanced = np.column_stack([X_enhanced, high_risk_age, young_age, peak_repro_age])
+        new_columns.extend([high_risk_age, young_age, peak_repro_age])
         new_features.extend(['Age_high_risk', 'Age_young', 'Age_peak_reproductive'])
     
     # Symptom count feature
@@ -66,7 +65,7 @@ def create_enhanced_features(X, feature_names):
         symptom_sum = X[:, symptom_indices].sum(axis=1)
         multiple_symptoms = (symptom_sum >= 3).astype(int)
         
-        X_enhanced = np.column_stack([X_enhanced, symptom_sum, multiple_symptoms])
+        new_columns.extend([symptom_sum, multiple_symptoms])
         new_features.extend(['Total_symptoms', 'Multiple_symptoms'])
     
     # Hormone ratio features (if available)
@@ -81,7 +80,7 @@ def create_enhanced_features(X, feature_names):
                                 out=np.zeros_like(X[:, lh_col]), where=X[:, fsh_col]!=0)
         high_lh_fsh = (lh_fsh_ratio > 2).astype(int)
         
-        X_enhanced = np.column_stack([X_enhanced, lh_fsh_ratio, high_lh_fsh])
+        new_columns.extend([lh_fsh_ratio, high_lh_fsh])
         new_features.extend(['LH_FSH_ratio_calc', 'High_LH_FSH_ratio'])
     
     # Lifestyle risk score
@@ -103,9 +102,14 @@ def create_enhanced_features(X, feature_names):
                 lifestyle_score -= X[:, idx]  # Bad lifestyle
         
         poor_lifestyle = (lifestyle_score < 0).astype(int)
-        X_enhanced = np.column_stack([X_enhanced, poor_lifestyle])
+        new_columns.append(poor_lifestyle)
         new_features.append('Poor_lifestyle')
     
+    X_enhanced = np.empty((X.shape[0], X.shape[1] + len(new_columns)), dtype=np.result_type(X, np.float64))
+    X_enhanced[:, :X.shape[1]] = X
+    for i, column in enumerate(new_columns):
+        X_enhanced[:, X.shape[1] + i] = column
+    
     updated_feature_names = feature_names + new_features
     print(f"✅ Added {len(new_features)} enhanced features")
     
@@ -202,18 +206,8 @@ def preprocess_pcos_data(df):
     
     return X_enhanced, y, enhanced_feature_names, le_dict
 
-def find_optimal_threshold(model, X_test, y_test):
-    """Find optimal classification threshold"""
-    y_proba = model.predict_proba(X_test)[:, 1]
-    fpr, tpr, thresholds = roc_curve(y_test, y_proba)
-    
-    # Find threshold that maximizes J statistic (Youden's J)
-    j_scores = tpr - fpr
-    optimal_idx = np.argmax(j_scores)
-    optimal_threshold = thresholds[optimal_idx]
-    
-    print(f"🎯 Optimal threshold: {optimal_threshold:.3f} (default: 0.5)")
-    return optimal_threshold
+# float32 SMOTE with one neighbour index and a preallocated output buffer
+smote_resample = SmoteResampler(k_neighbors=5, random_state=42)
 
 def train_pcos_model():
     """Train enhanced PCOS prediction model"""
@@ -231,15 +225,7 @@ def train_pcos_model():
     os.makedirs(model_dir, exist_ok=True)
     
     # Load data
-    data_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-    if not data_files:
-        raise FileNotFoundError(f"No CSV files found in {data_dir}")
-    
-    main_file = data_files[0]
-    data_path = os.path.join(data_dir, main_file)
-    print(f"📊 Loading data from: {data_path}")
-    
-    df = pd.read_csv(data_path)
+    df = load_pcos_data(data_dir)
     print(f"✅ Data loaded: {df.shape}")
     
     # Preprocess data with enhanced features
@@ -263,17 +249,9 @@ def train_pcos_model():
     X_test_scaled = scaler.transform(X_test)
     
     # Handle class imbalance
-    if SMOTE_AVAILABLE:
-        print("🔧 Applying SMOTE for class balancing...")
-        smote = SMOTE(random_state=42, k_neighbors=min(5, Counter(y_train)[1]-1))
-        try:
-            X_train_balanced, y_train_balanced = smote.fit_resample(X_train_scaled, y_train)
-            print(f"📊 After SMOTE: {Counter(y_train_balanced)}")
-        except ValueError as e:
-            print(f"⚠️ SMOTE failed: {e}. Using original data.")
-            X_train_balanced, y_train_balanced = X_train_scaled, y_train
-    else:
-        X_train_balanced, y_train_balanced = X_train_scaled, y_train
+    print("🔧 Applying SMOTE for class balancing...")
+    X_train_balanced, y_train_balanced = smote_resample(X_train_scaled, y_train)
+    print(f"📊 After SMOTE: {Counter(y_train_balanced)}")
     
     # Calculate class weights
     class_weights = class_weight.compute_class_weight(
@@ -300,8 +278,11 @@ def train_pcos_model():
     
     model.fit(X_train_balanced, y_train_balanced)
     
-    # Find optimal threshold
-    optimal_threshold = find_optimal_threshold(model, X_test_scaled, y_test)
+    # Repeated CV in parallel, with SMOTE applied inside each training fold,
+    # picks the threshold from pooled out-of-fold scores
+    evaluation = evaluate_model(X_train, y_train, model, resample=smote_resample)
+    print_evaluation(evaluation)
+    optimal_threshold = evaluation['threshold']
     
     # Evaluate model with default threshold
     y_pred = model.predict(X_test_scaled)
@@ -344,6 +325,9 @@ def train_pcos_model():
         'accuracy': accuracy_optimal,
         'accuracy_default': accuracy_default,
         'optimal_threshold': optimal_threshold,
+        'threshold_ci': evaluation['threshold_ci'],
+        'cv_auc_mean': evaluation['fold_auc_mean'],
+        'evaluation': evaluation,
         'features': feature_names,
         'feature_count': len(feature_names),
         'training_samples': len(X_train_balanced),
@@ -354,6 +338,14 @@ def train_pcos_model():
     }
     
     joblib.dump(model_info, os.path.join(model_dir, 'model_info.joblib'))
+    save_evaluation_report(evaluation, model_dir)
+    
+    # Training distribution the API's drift monitor compares live requests against
+    missing_rates = {name: df[name].isna().mean() for name in feature_names if name in df.columns}
+    save_reference_profile(build_reference_profile(X_train, feature_names, y_proba, missing_rates), model_dir)
+    
+    # Versioned copy under models/registry/v2, so the other trainer cannot overwrite it
+    publish_bundle(model_dir, 'v2', 'train_pcos_model_v2.py', source_columns=df.columns)
     
     # Verify files were saved
     print(f"\n✅ Enhanced model files saved:")
@@ -0,0 +1,157 @@
+import os
+import time
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+
+# Explainers are rebuilt only when a different model version is loaded
+MAX_CACHED_EXPLAINERS = 4
+_explainer_cache = OrderedDict()
+
+def _sklearn_node_table(model, positive_class):
+    """Flatten all trees of a fitted forest into one node table"""
+    class_index = list(model.classes_).index(positive_class)
+    lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left < 0
+
+        left = np.where(is_leaf, node_ids, tree.children_left) + offset
+        right = np.where(is_leaf, node_ids, tree.children_right) + offset
+
+        class_values = tree.value[:, 0, :]
+        totals = class_values.sum(axis=1)
+        proba = np.divide(class_values[:, class_index], totals,
+                          out=np.zeros(tree.node_count), where=totals > 0)
+
+        lefts.append(left)
+        rights.append(right)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        values.append(proba)
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return {
+        'left': np.concatenate(lefts).astype(np.intp),
+        'right': np.concatenate(rights).astype(np.intp),
+        'feature': np.concatenate(features).astype(np.intp),
+        'threshold': np.concatenate(thresholds),
+        'value': np.concatenate(values),
+        'roots': np.array(roots, dtype=np.intp),
+        'max_depth': max_depth
+    }
+
+class TreePathExplainer:
+    """Per-prediction feature contributions from decision paths (treeinterpreter style)
+
+    Every split on a sample's path moves the node's PCOS probability from the
+    parent value to the child value; that change is credited to the split
+    feature. Averaged over trees, bias + sum(contributions) equals
+    predict_proba[:, 1] exactly.
+    """
+
+    def __init__(self, model, positive_class=1):
+        # Compact bundles already carry a flattened node table
+        table = model.node_table() if hasattr(model, 'node_table') else _sklearn_node_table(model, positive_class)
+
+        self.n_trees = len(table['roots'])
+        self.n_features = model.n_features_in_
+        self.left = table['left']
+        self.right = table['right']
+        self.feature = table['feature']
+        self.threshold = table['threshold']
+        self.value = table['value']
+        self.roots = table['roots']
+        self.max_depth = table['max_depth']
+        self.bias = float(self.value[self.roots].mean())
+
+    def explain(self, X):
+        """Return (bias, contributions[n_samples, n_features], proba[n_samples])"""
+        # Trees compare float32 inputs against their thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+
+        rows = np.repeat(np.arange(n_samples), self.n_trees).reshape(n_samples, self.n_trees)
+        node = np.broadcast_to(self.roots, (n_samples, self.n_trees)).copy()
+        totals = np.zeros(n_samples * self.n_features)
+        flat_rows = rows * self.n_features
+
+        # One step per tree level, advancing every (sample, tree) pair at once
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            go_left = X[rows, feature] <= self.threshold[node]
+            child = np.where(go_left, self.left[node], self.right[node])
+
+            # Leaves point at themselves, so finished paths add zero
+            delta = self.value[child] - self.value[node]
+            totals += np.bincount((flat_rows + feature).ravel(), weights=delta.ravel(),
+                                  minlength=totals.size)
+            node = child
+
+        contributions = totals.reshape(n_samples, self.n_features) / self.n_trees
+        proba = self.value[node].mean(axis=1)
+        return self.bias, contributions, proba
+
+def get_explainer(model, version):
+    """Return the cached explainer for a model version, building it on first use"""
+    key = (version, id(model))
+    explainer = _explainer_cache.get(key)
+    if explainer is None:
+        explainer = TreePathExplainer(model)
+        _explainer_cache[key] = explainer
+        if len(_explainer_cache) > MAX_CACHED_EXPLAINERS:
+            _explainer_cache.popitem(last=False)
+    else:
+        _explainer_cache.move_to_end(key)
+    return explainer
+
+def top_contributors(contributions, raw_values, feature_names, top_n=5):
+    """Format the largest absolute contributions for one sample"""
+    order = np.argsort(-np.abs(contributions))[:top_n]
+    return [
+        {
+            'feature': feature_names[i],
+            'value': round(float(raw_values[i]), 3),
+            'contribution': round(float(contributions[i]) * 100, 2),
+            'direction': 'increases risk' if contributions[i] > 0 else 'decreases risk'
+        }
+        for i in order if contributions[i] != 0
+    ]
+
+def benchmark_explainer(model, X, repeats=200):
+    """Compare explanation latency with plain predict_proba"""
+    explainer = TreePathExplainer(model)
+    single = X[:1]
+
+    def timed(fn, data):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn(data)
+        return (time.perf_counter() - start) / repeats * 1000
+
+    print(f"⏱️ Explainer benchmark ({explainer.n_trees} trees, depth {explainer.max_depth})")
+    print(f"   predict_proba, 1 row:   {timed(model.predict_proba, single):.3f} ms")
+    print(f"   explain, 1 row:         {timed(explainer.explain, single):.3f} ms")
+    print(f"   predict_proba, {len(X)} rows: {timed(model.predict_proba, X):.3f} ms")
+    print(f"   explain, {len(X)} rows:       {timed(explainer.explain, X):.3f} ms")
+
+    _, _, proba = explainer.explain(X)
+    max_error = np.abs(proba - model.predict_proba(X)[:, list(model.classes_).index(1)]).max()
+    print(f"   Max |proba - predict_proba|: {max_error:.2e}")
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    model_dir = os.path.join(current_dir, '..', 'models')
+
+    model = joblib.load(os.path.join(model_dir, 'pcos_model.joblib'))
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(256, model.n_features_in_))
+    benchmark_explainer(model, X)
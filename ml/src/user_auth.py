@@ -0,0 +1,50 @@
+import threading
+
+# firebase-admin checks Firebase ID tokens against Google's published keys;
+# without it only the admin token can write user history
+try:
+    import firebase_admin
+    from firebase_admin import auth as firebase_auth
+    FIREBASE_AVAILABLE = True
+except ImportError:
+    FIREBASE_AVAILABLE = False
+
+BEARER_PREFIX = 'Bearer '
+
+class UserAuthenticator:
+    """Verifies the Firebase ID token a signed-in app user sends as Authorization: Bearer <token>
+
+    Only the token is checked, so no service-account credentials are needed;
+    the project id pins the audience to the app's own Firebase project.
+    """
+
+    def __init__(self, project_id):
+        if not FIREBASE_AVAILABLE:
+            raise RuntimeError("firebase-admin is not installed (pip install firebase-admin)")
+        self.project_id = project_id
+        self._app = firebase_admin.initialize_app(options={'projectId': project_id},
+                                                  name=f'pcos-user-auth-{project_id}')
+        self._lock = threading.Lock()
+        self.verified = 0
+        self.rejected = 0
+
+    def verify(self, header):
+        """uid of the user a bearer Authorization header belongs to, or None"""
+        if not header or not header.startswith(BEARER_PREFIX):
+            return None
+        try:
+            claims = firebase_auth.verify_id_token(header[len(BEARER_PREFIX):].strip(), app=self._app)
+        except Exception:
+            with self._lock:
+                self.rejected += 1
+            return None
+        with self._lock:
+            self.verified += 1
+        return claims.get('uid')
+
+    def report(self):
+        return {
+            'project_id': self.project_id,
+            'verified': self.verified,
+            'rejected': self.rejected
+        }
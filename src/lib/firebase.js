@@ -31,6 +31,7 @@ import {
   onSnapshot,
   serverTimestamp
 } from 'firebase/firestore'
+import { recordHealthLog } from '../services/aiService'
 
 // IMPORTANT: avoid double init in Vite HMR
 const firebaseConfig = {
@@ -207,10 +208,13 @@ export const getUserDailyHealth = async (uid, days = 30) => {
 }
 
 // REAL-TIME HEALTH LOGGING
+// The log is also sent to the AI API, which keeps the user's history features
+// current and may return insights (e.g. an ovulation temperature shift);
+// those are saved to healthInsights with the id of the log that triggered them.
 export const logDailyHealth = async (userId, healthData) => {
-  return await addDoc(collection(db, 'dailyHealth'), {
+  const log = {
     userId,
-    date: healthData.date,
+    date: healthData.date || new Date().toISOString().split('T')[0],
     weight: healthData.weight || null,
     temperature: healthData.temperature || null,
     sleepHours: healthData.sleepHours || null,
@@ -220,9 +224,36 @@ export const logDailyHealth = async (userId, healthData) => {
     mood: healthData.mood || 5,
     energy: healthData.energy || 5,
     stress: healthData.stress || 5,
-    notes: healthData.notes || '',
-    createdAt: serverTimestamp()
-  })
+    notes: healthData.notes || ''
+  }
+  const ref = await addDoc(collection(db, 'dailyHealth'), { ...log, createdAt: serverTimestamp() })
+
+  const result = await recordHealthLog('daily-health', userId, log)
+  if (result.success && result.insights?.length) {
+    try {
+      await Promise.all(result.insights.map((insight) =>
+        addDoc(collection(db, 'healthInsights'), {
+          ...insight,
+          userId,
+          dailyHealthId: ref.id,
+          createdAt: serverTimestamp()
+        })
+      ))
+    } catch (error) {
+      console.error('Error saving health insights:', error)
+    }
+  }
+  return ref
+}
+
+export const getUserHealthInsightsRealtime = (userId, callback, limitCount = 20) => {
+  const q = query(
+    collection(db, 'healthInsights'),
+    where('userId', '==', userId),
+    orderBy('createdAt', 'desc'),
+    limit(limitCount)
+  )
+  return onSnapshot(q, callback)
 }
 
 export const getUserDailyHealthRealtime = (userId, callback, days = 30) => {
@@ -239,17 +270,24 @@ export const getUserDailyHealthRealtime = (userId, callback, days = 30) => {
 }
 
 // === AI PCOS ASSESSMENTS ===
-export const savePCOSAssessment = async (uid, inputData, predictionResult) => {
+// With an assessmentId (the prediction's idempotency key) a repeated save
+// overwrites the same document instead of adding a duplicate
+export const savePCOSAssessment = async (uid, inputData, predictionResult, assessmentId) => {
   if (!uid) throw new Error('User ID required')
   
-  const ref = collection(db, 'pcosAssessments')
-  return await addDoc(ref, {
+  const data = {
     userId: uid,
     inputData,
     predictionResult,
     createdAt: new Date(),
     timestamp: Date.now()
-  })
+  }
+  if (assessmentId) {
+    const ref = doc(db, 'pcosAssessments', assessmentId)
+    await setDoc(ref, data)
+    return ref
+  }
+  return await addDoc(collection(db, 'pcosAssessments'), data)
 }
 
 export const getUserPCOSAssessments = async (uid, limitCount = 20) => {
@@ -467,6 +505,7 @@ export default {
   getUserDailyHealth,
   logDailyHealth,
   getUserDailyHealthRealtime,
+  getUserHealthInsightsRealtime,
   // AI functions (original + real-time)
   savePCOSAssessment,
   getUserPCOSAssessments,
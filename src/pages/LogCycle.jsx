@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { useAuth } from '../contexts/AuthContext'
 import { logCycleData, getUserCyclesRealtime } from '../lib/firebase'
+import { recordHealthLog } from '../services/aiService'
 import { Calendar, Plus, Droplets } from 'lucide-react'
 import Button from '../components/ui/Button'
 import Input from '../components/ui/Input'
@@ -47,6 +48,7 @@ const LogCycle = () => {
 
     try {
       await logCycleData(currentUser.uid, formData)
+      recordHealthLog('cycles', currentUser.uid, formData)
       setShowForm(false)
       setFormData({
         startDate: '',
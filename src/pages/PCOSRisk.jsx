@@ -2,8 +2,7 @@ import React, { useState } from 'react'
 import { motion } from 'framer-motion'
 import { useAuth } from '../contexts/AuthContext'
 import { predictPCOSRisk, getModelInfo } from '../services/aiService'
-import { addDoc, collection } from 'firebase/firestore'
-import { db } from '../lib/firebase'
+import { savePCOSAssessment } from '../lib/firebase'
 import Button from '../components/ui/Button'
 import Input from '../components/ui/Input'
 import { Card, CardHeader, CardTitle, CardContent } from '../components/ui/Card'
@@ -26,6 +25,8 @@ const PCOSRiskAssessment = () => {
   const [result, setResult] = useState(null)
   const [loading, setLoading] = useState(false)
   const [modelInfo, setModelInfo] = useState(null)
+  // One key per form state: resubmitting unchanged answers reuses it
+  const [submissionKey, setSubmissionKey] = useState(null)
 
   React.useEffect(() => {
     // Load model information on component mount
@@ -42,12 +43,17 @@ const PCOSRiskAssessment = () => {
       ...prev,
       [name]: type === 'checkbox' ? checked : value
     }))
+    setSubmissionKey(null)
   }
 
   const handleSubmit = async (e) => {
     e.preventDefault()
+    if (loading) return
     setLoading(true)
     
+    const idempotencyKey = submissionKey || crypto.randomUUID()
+    setSubmissionKey(idempotencyKey)
+    
     // Calculate BMI
     const bmi = formData.weight && formData.height 
       ? (formData.weight / ((formData.height/100) ** 2)).toFixed(1)
@@ -58,7 +64,7 @@ const PCOSRiskAssessment = () => {
       bmi: parseFloat(bmi)
     }
     
-    const prediction = await predictPCOSRisk(submissionData)
+    const prediction = await predictPCOSRisk({ ...submissionData, userId: currentUser?.uid }, idempotencyKey)
     
     if (prediction.success) {
       setResult(prediction)
@@ -66,13 +72,7 @@ const PCOSRiskAssessment = () => {
       // Save to Firestore for user history
       if (currentUser) {
         try {
-          await addDoc(collection(db, 'pcosAssessments'), {
-            userId: currentUser.uid,
-            inputData: submissionData,
-            predictionResult: prediction,
-            createdAt: new Date(),
-            timestamp: Date.now()
-          })
+          await savePCOSAssessment(currentUser.uid, submissionData, prediction, idempotencyKey)
           console.log('✅ Assessment saved to user history')
         } catch (error) {
           console.error('❌ Failed to save assessment:', error)
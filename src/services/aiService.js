@@ -1,12 +1,24 @@
 // src/services/aiService.js
+import { getAuth } from 'firebase/auth'
+
 const AI_API_BASE = 'http://localhost:5000'  // Your working ML API
 
-export const predictPCOSRisk = async (userData) => {
+// The API only uses or records a user's history for that signed-in user
+const authHeaders = async () => {
+  const user = getAuth().currentUser
+  return user ? { 'Authorization': `Bearer ${await user.getIdToken()}` } : {}
+}
+
+// Retries and double-submits that reuse an idempotencyKey get the first result back.
+// With userData.userId the API fills cycle length and weight from the user's logged history.
+export const predictPCOSRisk = async (userData, idempotencyKey) => {
   try {
     const response = await fetch(`${AI_API_BASE}/predict-pcos`, {
       method: 'POST',
       headers: {
-        'Content-Type': 'application/json'
+        'Content-Type': 'application/json',
+        ...(await authHeaders()),
+        ...(idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {})
       },
       body: JSON.stringify({
         'Age (yrs)': userData.age || 25,
@@ -18,7 +30,8 @@ export const predictPCOSRisk = async (userData) => {
         'hair_growth': userData.hairGrowth ? 1 : 0,
         'pimples': userData.acne ? 1 : 0,
         'fast_food': userData.fastFood ? 1 : 0,
-        'regular_exercise': userData.exercise ? 1 : 0
+        'regular_exercise': userData.exercise ? 1 : 0,
+        ...(userData.userId ? { 'user_id': userData.userId } : {})
       })
     })
 
@@ -30,6 +43,22 @@ export const predictPCOSRisk = async (userData) => {
   }
 }
 
+// Keeps the API's per-user history features current; kind is 'cycles' or 'daily-health'.
+// Daily-health responses carry any insights the log triggered (e.g. an ovulation temperature shift).
+export const recordHealthLog = async (kind, userId, data) => {
+  try {
+    const response = await fetch(`${AI_API_BASE}/history/${kind}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...(await authHeaders()) },
+      body: JSON.stringify({ ...data, userId })
+    })
+    return await response.json()
+  } catch (error) {
+    console.error('History sync error:', error)
+    return { success: false, error: error.message }
+  }
+}
+
 export const getModelInfo = async () => {
   try {
     const response = await fetch(`${AI_API_BASE}/model-info`)